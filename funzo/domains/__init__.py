@@ -2,7 +2,8 @@
 from .base import Domain, model_domain
 
 from .geometry import discretize_space, distance_to_segment, edist
-from .geometry import normangle
+from .geometry import normangle, pairwise_distances
+from .geometry import segment_distance, segment_distances
 
 from .gridworld import GAction, GState, GTransition
 from .gridworld import GReward, GRewardLFA
@@ -23,6 +24,7 @@ __all__ = [
     'Domain', 'model_domain',
     #
     'discretize_space', 'distance_to_segment', 'edist', 'normangle',
+    'pairwise_distances', 'segment_distance', 'segment_distances',
     #
     'GAction', 'GState', 'GTransition', 'GReward', 'GRewardLFA',
     'GridWorldMDP', 'GridWorld',
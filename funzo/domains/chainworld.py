@@ -198,4 +198,4 @@ class ChainMDP(MDP):
 
     def actions(self, state):
         """ Set of actions that can be performed in this state."""
-        return self.A.keys()
+        return self.A
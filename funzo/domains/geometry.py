@@ -11,6 +11,9 @@ __all__ = [
     'distance_to_segment',
     'edist',
     'normangle',
+    'pairwise_distances',
+    'segment_distance',
+    'segment_distances',
     'trajectory_length',
 ]
 
@@ -44,26 +47,39 @@ def normangle(theta, start=0):
 
     Parameters
     -----------
-    theta : float
-        input angle to normalize
+    theta : float or array-like
+        input angle(s) to normalize
 
     start: float
         input start angle (optional, default: 0.0)
 
     Returns
     --------
-    res : float
-        normalized angle or :math:`\infty`
+    res : float or array-like
+        normalized angle(s) or :math:`\infty` for non finite input
 
     """
-    if theta < np.inf:
-        while theta >= start + 2 * np.pi:
-            theta -= 2 * np.pi
-        while theta < start:
-            theta += 2 * np.pi
-        return theta
-    else:
-        return np.inf
+    end = start + 2 * np.pi
+    if isinstance(theta, (float, int)):
+        # scalar path, used in the inner loops of local controllers
+        if not -np.inf < theta < np.inf:
+            return np.inf
+        if start <= theta < end:
+            return theta
+        res = (theta - start) % (2 * np.pi) + start
+        return start if res >= end else res
+
+    theta = np.asarray(theta, dtype=float)
+    with np.errstate(invalid='ignore'):
+        res = np.mod(theta - start, 2 * np.pi) + start
+        # mod of tiny negative angles may round up to the full turn
+        res = np.where(res >= end, start, res)
+        # angles already in range are returned as they are
+        res = np.where((theta >= start) & (theta < end), theta, res)
+    res = np.where(np.isfinite(theta), res, np.inf)
+    if res.ndim == 0:
+        return float(res)
+    return res
 
 
 def trajectory_length(traj):
@@ -94,8 +110,41 @@ def trajectory_length(traj):
 
 
 def edist(v1, v2):
-    """ Euclidean distance between two 2D vectors """
-    return np.hypot(v1[0] - v2[0], v1[1] - v2[1])
+    """ Euclidean distance between 2D vectors
+
+    Either argument may also be an array of shape (n, 2), in which case the
+    distances are computed row-wise (with broadcasting).
+
+    """
+    v1 = np.asarray(v1, dtype=float)
+    v2 = np.asarray(v2, dtype=float)
+    return np.hypot(v1[..., 0] - v2[..., 0], v1[..., 1] - v2[..., 1])
+
+
+def pairwise_distances(points, others=None):
+    """ Euclidean distances between two sets of 2D points
+
+    Parameters
+    -----------
+    points : array-like, shape (n, 2)
+        Points in 2D, only the first two columns are used
+    others : array-like, shape (m, 2), optional (default: None)
+        Second set of points, ``points`` itself if None
+
+    Returns
+    -------
+    dist : array-like, shape (n, m)
+        Distance matrix with ``dist[i, j]`` between the ``i``-th point and
+        the ``j``-th of the others
+
+    """
+    points = np.atleast_2d(np.asarray(points, dtype=float))[:, 0:2]
+    if others is None:
+        others = points
+    others = np.atleast_2d(np.asarray(others, dtype=float))[:, 0:2]
+
+    d = points[:, np.newaxis, :] - others[np.newaxis, :, :]
+    return np.hypot(d[..., 0], d[..., 1])
 
 
 def distance_to_segment(point, line_start, line_end):
@@ -111,57 +160,76 @@ def distance_to_segment(point, line_start, line_end):
     Returns
     -------
     dist : float
-        The distance from the point to the line segment if inside is true,
-         otherwise None
+        The distance from the point to the line segment, i.e. to the nearest
+        end point if inside is false
     inside : bool
         Flag indicating if th distance is within the two perpendicular lines
          from the line segment ends
 
     """
-    xa, ya = line_start[0], line_start[1]
-    xb, yb = line_end[0], line_end[1]
-    xp, yp = point[0], point[1]
-
-    # x-coordinates
-    A = xb - xa
-    B = yb - ya
-    C = yp * B + xp * A
-    a = 2 * ((B * B) + (A * A))
-    b = -4 * A * C + (2 * yp + ya + yb) * A * B - (2 * xp + xa + xb) * (B * B)
-    c = 2 * (C * C) - (2 * yp + ya + yb) * C * B + \
-        (yp * (ya + yb) + xp * (xa + xb)) * (B * B)
-    if b * b < 4 * a * c:
-        return None, False
-    x1 = (-b + np.sqrt((b * b) - 4 * a * c)) / (2 * a)
-    x2 = (-b - np.sqrt((b * b) - 4 * a * c)) / (2 * a)
-
-    # y-coordinates
-    A = yb - ya
-    B = xb - xa
-    C = xp * B + yp * A
-    a = 2 * ((B * B) + (A * A))
-    b = -4 * A * C + (2 * xp + xa + xb) * A * B - (2 * yp + ya + yb) * (B * B)
-    c = 2 * (C * C) - (2 * xp + xa + xb) * C * B + \
-        (xp * (xa + xb) + yp * (ya + yb)) * (B * B)
-    if b * b < 4 * a * c:
-        return None, False
-    y1 = (-b + np.sqrt((b * b) - 4 * a * c)) / (2 * a)
-    y2 = (-b - np.sqrt((b * b) - 4 * a * c)) / (2 * a)
-
-    # Put point candidates together
-    candidates = ((x1, y2), (x2, y2), (x1, y2), (x2, y1))
-    distances = (edist(candidates[0], point), edist(candidates[1], point),
-                 edist(candidates[2], point), edist(candidates[3], point))
-    max_index = np.argmax(distances)
-    cand = candidates[max_index]
-    dmax = distances[max_index]
-
-    start_cand = (line_start[0] - cand[0], line_start[1] - cand[1])
-    end_cand = (line_end[0] - cand[0], line_end[1] - cand[1])
-    dotp = (start_cand[0] * end_cand[0]) + (start_cand[1] * end_cand[1])
-
-    inside = False
-    if dotp <= 0.0:
-        inside = True
-
-    return dmax, inside
+    dist, t = _project_to_segments(np.asarray(point, dtype=float)[:2],
+                                   line_start, line_end)
+    return float(dist[0, 0]), bool(0.0 <= t[0, 0] <= 1.0)
+
+
+def segment_distance(points, line_start, line_end):
+    """ Distances from many 2D points to a line segment
+
+    Points are projected onto the line, with the projection clamped to the
+    segment, i.e. beyond the ends the distance is to the nearest end point.
+
+    Parameters
+    -----------
+    points : array-like, shape (n, 2)
+        Points in 2D
+    line_start, line_end : array-like, shape (2,)
+        Start and end point of the line
+
+    Returns
+    -------
+    dist : array-like, shape (n,)
+        The distances from the points to the line segment
+
+    """
+    return segment_distances(points, line_start, line_end)[:, 0]
+
+
+def segment_distances(points, starts, ends):
+    """ Distances from many 2D points to many line segments
+
+    Parameters
+    -----------
+    points : array-like, shape (n, 2)
+        Points in 2D
+    starts, ends : array-like, shape (m, 2)
+        Start and end points of the line segments
+
+    Returns
+    -------
+    dist : array-like, shape (n, m)
+        Distance matrix with ``dist[i, j]`` between the ``i``-th point and
+        the ``j``-th segment
+
+    """
+    return _project_to_segments(points, starts, ends)[0]
+
+
+def _project_to_segments(points, starts, ends):
+    """ Clamped projections of points onto segments
+
+    Returns the (n, m) distances to the clamped projections and the (n, m)
+    unclamped line parameters, which lie in [0, 1] for projections falling
+    within the segments. Degenerate segments project onto their start.
+
+    """
+    points = np.asarray(points, dtype=float).reshape(-1, 2)
+    a = np.asarray(starts, dtype=float).reshape(-1, 2)
+    ab = np.asarray(ends, dtype=float).reshape(-1, 2) - a
+    length_sq = np.sum(ab * ab, axis=1)
+
+    ap = points[:, np.newaxis, :] - a[np.newaxis, :, :]
+    dots = np.einsum('nmk,mk->nm', ap, ab)
+    t = np.divide(dots, length_sq, out=np.zeros_like(dots),
+                  where=length_sq > 0)
+    d = ap - np.clip(t, 0.0, 1.0)[..., np.newaxis] * ab
+    return np.hypot(d[..., 0], d[..., 1]), t
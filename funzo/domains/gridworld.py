@@ -10,6 +10,11 @@ from six.moves import range
 from collections import Iterable
 from matplotlib.patches import Rectangle
 
+try:
+    from collections.abc import Mapping
+except ImportError:
+    from collections import Mapping
+
 from .base import Domain, model_domain
 
 from ..models.mdp import MDP
@@ -17,6 +22,7 @@ from ..models.mdp import TabularRewardFunction, LinearRewardFunction
 from ..models.mdp import MDPTransition, MDPState, MDPAction
 
 from ..utils.validation import check_random_state
+from ..utils.data_structures import DemonstrationSet
 
 
 __all__ = [
@@ -33,30 +39,50 @@ FREE = 'free'
 OBSTACLE = 'obstacle'
 TERMINAL = 'terminal'
 
+# cell status by the code used in grid maps
+STATUS = (FREE, OBSTACLE, TERMINAL)
+
+# action (x, y) directions by action id
+DIRECTIONS = ((1, 0), (0, 1), (-1, 0), (0, -1), (0, 0))
+
+# id of the STAY action, the only action available at terminal states
+STAY = DIRECTIONS.index((0, 0))
+
 
 class GReward(TabularRewardFunction):
-    """ Grid world MDP reward function """
+    """ Grid world MDP reward function
+
+    For lazy domains, rewards are computed from the map until set using
+    :meth:`update_parameters`.
+
+    """
+
+    # rewards of free, obstacle and terminal cells
+    CELL_REWARDS = np.array([-0.01, -10.0, 1.0])
+
     def __init__(self, rmax=1.0, domain=None):
         super(GReward, self).__init__(domain=domain,
                                       rmax=rmax)
 
         self._domain = model_domain(domain, GridWorld)
 
-        R = np.zeros(len(self))
-        for s in self._domain.states:
-            state_ = self._domain.states[s]
-            if state_.status == TERMINAL:
-                R[s] = 1.0
-            elif state_.status == OBSTACLE:
-                R[s] = -10.0
-            else:
-                R[s] = -0.01
-        self.update_parameters(reward=R)
+        if not self._domain._lazy:
+            self.update_parameters(reward=self.reward_vector())
 
     def __call__(self, state, action):
         """ Evaluate reward function """
+        if self._R is None:
+            return self.CELL_REWARDS[self._domain.grid.flat[state]]
         return self._R[state]
 
+    def reward_vector(self, states=None):
+        """ Evaluate the state rewards of many (default all) states """
+        if states is None:
+            states = slice(None)
+        if self._R is None:
+            return self.CELL_REWARDS[self._domain.grid.ravel()[states]]
+        return self._R[states]
+
     def __len__(self):
         return len(self._domain.states)
 
@@ -68,20 +94,36 @@ class GRewardLFA(LinearRewardFunction):
         self._domain = model_domain(domain, GridWorld)
 
     def __call__(self, state, action):
-        """ Evaluate reward function """
-        phi = self.phi(state, action)
-        return np.dot(self._weights, phi)
+        """ Evaluate reward function using the cached state features """
+        return np.dot(self._weights, self.feature_matrix()[state])
 
     def phi(self, state, action):
         """ Evaluate the reward features for state-action pair """
         state_ = self._domain.states[state]
-        phi = np.array([self._feature_free(state_),
-                        self._feature_obstacle(state_),
-                        self._feature_goal(state_)])
-        return phi
+        return np.array([getattr(self, f)(state_)
+                         for f in self._feature_names])
 
-    def _feature_goal(self, state):
-        """ Check if the agent is at the goal position """
+    def phi_batch(self, states, action=None):
+        """ Evaluate the reward features of many states at once
+
+        The features of this class are computed from the cell status codes
+        of the grid, subclasses with other features fall back to :meth:`phi`.
+
+        """
+        status = self._domain.grid.ravel()[np.asarray(states, dtype=int)]
+        terminal = (status == STATUS.index(TERMINAL)).astype(float)
+        columns = {
+            '_feature_free': terminal,
+            '_feature_obstacle':
+                (status == STATUS.index(OBSTACLE)).astype(float),
+            '_feature_goal': terminal,
+        }
+        if not set(self._feature_names) <= set(columns):
+            return super(GRewardLFA, self).phi_batch(states, action)
+        return np.column_stack([columns[f] for f in self._feature_names])
+
+    def _feature_free(self, state):
+        """ Check is the agent is in a free cell """
         if state.status == TERMINAL:
             return 1.0
         return 0.0
@@ -92,8 +134,8 @@ class GRewardLFA(LinearRewardFunction):
             return 1.0
         return 0.0
 
-    def _feature_free(self, state):
-        """ Check is the agent is in a free cell """
+    def _feature_goal(self, state):
+        """ Check if the agent is at the goal position """
         if state.status == TERMINAL:
             return 1.0
         return 0.0
@@ -111,49 +153,18 @@ class GTransition(MDPTransition):
     def __call__(self, state, action, **kwargs):
         """ Transition
 
+        The next states of the intended action and of the two wind outcomes
+        are given by :meth:`GridWorld.next_state`.
+
         Returns
         --------
         A list of all possible next states [(prob, state)]
 
         """
-        state_ = self._domain.states[state]
-        action_ = self._domain.actions[action]
         p_s = 1.0 - self._wind
         p_f = self._wind / 2.0
-        A = self._domain.actions.values()
-        return [(p_s, self._move(state_, action_)),
-                (p_f, self._move(state_, self._right(action_, A))),
-                (p_f, self._move(state_, self._left(action_, A)))]
-
-    def _move(self, state, action):
-        """ Return the state that results from going in this direction.
-
-        Stay in the same state if action os leading to go outside the world or
-        to obstacles
-
-        Returns
-        --------
-        new_state : int
-            Id of the new state after transition (which can be the current
-            state, if transition leads to outside of the world)
-
-        """
-        new_coords = (state.cell[0] + action.direction[0],
-                      state.cell[1] + action.direction[1])
-
-        if new_coords in self._domain.state_map:
-            return self._domain.state_map[new_coords]
-
-        return self._domain.state_map[state.cell]
-
-    def _heading(self, heading, inc, directions):
-        return directions[(directions.index(heading) + inc) % len(directions)]
-
-    def _right(self, heading, directions):
-        return self._heading(heading, -1, directions)
-
-    def _left(self, heading, directions):
-        return self._heading(heading, +1, directions)
+        s_s, s_r, s_l = self._domain.next_state(state, action)
+        return [(p_s, int(s_s)), (p_f, int(s_r)), (p_f, int(s_l))]
 
 
 #############################################################################
@@ -208,44 +219,166 @@ class GridWorld(Domain):
     is to find a path from any start cell to a goal cell. The start, goal
     and obstacle cells are specified using a matrix or list of lists.
 
+    The world is stored in arrays, with state ids given by the cells in row
+    major order, i.e. :math:`s = y W + x`. :class:`GState` objects are
+    only created when accessed through :attr:`states`. Maps can be
+    rectangular.
+
+    Parameters
+    -----------
+    gmap : array-like, shape (H, W)
+        Grid map, with 0 for free, 1 for obstacle and 2 for goal cells
+    lazy : bool, optional (default: False)
+        If True, next states (and rewards, see :class:`GReward`) are
+        computed on demand from the map instead of being tabulated, for
+        very large maps. Use :meth:`blocks` to stream over states.
+
+    Attributes
+    -----------
+    grid : array-like, shape (H, W)
+        Cell status codes (indices into ``STATUS``), with rows by ``y``
+    next_states : array-like, shape (3, S, A)
+        Next state of every state-action pair, for the intended direction
+        and for the two wind outcomes (turning right and left). None in
+        lazy mode, see :meth:`next_state`
+    states : Mapping
+        Read only mapping of state ids to :class:`GState` views
+    state_map : Mapping
+        Read only mapping of cells ``(x, y)`` to state ids
+
     """
 
-    def __init__(self, gmap):
+    def __init__(self, gmap, lazy=False):
         self._gmap = np.asarray(gmap)
         assert self._gmap.ndim == 2, '`gmap` must be a two dimensional array'
+        self._lazy = lazy
         self._initialize(np.flipud(self._gmap))
 
+    @classmethod
+    def from_file(cls, filename, lazy=False):
+        """ Load a grid map from a file
+
+        ``.npy`` maps are memory mapped while images are thresholded, with
+        dark pixels as obstacles. Any other file is read using
+        :func:`numpy.loadtxt`, with optional ``,`` delimiters.
+
+        """
+        ext = filename.rsplit('.', 1)[-1].lower()
+        if ext == 'npy':
+            gmap = np.load(filename, mmap_mode='r')
+        elif ext in ('png', 'jpg', 'jpeg', 'bmp', 'gif', 'tif', 'tiff'):
+            from matplotlib.image import imread
+            img = np.asarray(imread(filename), dtype=float)
+            if img.ndim == 3:
+                img = img[..., :3].mean(axis=2)
+            gmap = (img < 0.5 * img.max()).astype(np.int8)
+        else:
+            with open(filename) as f:
+                delimiter = ',' if ',' in f.readline() else None
+            gmap = np.loadtxt(filename, delimiter=delimiter, dtype=np.int8)
+        return cls(gmap, lazy=lazy)
+
     def _initialize(self, gmap):
         self._height, self._width = gmap.shape
-        assert self._height == self._width, 'Only square grids supported'
-        self.states = dict()
-        self.state_map = dict()  # simple inverse map for transition
-
-        state_id = 0
-        for i in range(self._width):
-            for j in range(self._height):
-                if gmap[i, j] == 1:
-                    self.states[state_id] = GState(state_id, (j, i), OBSTACLE)
-                elif gmap[i, j] == 2:
-                    self.goal = (j, i)
-                    self.states[state_id] = GState(state_id, (j, i), TERMINAL)
-                else:
-                    self.states[state_id] = GState(state_id, (j, i), FREE)
 
-                self.state_map[(j, i)] = state_id
-                state_id += 1
+        self.grid = np.zeros(gmap.shape, dtype=np.int8)
+        self.grid[gmap == 1] = STATUS.index(OBSTACLE)
+        self.grid[gmap == 2] = STATUS.index(TERMINAL)
+        goals = np.flatnonzero(self.grid == STATUS.index(TERMINAL))
+        if len(goals):
+            self.goal = self.cell(goals[-1])
 
-        self.actions = {
-            0: GAction(0, (1, 0)),
-            1: GAction(1, (0, 1)),
-            2: GAction(2, (-1, 0)),
-            3: GAction(3, (0, -1)),
-            4: GAction(4, (0, 0))
-        }
+        self.states = _GridStates(self)
+        self.state_map = _GridStateMap(self)
+        self.actions = dict((a, GAction(a, d))
+                            for a, d in enumerate(DIRECTIONS))
+        self.next_states = None
+        if not self._lazy:
+            self.next_states = self.next_state_block(range(self.grid.size))
+
+    def next_state(self, state, action):
+        """ Next states of the intended direction and the wind outcomes
+
+        Moves leading outside the world stay in the same state. Wind turns
+        the action to its neighbours in the order of action ids.
+
+        Parameters
+        -----------
+        state, action : int or array-like
+            State and action ids, broadcast together
+
+        Returns
+        --------
+        next_states : array-like, shape (3,) + broadcast shape
+            The next states of the intended, right and left outcomes
+
+        """
+        if self.next_states is not None:
+            return self.next_states[:, state, action]
+        return self._compute_next_state(state, action)
+
+    def next_state_block(self, states):
+        """ Next states of a block of states for all actions
+
+        Returns
+        --------
+        next_states : array-like, shape (3, len(states), A)
+            As :attr:`next_states` for the given states
+
+        """
+        states = np.asarray(states, dtype=np.int64)
+        if self.next_states is not None:
+            return self.next_states[:, states]
+
+        x, y = states % self._width, states // self._width
+        move = np.empty((len(states), len(DIRECTIONS)), dtype=np.int32)
+        for a, (dx, dy) in enumerate(DIRECTIONS):
+            inside = self.in_domain(x + dx, y + dy)
+            move[:, a] = np.where(inside, states + dy * self._width + dx,
+                                  states)
+
+        a = np.arange(len(DIRECTIONS))
+        right, left = (a - 1) % len(a), (a + 1) % len(a)
+        return np.stack([move, move[:, right], move[:, left]])
+
+    def _compute_next_state(self, state, action):
+        """ Compute next states from the map (see :meth:`next_state`) """
+        state, action = np.broadcast_arrays(state, action)
+        n_a = len(DIRECTIONS)
+        actions = np.stack([action, (action - 1) % n_a, (action + 1) % n_a])
+        directions = np.array(DIRECTIONS)
+        x = state % self._width + directions[actions, 0]
+        y = state // self._width + directions[actions, 1]
+        inside = self.in_domain(x, y)
+        return np.where(inside, y * self._width + x, state).astype(np.int32)
+
+    def blocks(self, block_size=1 << 20):
+        """ Stream over the states in blocks
+
+        Yields
+        -------
+        states : array-like
+            State ids of the block
+        next_states : array-like, shape (3, len(states), A)
+            Next states of the block, see :meth:`next_state_block`
+
+        """
+        for start in range(0, self.grid.size, block_size):
+            states = np.arange(start, min(start + block_size,
+                                          self.grid.size))
+            yield states, self.next_state_block(states)
+
+    def cell(self, state):
+        """ Cell ``(x, y)`` of a state """
+        return int(state % self._width), int(state // self._width)
+
+    def status(self, state):
+        """ Status of the cell of a state, e.g. ``'free'`` """
+        return STATUS[self.grid.flat[state]]
 
     def terminal(self, state):
-        """ Check if a state is terminal"""
-        return self.states[state].status == 'terminal'
+        """ Check if a state (or an array of states) is terminal """
+        return self.grid.ravel()[state] == STATUS.index(TERMINAL)
 
     def visualize(self, ax, **kwargs):
         ax = self._setup_visuals(ax)
@@ -256,8 +389,8 @@ class GridWorld(Domain):
         return ax
 
     def in_domain(self, x, y):
-        """ Check if a cell is in the domain """
-        return (x, y) in self.state_map
+        """ Check if a cell (or arrays of cells) is in the domain """
+        return (0 <= x) & (x < self._width) & (0 <= y) & (y < self._height)
 
     def _setup_visuals(self, ax):
         """ Setup the visual front end for gridworld
@@ -310,41 +443,131 @@ class GridWorld(Domain):
         return ax
 
     def generate_trajectories(self, policy, num=5, starts=None,
-                              random_state=None):
-        """ Generate trajectories of varying lengths using a policy """
+                              random_state=None, wind=0.0, max_len=None):
+        """ Generate trajectories of varying lengths using a policy
+
+        All trajectories are rolled out together, one step at a time, using
+        the next state table of the world. Trajectories end with a
+        ``(state, STAY)`` pair on reaching a terminal state.
+
+        Parameters
+        -----------
+        policy : array-like, shape (S,)
+            Action of every state
+        num : int, optional (default: 5)
+            Number of trajectories, ignored if `starts` are given
+        starts : array-like, optional (default: None)
+            Start states, uniformly random if None
+        random_state : :class:`numpy.RandomState`, optional (default: None)
+            Random number generator for start states and wind
+        wind : float, optional (default: 0.0)
+            Probability of the wind outcomes (split equally), as in
+            :class:`GTransition`. Moves are deterministic if 0
+        max_len : int, optional (default: None)
+            Maximum number of steps, the number of cells if None. With 0,
+            only trajectories starting at terminal states are not empty
+
+        Returns
+        --------
+        demos : :class:`funzo.utils.DemonstrationSet`
+            The packed trajectories of (state, action) pairs
+
+        """
         assert num > 0, 'Number of trajectories must be greater than zero'
+        rng = check_random_state(random_state)
         if starts is not None:
             assert isinstance(starts, Iterable),\
                 '{} expects an iterable for *starts*'\
                 .format(self.generate_trajectories.__name__)
-            num = len(starts)
-
-        controller = GTransition(domain=self)
-        trajs = list()
-        for i in range(num):
-            traj = list()
-            if starts is None:
-                state = self._pick_random_state(random_state)
-            else:
-                state = starts[i]
-
+            state = np.array(starts, dtype=np.int64)
+        else:
+            state = rng.randint(self.grid.size, size=num)
+        if max_len is None:
             max_len = self._width * self._height
-            while len(traj) < max_len and not self.terminal(state):
-                action = policy[state]
-                traj.append((state, action))
-                next_state = controller(state, action)[0][1]
-                state = next_state
+        assert max_len >= 0, 'Maximum trajectory length must be >= 0'
+
+        policy = np.asarray(policy)
+        n_traj = len(state)
+        traj = np.arange(n_traj)
+        steps = list()
+        for t in range(max_len + 1):
+            if len(state) == 0:
+                break
+            # stop at terminal states or the maximum length
+            done = self.terminal(state)
+            if t == max_len:
+                traj, state, done = traj[done], state[done], done[done]
+            action = np.where(done, STAY, policy[state])
+            steps.append((traj, state, action))
+
+            go = ~done
+            traj, state, action = traj[go], state[go], action[go]
+
+            outcome = np.zeros(len(state), dtype=np.int64)
+            if wind > 0:
+                u = rng.uniform(size=len(state))
+                outcome = (u >= 1.0 - wind).astype(np.int64) +\
+                    (u >= 1.0 - wind / 2.0)
+            state = self.next_state(state, action)[outcome,
+                                                   np.arange(len(state))]
+
+        # flat pairs ordered by trajectory, then by time
+        empty = np.zeros(0, dtype=np.int64)
+        trajs, states, actions = [np.concatenate([empty] + list(x))
+                                  for x in zip(*steps)] or (empty,) * 3
+        order = np.argsort(trajs, kind='mergesort')
+        offsets = np.zeros(n_traj + 1, dtype=np.int64)
+        offsets[1:] = np.cumsum(np.bincount(trajs, minlength=n_traj))
+        return DemonstrationSet(states[order], actions[order], offsets)
+
+
+class _GridStates(Mapping):
+    """ Read only mapping of state ids to lazily created :class:`GState` """
+    def __init__(self, world):
+        self._world = world
+
+    def __getitem__(self, state):
+        if state not in self:
+            raise KeyError(state)
+        world = self._world
+        return GState(state, world.cell(state), world.status(state))
+
+    def __contains__(self, state):
+        return isinstance(state, (int, np.integer)) and 0 <= state < len(self)
+
+    def __iter__(self):
+        return iter(range(len(self)))
 
-            if self.terminal(state):
-                traj.append((state, 4))  # FIXME
+    def __len__(self):
+        return self._world.grid.size
 
-            trajs.append(traj)
-        return trajs
+    def keys(self):
+        """ State ids in an indexable container """
+        return range(len(self))
 
-    def _pick_random_state(self, random_state=None):
-        rng = check_random_state(random_state)
-        state = rng.randint(len(self.states))
-        return state
+
+class _GridStateMap(Mapping):
+    """ Read only mapping of cells ``(x, y)`` to state ids """
+    def __init__(self, world):
+        self._world = world
+
+    def __getitem__(self, cell):
+        if cell not in self:
+            raise KeyError(cell)
+        return int(cell[1] * self._world.grid.shape[1] + cell[0])
+
+    def __contains__(self, cell):
+        try:
+            x, y = cell
+        except (TypeError, ValueError):
+            return False
+        return bool(self._world.in_domain(x, y))
+
+    def __iter__(self):
+        return (self._world.cell(s) for s in range(len(self)))
+
+    def __len__(self):
+        return self._world.grid.size
 
 
 class GridWorldMDP(MDP):
@@ -369,5 +592,5 @@ class GridWorldMDP(MDP):
     def actions(self, state):
         """ Get the set of actions available at a state """
         if self._domain.terminal(state):
-            return [4]
+            return [STAY]
         return self._domain.actions.keys()
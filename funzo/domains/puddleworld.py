@@ -13,7 +13,7 @@ from ..models.mdp import MDP
 from ..models.mdp import TabularRewardFunction, LinearRewardFunction
 from ..models.mdp import MDPTransition, MDPState, MDPAction
 
-from .geometry import distance_to_segment, edist, discretize_space
+from .geometry import segment_distance, edist, discretize_space
 
 
 __all__ = [
@@ -67,15 +67,30 @@ class Puddle(object):
         self.end = np.array([self._validate(x2), self._validate(y2)])
 
     def cost(self, x, y):
-        d, inside = distance_to_segment((x, y), self.start, self.end)
-        if inside:
-            if d < self.radius:
-                return -self.PUDDLE_COST * (self.radius - d)
-        else:
-            d = min(edist((x, y), self.start), edist((x, y), self.end))
-            if d < self.radius:
-                return -self.PUDDLE_COST * (self.radius - d)
-        return 0.0
+        """ Cost of the puddle at a location """
+        return float(self.cost_field([(x, y)])[0])
+
+    def cost_field(self, xy):
+        """ Cost of the puddle at many locations
+
+        The cost grows linearly with the depth inside the puddle, i.e. with
+        the distance from the puddle boundary (a capsule around the center
+        line).
+
+        Parameters
+        -----------
+        xy : array-like, shape (n, 2)
+            The (x, y) locations
+
+        Returns
+        --------
+        cost : array-like, shape (n,)
+            Puddle costs, negative inside the puddle and zero outside
+
+        """
+        d = segment_distance(xy, self.start, self.end)
+        return np.where(d < self.radius,
+                        -self.PUDDLE_COST * (self.radius - d), 0.0)
 
     @property
     def location(self):
@@ -104,28 +119,42 @@ class PuddleReward(TabularRewardFunction):
         self._sr = step_reward
 
         # pre-compute _R
-        self._R = np.array([self(s, 0) for s in self._domain.states])
+        self._R = self.reward_vector(action=0)
 
     def __call__(self, state, action):
-        state_ = self._domain.states[state]
-        if action is not None:
-            s_p = self._T(state, action)[0][1]
-            if self._domain.terminal(s_p):
-                return 10.0
-            if s_p == state:  # out or domain movements penalty
-                return -0.1
-            state_ = self._domain.states[s_p]
+        return float(self.reward_vector([state], action)[0])
 
-        p_cost = np.sum(p.cost(state_.location[0], state_.location[1])
-                        for p in self._domain.puddles)
-        return -self._sr + p_cost
+    def reward_vector(self, states=None, action=None):
+        """ Evaluate the rewards of many (default all) states
+
+        Uses the puddle costs cached by the domain. If `action` is given,
+        the rewards are of the states reached using it.
+
+        """
+        domain = self._domain
+        if states is None:
+            states = np.arange(len(domain.states))
+        states = np.asarray(states, dtype=int)
+        if action is None:
+            return -self._sr + domain.puddle_costs[states]
+
+        s_p = domain.next_state(states, action)
+        R = -self._sr + domain.puddle_costs[s_p]
+        R[s_p == states] = -0.1  # out or domain movements penalty
+        R[domain.terminal(s_p)] = 10.0
+        return R
 
     def __len__(self):
         return len(self._domain.states)
 
 
 class PuddleRewardLFA(LinearRewardFunction):
-    """ Reward function for the puddle using linear function approximation """
+    """ Reward function for the puddle using linear function approximation
+
+    The features do not depend on the action, hence cached state features
+    are used for evaluation.
+
+    """
     def __init__(self, weights, rmax=1.0, domain=None):
         super(PuddleRewardLFA, self).__init__(weights, rmax, domain)
         self._domain = model_domain(domain, PuddleWorld)
@@ -139,23 +168,30 @@ class PuddleRewardLFA(LinearRewardFunction):
             # if s_p == state:  # out or domain movements penalty
             #     return -0.1
 
-            return np.dot(self._weights, self.phi(s_p, action))
+            return np.dot(self._weights, self.feature_matrix()[s_p])
         else:
-            return np.dot(self._weights, self.phi(state, action))
+            return np.dot(self._weights, self.feature_matrix()[state])
 
     def phi(self, state, action):
         """ Evaluate the reward features for state-action pair """
         state_ = self._domain.states[state]
-        return np.array([self._feature_puddle(state_),
-                        self._feature_goal_distance(state_)])
+        return np.array([getattr(self, f)(state_)
+                         for f in self._feature_names])
+
+    def phi_batch(self, states, action=None):
+        """ Evaluate the reward features of many states at once """
+        states = np.asarray(states, dtype=int)
+        columns = {
+            '_feature_puddle': self._domain.puddle_costs[states],
+            '_feature_goal_distance': self._domain.goal_distances[states],
+        }
+        return np.column_stack([columns[f] for f in self._feature_names])
 
     def _feature_puddle(self, state):
-        p_cost = np.sum(p.cost(state.location[0], state.location[1])
-                        for p in self._domain.puddles)
-        return p_cost
+        return self._domain.puddle_costs[state.id]
 
     def _feature_goal_distance(self, state):
-        return edist(state.location, (0.95, 0.95))
+        return self._domain.goal_distances[state.id]
 
 #############################################################################
 
@@ -239,20 +275,9 @@ class PWTransition(MDPTransition):
             A list of all possible next states [(prob, state)]
 
         """
-        state_ = self._domain.states[state]
-        action_ = self._domain.actions[action]
-
         # noise = np.random.normal(0.0, scale=0.01)
         # TODO - fixme (the noise should only be in the chosen direction)
-        action_vector = action_.direction
-        next_state = state_.location + action_vector
-
-        # check if in world,, find its id
-        if self._domain.in_domain(next_state):
-            ns_id = self._domain.find_state(next_state[0], next_state[1])
-            if ns_id is not None:
-                return [(1.0, ns_id)]
-        return [(1.0, state)]
+        return [(1.0, int(self._domain.next_state(state, action)))]
 
 
 #############################################################################
@@ -269,6 +294,10 @@ class PuddleWorld(Domain):
 
         a, b = discretize_space((0, 1, resolution), (0, 1, resolution))
         self.w, self.h = a.shape
+        self._resolution = resolution
+        # cell center coordinates along each axis, for state lookup
+        self._xs = a[:, 0] + resolution / 2.
+        self._ys = b[0, :] + resolution / 2.
         for i in range(self.w):
             for j in range(self.h):
                 x, y = a[i, j] + resolution / 2., b[i, j] + resolution / 2.
@@ -286,10 +315,31 @@ class PuddleWorld(Domain):
         self.puddles.append(Puddle(0.1, 0.75, 0.45, 0.75, 0.1))
         self.puddles.append(Puddle(0.45, 0.4, 0.45, 0.8, 0.1))
 
+        # per state quantities, by state id
+        self.locations = np.column_stack((a.ravel(), b.ravel())) +\
+            resolution / 2.
+        self.puddle_costs = np.sum([p.cost_field(self.locations)
+                                    for p in self.puddles], axis=0)
+        self.goal_distances = np.hypot(self.locations[:, 0] - 0.95,
+                                       self.locations[:, 1] - 0.95)
+
     def terminal(self, state):
-        """ Check if a state is terminal"""
-        state_ = self.states[state]
-        return state_.location[0] > 0.95 and state_.location[1] > 0.95
+        """ Check if a state (or an array of states) is terminal """
+        location = self.locations[state].T
+        return (location[0] > 0.95) & (location[1] > 0.95)
+
+    def next_state(self, state, action):
+        """ Next states of (arrays of) states using an action
+
+        Moves leading outside the world stay in the same state.
+
+        """
+        state = np.asarray(state, dtype=int)
+        location = self.locations[state] + self.actions[action].direction
+        x, y = location[..., 0], location[..., 1]
+        inside = (0.0 < x) & (x < 1.0) & (0.0 < y) & (y < 1.0)
+        found = self.find_states(location).reshape(state.shape)
+        return np.where(inside & (found >= 0), found, state)
 
     def in_domain(self, location):
         """ Check if a state value is within domain bounds """
@@ -304,10 +354,36 @@ class PuddleWorld(Domain):
         return ax
 
     def find_state(self, x, y):
-        for s in self.states:
-            if edist(self.states[s].location, (x, y)) < 1e-07:
-                return s
-        return None
+        """ Find the id of the state at a location, None if there is none """
+        state = self.find_states([(x, y)])[0]
+        if state < 0:
+            return None
+        return int(state)
+
+    def find_states(self, locations):
+        """ Find the ids of the states at many locations
+
+        States are laid out on a regular grid, hence the ids are computed
+        from the nearest grid indices, which are then checked for a match.
+
+        Parameters
+        -----------
+        locations : array-like, shape (n, 2)
+            The (x, y) locations
+
+        Returns
+        --------
+        states : array-like, shape (n,)
+            State ids, -1 for locations not matching a state
+
+        """
+        xy = np.asarray(locations, dtype=float).reshape(-1, 2)
+        i = np.rint((xy[:, 0] - self._xs[0]) / self._resolution).astype(int)
+        j = np.rint((xy[:, 1] - self._ys[0]) / self._resolution).astype(int)
+        valid = (0 <= i) & (i < self.w) & (0 <= j) & (j < self.h)
+        i, j = np.clip(i, 0, self.w - 1), np.clip(j, 0, self.h - 1)
+        d = np.hypot(self._xs[i] - xy[:, 0], self._ys[j] - xy[:, 1])
+        return np.where(valid & (d < 1e-07), i * self.h + j, -1)
 
     @property
     def shape(self):
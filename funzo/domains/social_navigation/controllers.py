@@ -74,6 +74,11 @@ class LinearController(MDPLocalController):
 
         return None
 
+    @property
+    def resolution(self):
+        """ Distance between way-points at unit speed """
+        return self._resolution
+
     def trajectory(self, source, target, **kwargs):
         """ Compute the local trajectory to connect two states """
         source = np.asarray(source)
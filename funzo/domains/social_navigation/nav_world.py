@@ -156,10 +156,6 @@ class CGSocialNavigationMDP(MDP):
         self._domain = model_domain(domain, SocialNavigationWorld)
         self._controller = controller
 
-        # TODO
-        # - Define T to extract edges at a node and put them in the standard
-        # format
-
     def setup_CG(self, params, samples=None):
         """ Setup the controller graph """
 
@@ -177,9 +173,19 @@ class CGSocialNavigationMDP(MDP):
         return self._cg._g
 
     def T(self, state, action):
-        """ Perform transion on the CG """
-        # in the CG state is node id, action is edge id
-        pass
+        """ Perform transion on the CG
+
+        In the CG a state is a node id and an action is an out-going edge,
+        i.e. a (source, target) pair, which deterministically leads to its
+        target node. See :class:`funzo.planners.GraphValueIteration` for
+        planning with the edge durations.
+
+        """
+        source, target = action
+        if source != state:
+            raise ValueError('Edge ({}--{}) does not start at state {}'
+                             .format(source, target, state))
+        return [(1.0, target)]
 
     @property
     def S(self):
@@ -2,11 +2,13 @@
 import numpy as np
 
 from nose.tools import assert_equal
-from numpy.testing import assert_array_equal
+from numpy.testing import assert_array_equal, assert_array_almost_equal
 
 from funzo.domains.geometry import discretize_space
 from funzo.domains.geometry import edist
 from funzo.domains.geometry import distance_to_segment
+from funzo.domains.geometry import segment_distance, segment_distances
+from funzo.domains.geometry import normangle, pairwise_distances
 
 
 def test_distance_to_segment():
@@ -33,6 +35,41 @@ def test_distance_to_segment():
     assert_equal(distance_to_segment(x5, ls, le)[1], True)
 
 
+def test_segment_distance():
+    ls = np.array([1.0, 3.0])
+    le = np.array([3.0, 1.0])
+    points = [[2.0, 2.0], [4.0, 0.0], [3.0, 3.0], [0.0, 3.0], [1.0, 1.0]]
+    assert_array_almost_equal(segment_distance(points, ls, le),
+                              [0.0, np.sqrt(2), np.sqrt(2), 1.0, np.sqrt(2)])
+    assert_array_almost_equal(segment_distance([[1.0, 2.0]], ls, ls), [1.0])
+
+    # one column per segment, matching the single segment distances
+    starts = np.array([ls, [0.0, 0.0]])
+    ends = np.array([le, [0.0, 4.0]])
+    D = segment_distances(points, starts, ends)
+    assert D.shape == (5, 2)
+    assert_array_almost_equal(D[:, 0], segment_distance(points, ls, le))
+    assert_array_almost_equal(D[:, 1], [2.0, 4.0, 3.0, 0.0, 1.0])
+
+    x3 = np.array([4.0, 1.0])
+    assert_equal(distance_to_segment(x3, ls, le), (1.0, False))
+
+
+def test_normangle():
+    assert_equal(normangle(0.5), 0.5)
+    assert_array_almost_equal(normangle(2.5 * np.pi), 0.5 * np.pi)
+    assert_array_almost_equal(normangle([-0.5 * np.pi, 3 * np.pi], -np.pi),
+                              [-0.5 * np.pi, -np.pi])
+    assert_equal(normangle(np.inf), np.inf)
+
+
+def test_pairwise_distances():
+    X = np.array([[0.0, 0.0, 1.0], [3.0, 4.0, 2.0]])
+    assert_array_almost_equal(pairwise_distances(X), [[0, 5], [5, 0]])
+    assert_array_almost_equal(pairwise_distances(X, [[0.0, 4.0]]), [[4], [3]])
+    assert_array_almost_equal(edist(X, (0, 0)), [0, 5])
+
+
 def test_edist():
     # toy data
     pose1 = np.array([2, 2])
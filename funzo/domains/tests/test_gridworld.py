@@ -1,9 +1,130 @@
+import os
+import shutil
+import tempfile
 
+import numpy as np
 
+from numpy.testing import assert_allclose
 
 from funzo.domains.gridworld import GState, GAction, GTransition, GReward
-from funzo.domains.gridworld import GridWorld
+from funzo.domains.gridworld import GRewardLFA, GridWorld, GridWorldMDP
+from funzo.models.mdp import LinearRewardFunction
 
 
 def test_gridword_init():
     assert 1
+
+
+def test_reward_lfa_features():
+    gmap = np.zeros(shape=(3, 3))
+    gmap[0, 2] = 2
+    gmap[1, 1] = 1
+    with GridWorld(gmap) as world:
+        reward = GRewardLFA(weights=[0.2, -0.5, 0.7])
+        mdp = GridWorldMDP(reward, GTransition(), 0.9)
+
+        phi = np.array([reward.phi(s, None) for s in sorted(world.states)])
+        assert_allclose(reward.feature_matrix(), phi)
+        assert_allclose(reward.phi_batch([4, 2]), phi[[4, 2]])
+        assert_allclose(LinearRewardFunction.phi_batch(reward, range(9)), phi)
+        assert reward.feature_tensor().shape == (9, 5, 3)
+        assert_allclose(reward.reward_matrix()[:, 0],
+                        phi.dot([0.2, -0.5, 0.7]))
+
+        # features are reused for new weights
+        reward.update_parameters(reward=np.array([1.0, 0.0, -1.0]))
+        R = [mdp.R(s, None) for s in mdp.S]
+        assert_allclose(mdp.compile().reward_vector(), R)
+        assert_allclose(reward.reward_vector(), phi.dot([1.0, 0.0, -1.0]))
+
+
+def test_gridworld_arrays():
+    gmap = [[0, 0, 2],
+            [0, 1, 0],
+            [0, 0, 0]]
+    world = GridWorld(gmap)
+    assert len(world.states) == 9
+    assert world.goal == (2, 2)
+    assert world.terminal(8) and not world.terminal(0)
+
+    # state views are created on demand and agree with the cell maps
+    state = world.states[4]
+    assert state.cell == (1, 1) and state.status == 'obstacle'
+    assert world.state_map[(2, 1)] == 5
+    assert (3, 0) not in world.state_map
+    assert 9 not in world.states
+
+    # right move, with wind to STAY (right turn) and UP (left turn)
+    assert_allclose(world.next_states[:, 0, 0], [1, 0, 3])
+    # moves outside of the world stay in place
+    assert_allclose(world.next_states[:, 2, 0], [2, 2, 5])
+    controller = GTransition(wind=0.2, domain=world)
+    assert controller(0, 1) == [(0.8, 3), (0.1, 1), (0.1, 0)]
+
+
+def test_gridworld_rectangular_lazy():
+    gmap = np.zeros(shape=(3, 5))
+    gmap[0, 4] = 2
+    gmap[1, 1:3] = 1
+    world = GridWorld(gmap)
+    lazy = GridWorld(gmap, lazy=True)
+    assert len(world.states) == 15 and lazy.next_states is None
+    assert world.goal == lazy.goal == (4, 2)
+
+    states = np.arange(15)
+    assert_allclose(lazy.next_state_block(states), world.next_states)
+    assert_allclose(lazy.next_state(states, 2), world.next_states[:, :, 2])
+    blocks = list(lazy.blocks(block_size=4))
+    assert len(blocks) == 4
+    assert_allclose(blocks[-1][1], world.next_states[:, 12:])
+
+    # rewards of lazy worlds are computed from the map
+    reward = GReward(domain=lazy)
+    assert_allclose(reward.reward_vector(), GReward(domain=world)._R)
+    assert reward(14, None) == 1.0
+
+
+def test_gridworld_from_file():
+    gmap = np.zeros(shape=(2, 3), dtype=int)
+    gmap[0, 2] = 2
+    tmp = tempfile.mkdtemp()
+    try:
+        np.save(os.path.join(tmp, 'map.npy'), gmap)
+        np.savetxt(os.path.join(tmp, 'map.csv'), gmap, fmt='%d',
+                   delimiter=',')
+        for name in ('map.npy', 'map.csv'):
+            world = GridWorld.from_file(os.path.join(tmp, name))
+            assert_allclose(world.grid, np.flipud(gmap))
+    finally:
+        shutil.rmtree(tmp)
+
+
+def test_generate_trajectories():
+    gmap = np.zeros(shape=(3, 3))
+    gmap[0, 2] = 2
+    world = GridWorld(gmap)
+    policy = np.array([0, 0, 1, 0, 0, 1, 0, 0, 4])  # right, then up
+
+    demos = world.generate_trajectories(policy, starts=[0, 8, 4])
+    assert len(demos) == 3
+    assert_allclose(demos[0], [[0, 0], [1, 0], [2, 1], [5, 1], [8, 4]])
+    assert_allclose(demos[1], [[8, 4]])
+    assert_allclose(demos[2], [[4, 0], [5, 1], [8, 4]])
+
+    short = world.generate_trajectories(policy, starts=[0], max_len=2)
+    assert_allclose(short[0], [[0, 0], [1, 0]])
+
+    # trajectories without steps are kept empty
+    none = world.generate_trajectories(policy, starts=[0, 8, 4], max_len=0)
+    assert_allclose(none.lengths, [0, 1, 0])
+    assert_allclose(none[1], [[8, 4]])
+    assert len(world.generate_trajectories(policy, num=3, max_len=0)) == 3
+    assert len(world.generate_trajectories(policy, starts=[])) == 0
+
+    # wind moves some of the agents off the deterministic path
+    demos = world.generate_trajectories(policy, num=500, wind=0.5,
+                                        random_state=0)
+    assert len(demos) == 500
+    assert np.all(demos.lengths <= 10)
+    assert demos.n_pairs > world.generate_trajectories(
+        policy, num=500, random_state=0).n_pairs
@@ -0,0 +1,39 @@
+import numpy as np
+
+from numpy.testing import assert_equal, assert_allclose
+
+from funzo.domains.puddleworld import PuddleWorld, PWTransition
+from funzo.domains.puddleworld import Puddle, PuddleReward
+
+
+def test_find_states():
+    world = PuddleWorld(start=(0.3, 0.65), resolution=0.1)
+    locations = np.array([world.states[s].location for s in world.states])
+    assert_equal(world.find_states(locations), sorted(world.states))
+    assert_equal(world.find_states([(0.33, 0.5), (1.05, 0.05)]), [-1, -1])
+
+    assert world.find_state(0.35, 0.65) == 36
+    assert world.find_state(0.33, 0.65) is None
+
+    controller = PWTransition(domain=world)
+    assert controller(36, 0) == [(1.0, 37)]
+    assert controller(9, 0) == [(1.0, 9)]
+
+
+def test_puddle_costs():
+    puddle = Puddle(0.1, 0.75, 0.45, 0.75, 0.1)
+    xy = [(0.3, 0.75), (0.3, 0.7), (0.05, 0.75), (0.5, 0.8), (0.3, 0.9)]
+    assert_allclose(puddle.cost_field(xy), [-40.0, -20.0, -20.0, -400 * (
+                    0.1 - np.hypot(0.05, 0.05)), 0.0])
+    assert_allclose(puddle.cost(0.3, 0.7), -20.0)
+
+    world = PuddleWorld(start=(0.3, 0.65), resolution=0.05)
+    costs = [sum(p.cost(*world.states[s].location) for p in world.puddles)
+             for s in world.states]
+    assert_allclose(world.puddle_costs, costs)
+
+    reward = PuddleReward(domain=world)
+    assert_allclose(reward.reward_vector(), np.asarray(costs) - 0.1)
+    assert reward(399, None) == costs[399] - 0.1
+    assert reward(398, 0) == 10.0  # moving up into the goal
+    assert reward(19, 3) == -0.1  # moving out of the world
@@ -1,5 +1,6 @@
 
 from .priors import RewardPriorBase, GaussianRewardPrior, UniformRewardPrior
+from .priors import LaplaceRewardPrior, BetaRewardPrior, MixtureRewardPrior
 
 from .mcmc_birl import PolicyWalkBIRL, PolicyWalkProposal
 
@@ -12,6 +13,7 @@ __all__ = [
     'BIRLBase',
     #
     'RewardPriorBase', 'GaussianRewardPrior', 'UniformRewardPrior',
+    'LaplaceRewardPrior', 'BetaRewardPrior', 'MixtureRewardPrior',
     #
     'PolicyWalkBIRL', 'PolicyWalkProposal',
     #
@@ -4,11 +4,18 @@ BIRL algorithms
 """
 from __future__ import division
 
+import numpy as np
+import scipy.sparse as sp
+import scipy.sparse.linalg as spla
 
-from scipy.misc import logsumexp
+try:
+    from scipy.special import logsumexp
+except ImportError:
+    from scipy.misc import logsumexp
 
 from ..irl_base import IRLSolver
 from ...utils.validation import check_random_state
+from ...utils.data_structures import DemonstrationSet
 
 
 class BIRLBase(IRLSolver):
@@ -49,10 +56,11 @@ class BIRLBase(IRLSolver):
         self._prior = prior
         self._beta = beta
         self._rng = check_random_state(random_state)
+        self._packed = (None, None)
 
-    def initialize_reward(self):
+    def initialize_reward(self, random_state=None):
         """ Initialize a reward vector using the prior distribution """
-        r = self._prior.sample()
+        r = self._prior.sample(random_state=random_state)
         return r
 
     def log_posterior(self, r, demos, mdp, plan_r):
@@ -78,21 +86,24 @@ class BIRLBase(IRLSolver):
 
         where :math:`d` are trajectories or sets of state-action pairs.
 
+        The per state normalizer is computed once for all states and the
+        demonstrations are gathered from flat index arrays, with a mean
+        per trajectory over the segments given by the offsets.
+
         """
-        llk = 0.0
-        M = len(demos)
-        for traj in demos:
-            if len(traj) > 0:
-                H = len(traj)
-                alpha_H = 0.0
-                beta_H = 0.0
-                for (s, a) in traj:
-                    alpha_H += self._beta * Q_r[a, s]
-                    beta_Hs = [self._beta * Q_r[b, s] for b in mdp.A]
-                    beta_H += logsumexp(beta_Hs)
-
-                llk += (alpha_H - beta_H) / float(H)
-        llk /= float(M)
+        states, actions, offsets = self._pack(demos)
+        M = len(offsets) - 1
+        if len(states) == 0:
+            return 0.0
+
+        BQ = self._beta * np.asarray(Q_r)
+        log_z = logsumexp(BQ, axis=0)
+        llk_sa = BQ[actions, states] - log_z[states]
+
+        lengths = np.diff(offsets)
+        nonempty = lengths > 0
+        llk_traj = np.add.reduceat(llk_sa, offsets[:-1][nonempty])
+        llk = np.sum(llk_traj / lengths[nonempty]) / float(M)
 
         return llk
 
@@ -107,3 +118,104 @@ class BIRLBase(IRLSolver):
 
         """
         return self._prior.log_p(r)
+
+    def grad_log_posterior(self, r, demos, mdp, plan_r):
+        """ Gradient of the (unnormalized) reward posterior w.r.t. reward
+
+        .. math::
+
+            \\nabla_r \log p(r | D) = \\nabla_r \log p(D | r) +
+            \\nabla_r \log p(r)
+
+        """
+        grad_llk = self.grad_log_likelihood(r, demos, mdp, plan_r)
+        return grad_llk + self._prior.grad_log_p(r)
+
+    def grad_log_likelihood(self, r, demos, mdp, plan_r):
+        """ Analytic gradient of the demonstration log likelihood
+
+        The gradient w.r.t. :math:`Q` is given by the Boltzmann policy,
+        :math:`\\beta (c(s, a) - n(s) \pi_{\\beta}(a | s))` with :math:`c` the
+        (weighted) demonstration counts and :math:`n(s) = \sum_a c(s, a)`. It
+        is carried back to the state values and, through the Bellman
+        equation of the greedy policy :math:`\pi^*` of the plan, to the state
+        rewards,
+
+        .. math::
+
+            \\nabla_R \log p(D | r) = (I - \gamma P_{\pi^*})^{-\\top} \gamma
+            \sum_a P_a^{\\top} \\nabla_{Q_a} \log p(D | r)
+
+        i.e. the discounted state visitation frequencies of :math:`\pi^*`.
+        Finally the chain rule with the Jacobian of the reward function
+        gives the gradient w.r.t. the reward parameters. Hence, a gradient
+        costs one sparse linear solve in addition to the planning of the
+        forward pass. Requires an MDP that can be compiled, see
+        :meth:`funzo.models.MDP.compile`.
+
+        """
+        cmdp = mdp.compile()
+        states, actions, offsets = self._pack(demos)
+        M = len(offsets) - 1
+        if len(states) == 0:
+            return np.zeros(len(r))
+
+        lengths = np.diff(offsets)
+        nonempty = lengths > 0
+        weights = np.repeat(1.0 / (M * lengths[nonempty]), lengths[nonempty])
+        counts = np.zeros((cmdp.n_actions, cmdp.n_states))
+        np.add.at(counts, (actions, states), weights)
+
+        Q = np.asarray(plan_r['Q'])
+        BQ = self._beta * Q
+        pi_b = np.exp(BQ - logsumexp(BQ, axis=0))
+        grad_Q = self._beta * (counts - pi_b * counts.sum(axis=0))
+
+        gamma = cmdp.gamma
+        grad_V = gamma * sum(P_a.T.dot(g) for P_a, g in zip(cmdp.P, grad_Q))
+
+        # greedy policy over available actions, as the planners use
+        pi = np.argmax(np.where(cmdp.action_mask.T, Q, -np.inf), axis=0)
+        P_pi = sum(sp.diags((pi == a).astype(float)).dot(P_a)
+                   for a, P_a in enumerate(cmdp.P))
+        I = sp.identity(cmdp.n_states, format='csr')
+        grad_R = spla.spsolve(sp.csc_matrix((I - gamma * P_pi).T), grad_V)
+
+        J = self._reward_jacobian(r, mdp, cmdp)
+        if J is None:
+            return grad_R
+        return J.T.dot(grad_R)
+
+    def _reward_jacobian(self, r, mdp, cmdp):
+        """ Jacobian of the state rewards w.r.t. the reward parameters
+
+        None stands for the identity of tabular state rewards and the
+        (cached) features for linear rewards, while other rewards are
+        differentiated numerically, which requires no planning.
+
+        """
+        reward = mdp.reward
+        if reward.kind == 'Tabular' and len(r) == cmdp.n_states:
+            return None
+
+        if reward.kind == 'LFA':
+            return reward.feature_matrix(cmdp.S)
+
+        r = np.asarray(r, dtype=float)
+        R = cmdp.reward_vector()
+        J = np.empty((cmdp.n_states, len(r)))
+        for k in range(len(r)):
+            r_k = np.array(r)
+            r_k[k] += 1e-06
+            reward.update_parameters(reward=r_k)
+            J[:, k] = (cmdp.reward_vector() - R) / 1e-06
+        reward.update_parameters(reward=r)
+        return J
+
+    def _pack(self, demos):
+        """ Flat state and action arrays of the demonstrations, cached """
+        if isinstance(demos, DemonstrationSet):
+            return demos.pack()
+        if self._packed[0] is not demos:
+            self._packed = (demos, DemonstrationSet.from_trajectories(demos))
+        return self._packed[1].pack()
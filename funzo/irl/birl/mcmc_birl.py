@@ -5,6 +5,7 @@ BIRL algorithms with MCMC based inference
 from __future__ import division, absolute_import
 
 import six
+import multiprocessing
 
 import numpy as np
 
@@ -17,25 +18,54 @@ from .birl_base import BIRLBase
 from ...base import Model
 from ...utils.validation import check_random_state
 from ...utils.data_structures import Trace
+from ...utils.diagnostics import gelman_rubin
 
 
 __all__ = ['PolicyWalkBIRL', 'PolicyWalkProposal']
 
 
 class PolicyWalkBIRL(BIRLBase):
-    """ BIRL using PolicyWalk algorithm for inference """
+    """ BIRL using PolicyWalk algorithm for inference
+
+    Several independent chains can be run, optionally in parallel using a
+    process pool. Every chain then uses its own random number generator,
+    seeded from `random_state`, and the resulting trace has a chain
+    dimension, i.e. every recorded entry is stacked over the chains. The
+    potential scale reduction factor (R-hat) of the reward samples across
+    chains is recorded as ``r_hat`` for convergence diagnosis, using the
+    samples after the burn-in period of each chain (NaN if there are less
+    than two).
+
+    Parameters
+    ----------
+    burn : float, optional (default: 0.27)
+        Fraction of the iterations of each chain discarded as burn-in, in
+        [0, 1)
+    n_chains : int, optional (default: 1)
+        Number of independent MCMC chains
+    n_jobs : int, optional (default: 1)
+        Number of processes used to run the chains, -1 uses all CPUs
+
+    """
     def __init__(self, prior, beta=0.7, delta=0.2, max_iter=100, burn=0.27,
-                 planner=None, random_state=None):
+                 planner=None, random_state=None, n_chains=1, n_jobs=1):
         super(PolicyWalkBIRL, self).__init__(prior, beta,
                                              planner, random_state)
 
+        if n_chains < 1:
+            raise ValueError('No. of chains must be >= 1')
+        self._n_chains = n_chains
+        if n_jobs == 0 or n_jobs < -1:
+            raise ValueError('No. of jobs must be >= 1, or -1 for all CPUs')
+        self._n_jobs = n_jobs
+
         if 0 >= max_iter > np.inf:
             raise ValueError('No. of iterations must be in (0, inf)')
         self._max_iter = max_iter
 
-        if 0.0 > burn >= 1.0:
+        if not 0.0 <= burn < 1.0:
             raise ValueError('burn ratio must be in [0, 1)')
-        self._burn = int(self._max_iter * burn / 100.0)
+        self._burn = int(self._max_iter * burn)
 
         if 0.0 >= delta > 1.0:
             raise ValueError('Reward steps (delta) must be in (0, 1)')
@@ -47,29 +77,83 @@ class PolicyWalkBIRL(BIRLBase):
             raise ValueError('BIRL requires an MDP model')
 
         v = ['step', 'r', 'r_mean', 'sample', 'a_ratio']
-        trace = Trace(v, save_interval=self._max_iter // 2)
+        if self._n_chains == 1:
+            trace = Trace(v, save_interval=self._max_iter // 2)
+            self._run_chain(demos, mdp, trace.record)
+            return trace
+
+        seeds = self._rng.randint(np.iinfo(np.int32).max,
+                                  size=self._n_chains)
+        jobs = [(self, demos, mdp, seed, i) for i, seed in enumerate(seeds)]
+        if self._n_jobs == 1:
+            chains = [_policy_walk_chain(job) for job in jobs]
+        else:
+            n_jobs = self._n_jobs if self._n_jobs > 0 else None
+            pool = multiprocessing.Pool(processes=n_jobs)
+            try:
+                chains = pool.map(_policy_walk_chain, jobs)
+            finally:
+                pool.close()
+                pool.join()
+
+        trace = Trace(v + ['r_hat'], save_interval=0)
+        for i in range(self._max_iter):
+            trace.record(**dict((k, np.array([c[k][i] for c in chains]))
+                                for k in v))
+        samples = np.array([c['r'][self._burn:] for c in chains])
+        if samples.shape[1] < 2:
+            # too few samples after the burn-in to estimate R-hat
+            trace.record(r_hat=np.full(samples.shape[2], np.nan))
+        else:
+            trace.record(r_hat=gelman_rubin(samples))
+
+        return trace
+
+    def _run_chain(self, demos, mdp, record, rng=None, desc='PolicyWalk'):
+        """ Run a single PolicyWalk chain, recording every step
 
-        proposal = PolicyWalkProposal(dim=len(mdp.reward), delta=self._delta)
+        If `rng` is not given, the solver's random number generator is used
+        for acceptance, while proposals and reward initialization use the
+        global one.
+
+        """
+        accept_rng = self._rng if rng is None else rng
+        proposal = PolicyWalkProposal(dim=len(mdp.reward), delta=self._delta,
+                                      random_state=rng)
 
-        r = self.initialize_reward()
+        r = self.initialize_reward(random_state=rng)
         plan_r = self.solve_mdp(mdp, r)
 
         r_mean = np.array(r)
-        for step in tqdm(range(1, self._max_iter + 1), desc='PolicyWalk'):
+        for step in tqdm(range(1, self._max_iter + 1), desc=desc):
             r_new = proposal.step(r)
-            plan_r_new = self.solve_mdp(mdp, r_new, plan_r['V'], plan_r['pi'])
+            plan_r_new = self._replan(mdp, r, r_new, plan_r)
             p_accept = self._acceptance_ratio(mdp, demos, r, r_new,
                                               plan_r, plan_r_new)
-            if self._rng.uniform() < min([1.0, p_accept]):
+            if accept_rng.uniform() < min([1.0, p_accept]):
                 r = np.array(r_new)
                 plan_r = deepcopy(plan_r_new)
 
             # if step > self._burn:
             r_mean = self._iterative_mean(r_mean, r, step)
-            trace.record(step=step, r=r, r_mean=r_mean, sample=r_new,
-                         a_ratio=p_accept)
+            record(step=step, r=r, r_mean=r_mean, sample=r_new,
+                   a_ratio=p_accept)
 
-        return trace
+    def _replan(self, mdp, r, r_new, plan_r):
+        """ Plan for the proposed reward, starting from the current plan
+
+        PolicyWalk proposals change a single reward entry. For tabular state
+        rewards, the changed state and the amount are passed on to the
+        planner to allow incremental re-planning.
+
+        """
+        index, delta = None, None
+        changed = np.flatnonzero(r_new != r)
+        tabular = mdp.reward.kind == 'Tabular' and len(r) == len(mdp.S)
+        if tabular and len(changed) == 1:
+            index = changed[0]
+            delta = r_new[index] - r[index]
+        return self.replan_mdp(mdp, r_new, plan_r, index, delta)
 
     def _acceptance_ratio(self, mdp, demos, r, r_new, plan_r, plan_r_new):
         """ Compute PolicyWalk acceptance ratio """
@@ -87,6 +171,20 @@ class PolicyWalkBIRL(BIRLBase):
         return new_sum / step
 
 
+def _policy_walk_chain(job):
+    """ Run one PolicyWalk chain with its own seed (process pool worker) """
+    solver, demos, mdp, seed, chain = job
+    records = dict()
+
+    def _record(**entry):
+        for k, v in entry.items():
+            records.setdefault(k, list()).append(v)
+
+    solver._run_chain(demos, mdp, _record, rng=np.random.RandomState(seed),
+                      desc='PolicyWalk chain {}'.format(chain))
+    return records
+
+
 ########################################################################
 
 
@@ -22,16 +22,30 @@ __all__ = ['MAPBIRL']
 class MAPBIRL(BIRLBase):
     """ BIRL using MAP for inference
 
+    The log posterior is maximized using L-BFGS-B. When the MDP can be
+    compiled (see :meth:`funzo.models.MDP.compile`), the analytic gradient
+    of :meth:`BIRLBase.grad_log_posterior` is used, such that an iteration
+    costs a single planning (forward) and linear solve (backward) pass,
+    with planning warm started from the previous value function. Otherwise
+    the gradient is estimated by finite differences, i.e. planning once per
+    reward dimension.
+
     .. note:: Returns a single estimate of the reward function
 
+    Parameters
+    ----------
+    analytic_gradient : bool, optional (default: True)
+        Use the analytic gradient when the MDP can be compiled
+
     """
     def __init__(self, prior, beta=0.7, max_iter=100,
-                 planner=None, random_state=None):
+                 planner=None, random_state=None, analytic_gradient=True):
         super(MAPBIRL, self).__init__(prior, beta, planner, random_state)
 
         if 0 >= max_iter > np.inf:
             raise ValueError('No. of iterations must be in (0, inf)')
         self._max_iter = max_iter
+        self._analytic_gradient = analytic_gradient
 
     def solve(self, demos, mdp=None):
         """ Solve the BIRL problem using MAP """
@@ -44,22 +58,41 @@ class MAPBIRL(BIRLBase):
         rmax = mdp.reward.rmax
         bounds = tuple((-rmax, rmax) for _ in range(len(mdp.reward)))
 
+        jac = self._analytic_gradient and _compilable(mdp)
+        last = dict(V=None)
+
         def _callback_optimization(x):
             """ Callback to catch the optimization progress """
             trace.record(r=x)
 
         def _objective(r):
             """ Objective function """
-            plan_r = self.solve_mdp(mdp, r)
-            return -self.log_posterior(r, demos, mdp, plan_r)
+            if not jac:
+                plan_r = self.solve_mdp(mdp, r)
+                return -self.log_posterior(r, demos, mdp, plan_r)
+
+            plan_r = self.solve_mdp(mdp, r, V_init=last['V'])
+            last['V'] = plan_r['V']
+            f = -self.log_posterior(r, demos, mdp, plan_r)
+            return f, -self.grad_log_posterior(r, demos, mdp, plan_r)
 
         res = minimize(fun=_objective,
                        x0=self.initialize_reward(),
                        method='L-BFGS-B',
-                       jac=False,
+                       jac=jac,
                        bounds=bounds,
+                       options=dict(maxiter=self._max_iter),
                        callback=_callback_optimization)
 
         trace.record(r_map=res.x, f=res.fun)
 
         return trace
+
+
+def _compilable(mdp):
+    """ Check if the MDP can be compiled into transition matrices """
+    try:
+        mdp.compile()
+    except (TypeError, ValueError, NotImplementedError):
+        return False
+    return True
@@ -1,6 +1,10 @@
 """
 Reward function prior distributions
 
+All priors factorize over the reward dimensions and are evaluated in closed
+form with array operations. Densities accept a single reward of shape
+``(dim,)`` or a batch of rewards of shape ``(n, dim)``.
+
 """
 
 from __future__ import division
@@ -11,14 +15,24 @@ import scipy.stats
 import numpy as np
 
 from abc import abstractmethod, ABCMeta
+from scipy.special import betaln
+
+try:
+    from scipy.special import logsumexp
+except ImportError:
+    from scipy.misc import logsumexp
 
 from ...base import Model
+from ...utils.validation import check_random_state
 
 
 __all__ = [
     'RewardPriorBase',
     'UniformRewardPrior',
     'GaussianRewardPrior',
+    'LaplaceRewardPrior',
+    'BetaRewardPrior',
+    'MixtureRewardPrior',
 ]
 
 
@@ -40,7 +54,6 @@ class RewardPriorBase(six.with_metaclass(ABCMeta, Model)):
             raise ValueError('Reward space dimension must be positive')
         self._dim = dim
 
-    @abstractmethod
     def pdf(self, r):
         """ Estimate the probability of the reward under the prior
 
@@ -52,24 +65,56 @@ class RewardPriorBase(six.with_metaclass(ABCMeta, Model)):
         :math:`(\mathcal{X}, \mathcal{A})` and a measure :math:`\mu`.
 
         """
-        raise NotImplementedError('Abstract method')
+        return np.exp(self.log_p(r))
 
     @abstractmethod
     def log_p(self, r):
-        """ Estimate the log probability of the reward under the prior """
+        """ Estimate the log probability of the reward under the prior
+
+        Parameters
+        -----------
+        r : array-like, shape (dim,) or (n, dim)
+            A reward or a batch of rewards
+
+        Returns
+        --------
+        log_p : float or array-like, shape (n,)
+            Log probability of each of the rewards
+
+        """
+        raise NotImplementedError('Abstract method')
+
+    @abstractmethod
+    def grad_log_p(self, r):
+        """ Gradient of the log probability of the reward under the prior
+
+        Used by gradient based BIRL algorithms, e.g. :class:`MAPBIRL`. Has the
+        shape of `r`, i.e. a batch of rewards gives a batch of gradients.
+
+        """
         raise NotImplementedError('Abstract method')
 
     @abstractmethod
-    def sample(self):
+    def sample(self, random_state=None):
         """ Generate a sample from the reward prior distribution
 
         .. math::
 
             r \sim f_{\\theta}
 
+        Parameters
+        -----------
+        random_state : :class:`numpy.RandomState`, optional (default: None)
+            Random number generator, the global one if None
+
         """
         raise NotImplementedError('Abstract method')
 
+    @property
+    def dim(self):
+        """ Dimension of the reward space """
+        return self._dim
+
 
 class UniformRewardPrior(RewardPriorBase):
     """ Uniform reward prior distribution
@@ -84,19 +129,24 @@ class UniformRewardPrior(RewardPriorBase):
         super(UniformRewardPrior, self).__init__(dim)
         if rmax < rmin:
             raise ValueError('Dist rmax cannot be less than rmin')
-        self._dist = scipy.stats.uniform(loc=rmin, scale=2 * (rmax - rmin))
-
-    def pdf(self, r):
-        """ Estimate the probability of the reward under the prior """
-        return np.prod([self._dist.pdf(x) for x in r])
+        self._low = rmin
+        self._width = 2 * (rmax - rmin)
+        self._dist = scipy.stats.uniform(loc=self._low, scale=self._width)
 
     def log_p(self, r):
         """ Estimate the log probability of the reward under the prior """
-        return np.sum(self._dist.logpdf(x) for x in r)
+        r = np.asarray(r, dtype=float)
+        inside = np.all((r >= self._low) & (r <= self._low + self._width),
+                        axis=-1)
+        return np.where(inside, -r.shape[-1] * np.log(self._width), -np.inf)
 
-    def sample(self):
+    def grad_log_p(self, r):
+        """ Gradient of the log probability, zero within the support """
+        return np.zeros(np.shape(r))
+
+    def sample(self, random_state=None):
         """ Generate a sample from the reward prior distribution """
-        return self._dist.rvs(size=self._dim)
+        return self._dist.rvs(size=self._dim, random_state=random_state)
 
 
 class GaussianRewardPrior(RewardPriorBase):
@@ -114,17 +164,21 @@ class GaussianRewardPrior(RewardPriorBase):
     """
     def __init__(self, dim=1, mean=0.0, sigma=0.5):
         super(GaussianRewardPrior, self).__init__(dim)
+        self._mean = mean
+        self._sigma = sigma
         self._dist = scipy.stats.norm(loc=mean, scale=sigma)
 
-    def pdf(self, r):
-        """ Estimate the probability of the reward under the prior """
-        return np.prod([self._dist.pdf(x) for x in r])
-
     def log_p(self, r):
         """ Estimate the log probability of the reward under the prior """
-        return np.sum(self._dist.logpdf(x) for x in r)
+        z = (np.asarray(r, dtype=float) - self._mean) / self._sigma
+        log_z = np.log(self._sigma) + 0.5 * np.log(2 * np.pi)
+        return -0.5 * np.sum(z ** 2, axis=-1) - z.shape[-1] * log_z
 
-    def sample(self):
+    def grad_log_p(self, r):
+        """ Gradient of the log probability of the reward under the prior """
+        return -(np.asarray(r, dtype=float) - self._mean) / self._sigma ** 2
+
+    def sample(self, random_state=None):
         """ Generate a sample from the reward prior distribution
 
         .. math::
@@ -132,4 +186,137 @@ class GaussianRewardPrior(RewardPriorBase):
             r \sim \mathcal{N}(\mathbf{\mu}, \mathbf{\sigma})
 
         """
-        return self._dist.rvs(size=self._dim)
+        return self._dist.rvs(size=self._dim, random_state=random_state)
+
+
+class LaplaceRewardPrior(RewardPriorBase):
+    """ Laplace reward prior distribution
+
+    Favours sparse rewards more strongly than the Gaussian prior, i.e. most
+    states have rewards close to the mean (:math:`L_1` regularization when
+    used for MAP estimation).
+
+    .. math:: p(r(s, a) = x) = \\frac{1}{2b}
+        \exp\left(-\\frac{|x - \mu|}{b}\\right)
+
+    """
+    def __init__(self, dim=1, mean=0.0, scale=0.5):
+        super(LaplaceRewardPrior, self).__init__(dim)
+        if scale <= 0:
+            raise ValueError('Laplace scale must be positive')
+        self._mean = mean
+        self._scale = scale
+
+    def log_p(self, r):
+        """ Estimate the log probability of the reward under the prior """
+        d = np.abs(np.asarray(r, dtype=float) - self._mean)
+        return -np.sum(d, axis=-1) / self._scale -\
+            d.shape[-1] * np.log(2 * self._scale)
+
+    def grad_log_p(self, r):
+        """ Gradient of the log probability (a subgradient at the mean) """
+        return -np.sign(np.asarray(r, dtype=float) - self._mean) / self._scale
+
+    def sample(self, random_state=None):
+        """ Generate a sample from the reward prior distribution """
+        rng = check_random_state(random_state)
+        return rng.laplace(self._mean, self._scale, size=self._dim)
+
+
+class BetaRewardPrior(RewardPriorBase):
+    """ Beta reward prior distribution, scaled to [rmin, rmax]
+
+    With :math:`a, b < 1`, rewards are favoured to be close to the bounds,
+    e.g. for domains with few goals and hazards [RamBIRL07]_.
+
+    .. math:: p(r(s, a) = x) = \\frac{z^{a - 1} (1 - z)^{b - 1}}
+        {B(a, b) (r_{max} - r_{min})}, \quad
+        z = \\frac{x - r_{min}}{r_{max} - r_{min}}
+
+    """
+    def __init__(self, dim=1, a=0.5, b=0.5, rmin=-1.0, rmax=1.0):
+        super(BetaRewardPrior, self).__init__(dim)
+        if a <= 0 or b <= 0:
+            raise ValueError('Beta shape parameters must be positive')
+        if rmax <= rmin:
+            raise ValueError('Dist rmax must be greater than rmin')
+        self._a = a
+        self._b = b
+        self._low = rmin
+        self._width = rmax - rmin
+
+    def log_p(self, r):
+        """ Estimate the log probability of the reward under the prior """
+        z = (np.asarray(r, dtype=float) - self._low) / self._width
+        with np.errstate(divide='ignore', invalid='ignore'):
+            lp = (self._a - 1) * np.log(z) + (self._b - 1) * np.log1p(-z)
+        lp = np.where((z >= 0) & (z <= 1), lp, -np.inf)
+        log_z = betaln(self._a, self._b) + np.log(self._width)
+        return np.sum(lp, axis=-1) - z.shape[-1] * log_z
+
+    def grad_log_p(self, r):
+        """ Gradient of the log probability of the reward under the prior """
+        z = (np.asarray(r, dtype=float) - self._low) / self._width
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return ((self._a - 1) / z - (self._b - 1) / (1 - z)) / self._width
+
+    def sample(self, random_state=None):
+        """ Generate a sample from the reward prior distribution """
+        rng = check_random_state(random_state)
+        z = rng.beta(self._a, self._b, size=self._dim)
+        return self._low + self._width * z
+
+
+class MixtureRewardPrior(RewardPriorBase):
+    """ Mixture of reward prior distributions
+
+    .. math:: p(r) = \sum_k w_k p_k(r)
+
+    Parameters
+    -----------
+    priors : list of :class:`RewardPriorBase`
+        Mixture components, of the same dimension
+    weights : array-like, optional (default: None)
+        Mixture weights, uniform if None
+
+    """
+    def __init__(self, priors, weights=None):
+        if len(priors) < 1:
+            raise ValueError('Mixture requires at least one component')
+        dim = priors[0].dim
+        if any(p.dim != dim for p in priors):
+            raise ValueError('Mixture components must have the same dimension')
+        super(MixtureRewardPrior, self).__init__(dim)
+
+        if weights is None:
+            weights = np.ones(len(priors))
+        weights = np.asarray(weights, dtype=float)
+        if weights.shape != (len(priors),) or np.any(weights < 0):
+            raise ValueError('Mixture weights must be non-negative,'
+                             ' one per component')
+        self._priors = priors
+        self._weights = weights / np.sum(weights)
+
+    def log_p(self, r):
+        """ Estimate the log probability of the reward under the prior """
+        return logsumexp(self._log_joint(r), axis=0)
+
+    def grad_log_p(self, r):
+        """ Gradient of the log probability, responsibility weighted """
+        log_joint = self._log_joint(r)
+        resp = np.exp(log_joint - logsumexp(log_joint, axis=0))
+        grads = np.array([p.grad_log_p(r) for p in self._priors])
+        return np.sum(resp[..., np.newaxis] * grads, axis=0)
+
+    def sample(self, random_state=None):
+        """ Generate a sample from the reward prior distribution """
+        rng = check_random_state(random_state)
+        k = rng.choice(len(self._priors), p=self._weights)
+        return self._priors[k].sample(random_state=rng)
+
+    def _log_joint(self, r):
+        """ Log of the weighted component densities, one row per component """
+        with np.errstate(divide='ignore'):
+            log_w = np.log(self._weights)
+        lps = np.array([p.log_p(r) for p in self._priors])
+        return lps + log_w.reshape((-1,) + (1,) * (lps.ndim - 1))
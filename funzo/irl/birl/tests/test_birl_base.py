@@ -0,0 +1,75 @@
+
+import numpy as np
+
+from numpy.testing import assert_allclose
+
+from funzo.domains.gridworld import GridWorld, GridWorldMDP
+from funzo.domains.gridworld import GReward, GTransition
+from funzo.irl.birl import BIRLBase, GaussianRewardPrior
+from funzo.planners import ValueIteration
+from funzo.utils import DemonstrationSet
+
+
+class _BIRL(BIRLBase):
+    def solve(self, demos, mdp=None):
+        pass
+
+
+def _loop_log_likelihood(beta, Q, demos):
+    """ Reference (unvectorized) demonstration log likelihood """
+    llk = 0.0
+    for traj in demos:
+        if len(traj) > 0:
+            terms = [beta * Q[a, s] - np.log(np.sum(np.exp(beta * Q[:, s])))
+                     for (s, a) in traj]
+            llk += np.mean(terms)
+    return llk / float(len(demos))
+
+
+def test_log_likelihood():
+    """ Test vectorized BIRL log likelihood against a simple loop """
+    rng = np.random.RandomState(42)
+    n_s, n_a = 30, 4
+    Q = rng.randn(n_a, n_s)
+    demos = [[(rng.randint(n_s), rng.randint(n_a))
+              for _ in range(rng.randint(0, 15))] for _ in range(12)]
+    demos.append([])
+
+    birl = _BIRL(prior=GaussianRewardPrior(dim=n_s), beta=0.8)
+    assert_allclose(birl.log_likelihood(Q, demos, None),
+                    _loop_log_likelihood(0.8, Q, demos))
+
+    # packed demonstrations are reused while the same demos are passed
+    assert_allclose(birl.log_likelihood(2 * Q, demos, None),
+                    _loop_log_likelihood(0.8, 2 * Q, demos))
+
+    # packed demonstration sets are accepted directly
+    packed = DemonstrationSet.from_trajectories(demos)
+    assert_allclose(birl.log_likelihood(Q, packed, None),
+                    _loop_log_likelihood(0.8, Q, demos))
+
+
+def test_grad_log_likelihood():
+    """ Test analytic log likelihood gradient against finite differences """
+    gmap = np.zeros(shape=(4, 4))
+    gmap[0, 3] = 2
+    gmap[1, 1:3] = 1
+    with GridWorld(gmap) as world:
+        mdp = GridWorldMDP(GReward(), GTransition(wind=0.2), 0.9)
+        planner = ValueIteration(epsilon=1e-12, max_iter=5000)
+        birl = _BIRL(prior=GaussianRewardPrior(dim=16), beta=2.0,
+                     planner=planner)
+
+        r = np.random.RandomState(3).uniform(-1, 1, 16)
+        demos = world.generate_trajectories(birl.solve_mdp(mdp, r)['pi'],
+                                            num=5, random_state=0)
+
+        def _llk(r):
+            return birl.log_likelihood(birl.solve_mdp(mdp, r)['Q'],
+                                       demos, mdp)
+
+        grad = birl.grad_log_likelihood(r, demos, mdp, birl.solve_mdp(mdp, r))
+        h = 1e-06
+        fd = [(_llk(r + h * e) - _llk(r - h * e)) / (2 * h)
+              for e in np.eye(16)]
+    assert_allclose(grad, fd, atol=1e-06)
@@ -0,0 +1,50 @@
+
+import numpy as np
+
+from nose.tools import assert_equal, assert_raises
+from numpy.testing import assert_array_equal
+
+from funzo.domains.gridworld import GridWorld, GridWorldMDP
+from funzo.domains.gridworld import GReward, GTransition
+from funzo.irl.birl import PolicyWalkBIRL, GaussianRewardPrior
+from funzo.planners import ValueIteration
+
+
+def _policy_walk(world, mdp, **kwargs):
+    planner = ValueIteration()
+    demos = world.generate_trajectories(planner.solve(mdp)['pi'], num=5,
+                                        random_state=0)
+    birl = PolicyWalkBIRL(prior=GaussianRewardPrior(dim=len(mdp.reward)),
+                          planner=planner, random_state=0, **kwargs)
+    return birl.solve(demos=demos, mdp=mdp)
+
+
+def test_policy_walk_chains():
+    """ Test multiple PolicyWalk chains, run serially and in a pool """
+    gmap = np.zeros(shape=(4, 4))
+    gmap[0, 3] = 2
+    gmap[1, 1:3] = 1
+    with GridWorld(gmap) as world:
+        mdp = GridWorldMDP(GReward(), GTransition(wind=0.2), 0.9)
+        serial = _policy_walk(world, mdp, n_chains=2, n_jobs=1,
+                              max_iter=20)
+        pooled = _policy_walk(world, mdp, n_chains=2, n_jobs=2,
+                              max_iter=20)
+        short = _policy_walk(world, mdp, n_chains=2, max_iter=2, burn=0.5)
+
+    r = np.array(serial['r'])
+    assert_equal(r.shape, (20, 2, 16))
+    assert_array_equal(r, np.array(pooled['r']))
+    # chains are seeded independently
+    assert np.any(r[:, 0] != r[:, 1])
+
+    r_hat = np.array(serial['r_hat'])
+    assert_equal(r_hat.shape, (1, 16))
+    assert np.all(np.isfinite(r_hat))
+
+    # too few samples after the burn-in for R-hat
+    assert_equal(np.array(short['r']).shape, (2, 2, 16))
+    assert np.all(np.isnan(short['r_hat']))
+
+    assert_raises(ValueError, PolicyWalkBIRL, GaussianRewardPrior(dim=16),
+                  burn=1.0)
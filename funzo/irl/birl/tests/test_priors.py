@@ -0,0 +1,64 @@
+
+import numpy as np
+import scipy.stats
+
+from nose.tools import assert_raises
+from numpy.testing import assert_allclose
+
+from funzo.irl.birl import GaussianRewardPrior, UniformRewardPrior
+from funzo.irl.birl import LaplaceRewardPrior, BetaRewardPrior
+from funzo.irl.birl import MixtureRewardPrior
+
+
+def _check_gradient(prior, r, h=1e-06):
+    """ Compare the gradient of the log density to finite differences """
+    fd = [(prior.log_p(r + h * e) - prior.log_p(r - h * e)) / (2 * h)
+          for e in np.eye(len(r))]
+    assert_allclose(prior.grad_log_p(r), fd, rtol=1e-05, atol=1e-06)
+
+
+def test_priors_closed_form():
+    """ Test closed form log densities against scipy distributions """
+    rng = np.random.RandomState(0)
+    R = rng.uniform(-0.9, 0.9, size=(6, 10))
+    cases = [
+        (GaussianRewardPrior(dim=10, mean=0.1, sigma=0.3),
+         scipy.stats.norm(loc=0.1, scale=0.3)),
+        (UniformRewardPrior(dim=10, rmin=-1.0, rmax=0.0),
+         scipy.stats.uniform(loc=-1.0, scale=2.0)),
+        (LaplaceRewardPrior(dim=10, scale=0.4),
+         scipy.stats.laplace(scale=0.4)),
+        (BetaRewardPrior(dim=10, a=0.5, b=2.0),
+         scipy.stats.beta(0.5, 2.0, loc=-1.0, scale=2.0)),
+    ]
+    for prior, dist in cases:
+        expected = np.sum(dist.logpdf(R), axis=1)
+        assert_allclose(prior.log_p(R), expected)
+        assert_allclose(prior.log_p(R[0]), expected[0])
+        assert_allclose(prior.pdf(R[0]), np.exp(expected[0]))
+        assert prior.grad_log_p(R).shape == R.shape
+        _check_gradient(prior, R[1])
+        assert prior.sample(random_state=rng).shape == (10,)
+
+    assert UniformRewardPrior(dim=2).log_p([0.5, -0.5]) == -np.inf
+    assert BetaRewardPrior(dim=2).log_p([0.5, 1.5]) == -np.inf
+
+
+def test_mixture_prior():
+    """ Test mixture of reward priors """
+    rng = np.random.RandomState(1)
+    R = rng.uniform(-0.9, 0.9, size=(5, 4))
+    gauss = GaussianRewardPrior(dim=4, sigma=0.2)
+    laplace = LaplaceRewardPrior(dim=4, mean=0.3)
+    mix = MixtureRewardPrior([gauss, laplace], weights=[1, 3])
+
+    expected = np.log(0.25 * gauss.pdf(R) + 0.75 * laplace.pdf(R))
+    assert_allclose(mix.log_p(R), expected)
+    assert mix.grad_log_p(R).shape == R.shape
+    _check_gradient(mix, R[0])
+    assert mix.sample(random_state=rng).shape == (4,)
+
+    assert_raises(ValueError, MixtureRewardPrior, [])
+    assert_raises(ValueError, MixtureRewardPrior,
+                  [gauss, GaussianRewardPrior(dim=3)])
+    assert_raises(ValueError, MixtureRewardPrior, [gauss], weights=[1, 1])
@@ -29,7 +29,7 @@ class IRLSolver(six.with_metaclass(ABCMeta, Model)):
 
         Parameters
         -----------
-        demos : array-like
+        demos : array-like or :class:`funzo.utils.DemonstrationSet`
             Expert demonstrations in form of sets of state-action pairs. Some
             algorithms require these to be *trajectories* while others need
             just state-action pairs in any order.
@@ -72,6 +72,34 @@ class IRLSolver(six.with_metaclass(ABCMeta, Model)):
         plan = self._mdp_planner.solve(mdp, V_init, pi_init)
         return plan
 
+    def replan_mdp(self, mdp, r, plan, index=None, delta=None):
+        """ Update the plan of the MDP after a change of reward parameters
+
+        Uses :meth:`funzo.planners.Planner.replan`, allowing planners to
+        propagate only the effects of the change instead of planning anew.
+
+        Parameters
+        ----------
+        mdp : :class:`funzo.models.MDP` instance
+            MDP model underlying the IRL task
+        r : array-like
+            New parameters of the reward function used in the MDP model
+        plan : dict
+            Plan computed for the previous reward parameters
+        index : int, optional (default: None)
+            The state whose reward changed, if only a single one did
+        delta : float, optional (default: None)
+            Change in the reward of state `index`
+
+        Returns
+        ---------
+        plan : dict
+            Dictionary of policy (pi), value function (V) and Q-function (Q)
+
+        """
+        mdp.reward.update_parameters(reward=r)
+        return self._mdp_planner.replan(mdp, plan, index, delta)
+
 
 ########################################################################
 # Loss functions
@@ -1,10 +1,10 @@
 
-from .mdp import MDPState, MDPAction, MDPTransition, MDP
+from .mdp import MDPState, MDPAction, MDPTransition, MDP, CompiledMDP
 from .mdp import RewardFunction, TabularRewardFunction, LinearRewardFunction
 from .mdp import MDPLocalController
 
 __all__ = [
-    'MDP', 'MDPTransition', 'MDPState', 'MDPAction',
+    'MDP', 'CompiledMDP', 'MDPTransition', 'MDPState', 'MDPAction',
     'RewardFunction', 'LinearRewardFunction', 'TabularRewardFunction',
     #
     'MDPLocalController',
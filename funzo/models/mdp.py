@@ -13,12 +13,16 @@ from abc import abstractmethod, abstractproperty
 from collections import Hashable
 
 import numpy as np
+import scipy.sparse as sp
+
+from six.moves import range
 
 from ..base import Model
 
 
 __all__ = [
     'MDP',
+    'CompiledMDP',
     'RewardFunction',
     'LinearRewardFunction',
     'TabularRewardFunction',
@@ -182,6 +186,28 @@ class MDP(six.with_metaclass(ABCMeta, Model)):
         """ Set of actions in the MDP in an hashable container """
         raise NotImplementedError('Abstract property')
 
+    def compile(self, refresh=False):
+        """ Compile the MDP into a tabular (tensor) representation
+
+        The transition function is enumerated once over :math:`\mathcal{S}
+        \\times \mathcal{A}` and stored as sparse matrices. The compiled model
+        is cached on the MDP and reused by subsequent calls.
+
+        Parameters
+        -----------
+        refresh : bool, optional (default: False)
+            Force re-compilation, e.g. after the domain has changed
+
+        Returns
+        --------
+        compiled : :class:`CompiledMDP` object
+            Tabular view of the MDP sharing its reward and discount
+
+        """
+        if refresh or getattr(self, '_compiled', None) is None:
+            self._compiled = CompiledMDP(self)
+        return self._compiled
+
     @property
     def reward(self):
         """ Reward function of the MDP """
@@ -200,6 +226,131 @@ class MDP(six.with_metaclass(ABCMeta, Model)):
         self._discount = value
 
 
+class CompiledMDP(MDP):
+    """ Tabular MDP with transitions stored as sparse matrices
+
+    Wraps a discrete MDP whose states and actions are contiguous integer ids,
+    enumerating the transition function once. The transitions of every action
+    are stored as a :math:`|\mathcal{S}| \\times |\mathcal{S}|` CSR matrix,
+    i.e. :math:`T[a][s, s'] = p(s' | s, a)`, so that Bellman backups reduce to
+    sparse matrix-vector products.
+
+    The compiled MDP is itself a :class:`MDP`, hence it can be used in place
+    of the original model by any planner or IRL algorithm. The reward function
+    and discount factor are shared with the wrapped MDP, so reward updates
+    made during IRL are always visible.
+
+    Parameters
+    ------------
+    mdp : :class:`MDP` object
+        A discrete MDP with states ``0..|S|-1`` and actions ``0..|A|-1``
+
+    Attributes
+    ------------
+    P : list of :class:`scipy.sparse.csr_matrix`
+        Transition matrices, one per action
+    action_mask : array-like, shape (|S|, |A|)
+        Boolean mask of the actions available at each state
+    _mdp : :class:`MDP` object
+        The original (wrapped) MDP
+
+    """
+
+    def __init__(self, mdp):
+        self._mdp = mdp
+        super(CompiledMDP, self).__init__(mdp.reward, mdp._transition,
+                                          mdp.gamma, mdp._domain)
+
+        states = list(mdp.S)
+        actions = list(mdp.A)
+        if states != list(range(len(states))):
+            raise ValueError('Compiled MDPs require contiguous integer'
+                             ' state ids')
+        if actions != list(range(len(actions))):
+            raise ValueError('Compiled MDPs require contiguous integer'
+                             ' action ids')
+        n_s, n_a = len(states), len(actions)
+
+        self.action_mask = np.zeros((n_s, n_a), dtype=bool)
+        for s in states:
+            self.action_mask[s, list(mdp.actions(s))] = True
+
+        self.P = list()
+        for a in actions:
+            rows, cols, probs = list(), list(), list()
+            for s in states:
+                for (p, s1) in mdp.T(s, a):
+                    rows.append(s)
+                    cols.append(s1)
+                    probs.append(p)
+            # duplicate (s, s') entries are summed on conversion
+            P_a = sp.coo_matrix((probs, (rows, cols)), shape=(n_s, n_s))
+            self.P.append(P_a.tocsr())
+
+    def compile(self, refresh=False):
+        """ Compile the MDP (already compiled) """
+        if refresh:
+            return self._mdp.compile(refresh=True)
+        return self
+
+    def T(self, state, action):
+        """ Evaluate the transition function using the compiled table """
+        P_a = self.P[action]
+        start, end = P_a.indptr[state], P_a.indptr[state + 1]
+        return list(zip(P_a.data[start:end], P_a.indices[start:end]))
+
+    def R(self, state, action):
+        """ Evaluate the reward function for a (state-action) pair """
+        return self._mdp.R(state, action)
+
+    def reward_vector(self):
+        """ Evaluate the state rewards, :math:`R(s)` for all states
+
+        Uses :meth:`RewardFunction.reward_vector` of the MDP reward, i.e. a
+        single call for all the states.
+
+        """
+        return np.asarray(self._mdp.reward.reward_vector(self.S), dtype=float)
+
+    def actions(self, state):
+        """ Get actions available at a state """
+        return np.flatnonzero(self.action_mask[state])
+
+    def terminal(self, state):
+        """ Check if a state is terminal (absorbing) """
+        return self._mdp.terminal(state)
+
+    @property
+    def S(self):
+        """ Set of states in the MDP """
+        return range(self.n_states)
+
+    @property
+    def A(self):
+        """ Set of actions in the MDP """
+        return range(self.n_actions)
+
+    @property
+    def n_states(self):
+        """ Number of states, :math:`|\mathcal{S}|` """
+        return self.action_mask.shape[0]
+
+    @property
+    def n_actions(self):
+        """ Number of actions, :math:`|\mathcal{A}|` """
+        return self.action_mask.shape[1]
+
+    @property
+    def gamma(self):
+        """ MDP Discount factor (shared with the wrapped MDP) """
+        return self._mdp.gamma
+
+    @gamma.setter
+    def gamma(self, value):
+        """ MDP Discount factor (shared with the wrapped MDP) """
+        self._mdp.gamma = value
+
+
 ########################################################################
 
 
@@ -261,6 +412,22 @@ class RewardFunction(six.with_metaclass(ABCMeta, Model)):
         """ Type of reward function (e.g. tabular, LFA) """
         raise NotImplementedError('Abstract property')
 
+    def reward_vector(self, states):
+        """ Evaluate the state rewards, :math:`r(s, None)` of many states
+
+        Parameters
+        -----------
+        states : array-like
+            Sequence of state ids
+
+        Returns
+        --------
+        R : array-like, shape (len(states),)
+            Rewards of the states
+
+        """
+        return np.array([self(s, None) for s in states], dtype=float)
+
     @property
     def rmax(self):
         """ Reward upper bound """
@@ -303,7 +470,27 @@ class TabularRewardFunction(six.with_metaclass(ABCMeta, RewardFunction)):
         raise NotImplementedError('abstract')
 
 
-class LinearRewardFunction(six.with_metaclass(ABCMeta, RewardFunction)):
+class _FeatureRegistry(ABCMeta):
+    """ Metaclass collecting the features of linear reward functions
+
+    Methods named ``_feature_{x}`` are registered once at class creation
+    into the ordered ``_feature_names``. Inherited features come first,
+    followed by new ones in the order of their definition in the class body.
+
+    """
+    def __init__(cls, name, bases, namespace):
+        super(_FeatureRegistry, cls).__init__(name, bases, namespace)
+        template = getattr(cls, '_template', '_feature_')
+        names = list(getattr(cls, '_feature_names', ()))
+        defined = [(six.get_function_code(f).co_firstlineno, k)
+                   for k, f in namespace.items()
+                   if k.startswith(template) and inspect.isfunction(f)]
+        names += [k for _, k in sorted(defined) if k not in names]
+        cls._feature_names = tuple(names)
+
+
+class LinearRewardFunction(six.with_metaclass(_FeatureRegistry,
+                                              RewardFunction)):
     """ RewardFunction using linear function approximation
 
     The reward funtion is define as,
@@ -317,6 +504,10 @@ class LinearRewardFunction(six.with_metaclass(ABCMeta, RewardFunction)):
     model and are usually assumed to sum to 1 to ensure that the reward
     remains bounded, a typical assumption used in most RL planners.
 
+    Features are methods named ``_feature_{x}``, registered when the class
+    is created. Their order of definition gives the order of the entries of
+    :math:`\phi`, see :attr:`feature_names`.
+
     """
 
     _template = '_feature_'
@@ -325,6 +516,7 @@ class LinearRewardFunction(six.with_metaclass(ABCMeta, RewardFunction)):
         super(LinearRewardFunction, self).__init__(rmax, domain)
         self._weights = np.asarray(weights)
         assert self._weights.ndim == 1, 'Weights must be 1D arrays'
+        self._features = dict()
 
     def update_parameters(self, **kwargs):
         """ Update the weights parameters of the reward function model """
@@ -344,16 +536,110 @@ class LinearRewardFunction(six.with_metaclass(ABCMeta, RewardFunction)):
         """ Evaluate the reward features for state-action pair """
         raise NotImplementedError('abstract')
 
+    def phi_batch(self, states, action=None):
+        """ Evaluate the reward features of many states at once
+
+        Parameters
+        -----------
+        states : array-like
+            Sequence of state ids
+        action : int, optional (default: None)
+            Action id, shared by all the states
+
+        Returns
+        --------
+        Phi : array-like, shape (len(states), dim)
+            Features of the states, one row per state
+
+        """
+        Phi = np.array([self.phi(s, action) for s in states], dtype=float)
+        return Phi.reshape(len(Phi), len(self))
+
+    def feature_matrix(self, states=None):
+        """ State reward features, :math:`\\Phi[s, k] = \\phi_k(s, None)`
+
+        The features do not depend on the weights and are hence computed
+        once and cached, see :meth:`clear_features`.
+
+        Parameters
+        -----------
+        states : array-like, optional (default: None)
+            Sequence of state ids, all states of the domain (ordered by id)
+            if None
+
+        Returns
+        --------
+        Phi : array-like, shape (len(states), dim)
+            Features of the states
+
+        """
+        key = ('s', _states_key(states))
+        if key not in self._features:
+            if states is None:
+                states = sorted(self._domain.states)
+            self._features[key] = self.phi_batch(states)
+        return self._features[key]
+
+    def feature_tensor(self, states=None, actions=None):
+        """ State-action reward features, :math:`\\Phi[s, a, k]`
+
+        Cached as :meth:`feature_matrix`, with all actions of the domain
+        (ordered by id) used if `actions` is None.
+
+        Returns
+        --------
+        Phi : array-like, shape (len(states), len(actions), dim)
+            Features of the state-action pairs
+
+        """
+        key = ('sa', _states_key(states),
+               None if actions is None else tuple(actions))
+        if key not in self._features:
+            if states is None:
+                states = sorted(self._domain.states)
+            if actions is None:
+                actions = sorted(self._domain.actions)
+            self._features[key] = np.stack([self.phi_batch(states, a)
+                                            for a in actions], axis=1)
+        return self._features[key]
+
+    def clear_features(self):
+        """ Clear cached features, e.g. after changes to the domain """
+        self._features.clear()
+
+    def reward_vector(self, states=None):
+        """ Evaluate the state rewards, :math:`\\Phi w` """
+        return self.feature_matrix(states).dot(self._weights)
+
+    def reward_matrix(self, states=None, actions=None):
+        """ Evaluate the state-action rewards, :math:`R[s, a]` """
+        return self.feature_tensor(states, actions).dot(self._weights)
+
     def __len__(self):
         """ Dimension of the reward function in the case of LFA """
-        # - count all class members named '_feature_{x}'
-        dim = 0
-        for name in self.__class__.__dict__:
-            item = getattr(self.__class__, name)
-            if inspect.ismethod(item):
-                if item.__name__.startswith(self._template):
-                    dim += 1
-        return dim
+        return len(self._feature_names)
+
+    @property
+    def feature_names(self):
+        """ Names of the registered feature methods, in order of :math:`\\phi`
+        """
+        return self._feature_names
+
+
+def _states_key(states):
+    """ Hashable cache key of a sequence of states
+
+    Ranges, such as the states of a :class:`CompiledMDP`, are keyed by their
+    bounds to avoid building a tuple of all the states on every call.
+
+    """
+    if states is None:
+        return None
+    if isinstance(states, range):
+        n = len(states)
+        return ('range', n, states[0] if n > 0 else 0,
+                states[1] - states[0] if n > 1 else 1)
+    return tuple(states)
 
 ########################################################################
 
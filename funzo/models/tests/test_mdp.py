@@ -1,6 +1,9 @@
 
 
+import numpy as np
+
 from nose.tools import assert_raises
+from numpy.testing import assert_equal
 
 from funzo.models.mdp import MDPState
 from funzo.models.mdp import MDPAction
@@ -9,6 +12,7 @@ from funzo.models.mdp import LinearRewardFunction
 from funzo.models.mdp import TabularRewardFunction
 from funzo.models.mdp import MDPTransition
 from funzo.models.mdp import MDP
+from funzo.models.mdp import CompiledMDP
 
 
 def test_state_init():
@@ -24,3 +28,82 @@ def test_state_init():
 
 def test_f2():
     assert 1
+
+
+def test_compiled_mdp():
+    """ Test compiling a discrete MDP into sparse transition tables """
+    from numpy.testing import assert_allclose
+    from funzo.domains.gridworld import GridWorld, GridWorldMDP
+    from funzo.domains.gridworld import GReward, GTransition
+
+    gmap = np.zeros(shape=(3, 3))
+    gmap[2, 2] = 2
+    gmap[1, 1] = 1
+    with GridWorld(gmap) as world:
+        mdp = GridWorldMDP(GReward(), GTransition(wind=0.2), 0.9)
+        cmdp = mdp.compile()
+
+        assert isinstance(cmdp, CompiledMDP)
+        assert mdp.compile() is cmdp
+        assert cmdp.compile() is cmdp
+        assert len(cmdp.P) == len(mdp.A)
+        for a in mdp.A:
+            assert_allclose(cmdp.P[a].sum(axis=1), 1.0)
+            for s in mdp.S:
+                expected = np.zeros(len(mdp.S))
+                for (p, s1) in mdp.T(s, a):
+                    expected[s1] += p
+                assert_allclose(cmdp.P[a][s].toarray().ravel(), expected)
+
+        R = cmdp.reward_vector()
+        assert_allclose(R, [mdp.R(s, None) for s in mdp.S])
+
+        terminal = [s for s in mdp.S if world.terminal(s)][0]
+        assert list(cmdp.actions(terminal)) == [4]
+
+        cmdp.gamma = 0.5
+        assert mdp.gamma == 0.5
+
+
+class _LineReward(LinearRewardFunction):
+    def __call__(self, state, action):
+        return np.dot(self._weights, self.phi(state, action))
+
+    def phi(self, state, action):
+        return np.array([getattr(self, f)(state)
+                         for f in self.feature_names])
+
+    def _feature_square(self, state):
+        return float(state ** 2)
+
+    def _feature_const(self, state):
+        return 1.0
+
+
+class _ExtendedLineReward(_LineReward):
+    def _feature_cube(self, state):
+        return float(state ** 3)
+
+
+def test_linear_reward_features():
+    reward = _LineReward(weights=[0.5, 2.0])
+    assert len(reward) == 2
+    assert reward.feature_names == ('_feature_square', '_feature_const')
+    assert_equal(reward.phi_batch([1, 2, 3]), [[1, 1], [4, 1], [9, 1]])
+    assert_equal(reward.reward_vector([1, 3]), [2.5, 6.5])
+
+    extended = _ExtendedLineReward(weights=[0.5, 2.0, 1.0])
+    assert len(extended) == 3
+    assert extended.feature_names[-1] == '_feature_cube'
+
+
+def test_linear_reward_feature_cache():
+    reward = _LineReward(weights=[0.5, 2.0])
+    Phi = reward.feature_matrix(range(4))
+    assert reward.feature_matrix(range(4)) is Phi
+    assert_equal(reward.feature_matrix([0, 1, 2, 3]), Phi)
+    assert_equal(reward.feature_matrix(range(1, 4)), Phi[1:])
+    assert_equal(reward.feature_matrix(range(0)).shape, (0, 2))
+
+    reward.update_parameters(reward=[1.0, 0.0])
+    assert_equal(reward.reward_vector(range(4)), [0, 1, 4, 9])
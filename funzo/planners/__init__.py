@@ -1,12 +1,18 @@
-
 from .base import Planner
 
 from .dp import PolicyIteration, ValueIteration
+from .dp import ModifiedPolicyIteration
+from .dp import GaussSeidelValueIteration, PrioritizedSweepingValueIteration
+
+from .smdp import GraphValueIteration
 
 
 __all__ = [
     'Planner',
     #
     'PolicyIteration', 'ValueIteration',
+    'ModifiedPolicyIteration',
+    'GaussSeidelValueIteration', 'PrioritizedSweepingValueIteration',
     #
+    'GraphValueIteration',
 ]
@@ -21,3 +21,29 @@ class Planner(six.with_metaclass(ABCMeta, Model)):
     def solve(self, mdp, V_init=None, pi_init=None):
         """ Run the planner on a MDP to get the policy """
         raise NotImplementedError('Abstract method')
+
+    def replan(self, mdp, plan, index=None, delta=None):
+        """ Update a plan after a change in the reward of the MDP
+
+        The reward function of `mdp` is assumed to be already updated. By
+        default this runs the planner warm started from the previous plan.
+        Planners which can propagate the change incrementally override it.
+
+        Parameters
+        ------------
+        mdp : :class:`funzo.models.MDP` instance
+            The MDP to plan on, with the new reward
+        plan : dict
+            Previous plan (pi, V and Q) found with the old reward
+        index : int, optional (default: None)
+            The state whose reward changed, if only a single one did
+        delta : float, optional (default: None)
+            Change in the reward of state `index`
+
+        Returns
+        --------
+        plan : dict
+            Dictionary containing the updated Q, V and pi
+
+        """
+        return self.solve(mdp, plan['V'], plan['pi'])
@@ -3,23 +3,44 @@ MDP planning using *dynamic programming* methods
 
     * Policy Iteration (PI)
     * Value  Iteration (VI)
+    * Modified Policy Iteration (MPI)
+    * Gauss-Seidel Value Iteration
+    * Prioritized Sweeping Value Iteration
+
+All planners record the number of single state Bellman backups performed in
+the last call to ``solve`` as ``n_backups_``, which allows comparing their
+costs independently of the implementation.
 
 """
 
+import heapq
+import warnings
+
+from collections import OrderedDict
+
 import numpy as np
+import scipy.sparse as sp
+import scipy.sparse.linalg as spla
 
 from six.moves import range
 
 from .base import Planner
+from ..models.mdp import CompiledMDP
 from ..utils.validation import check_random_state
 
 
 __all__ = [
     'PolicyIteration',
-    'ValueIteration'
+    'ValueIteration',
+    'ModifiedPolicyIteration',
+    'GaussSeidelValueIteration',
+    'PrioritizedSweepingValueIteration',
 ]
 
 
+EVALUATION_MODES = ('iterative', 'exact', 'gmres', 'bicgstab')
+
+
 class PolicyIteration(Planner):
     """ Policy iteration for computing optimal MDP policy
 
@@ -33,6 +54,18 @@ class PolicyIteration(Planner):
         Threshold for policy change in policy evaluation
     random_state : :class:`numpy.RandomState`, optional (default: None)
         Random number generation seed control
+    vectorized : bool, optional (default: True)
+        Use sparse matrix Bellman backups whenever the MDP can be compiled
+        into a :class:`funzo.models.CompiledMDP`
+    evaluation : str, optional (default: 'iterative')
+        Policy evaluation mode for compiled MDPs, one of:
+            * iterative -- repeated Bellman backups until convergence
+            * exact -- direct sparse solve of
+              :math:`(I - \gamma P_{\pi}) V = R`
+            * gmres, bicgstab -- iterative Krylov solvers of the same linear
+              system, warm started from the previous value function and
+              accurate to within `epsilon`
+        MDPs which cannot be compiled always use iterative evaluation.
 
 
     Attributes
@@ -43,9 +76,16 @@ class PolicyIteration(Planner):
         Threshold for policy change in policy evaluation
     _rng : :class:`numpy.RandomState`
         Random number generator
+    _vectorized : bool
+        Flag for using vectorized backups on compiled MDPs
+    _evaluation : str
+        Policy evaluation mode
     pi_t_ : array-like
         Intermediate policies for the iteration steps. Can be used to check the
         convergence properties of the algorithm empirically
+    n_backups_ : int
+        Number of single state Bellman backups performed. Linear solve policy
+        evaluation performs none.
 
     See Also
     ----------
@@ -57,10 +97,17 @@ class PolicyIteration(Planner):
     MIT Press
 
     """
-    def __init__(self, max_iter=200, epsilon=1e-05, random_state=None):
+    def __init__(self, max_iter=200, epsilon=1e-05, random_state=None,
+                 vectorized=True, evaluation='iterative'):
         self._max_iter = max_iter
         self._epsilon = epsilon
         self._rng = check_random_state(random_state)
+        self._vectorized = vectorized
+
+        if evaluation not in EVALUATION_MODES:
+            raise ValueError('Policy evaluation mode must be one of: {}'
+                             .format(EVALUATION_MODES))
+        self._evaluation = evaluation
 
     def solve(self, mdp, V_init=None, pi_init=None):
         """ Run the policy iteration algorithm
@@ -93,24 +140,42 @@ class PolicyIteration(Planner):
 
         R = mdp.R
         T = mdp.T
+        cmdp = _compiled(mdp) if self._vectorized else None
+        if cmdp is not None:
+            R_vec = cmdp.reward_vector()
         self.pi_t_ = list()
+        self.n_backups_ = 0
 
         stable_policy = False
         step = 0
         self.pi_t_.append(policy)
         while not stable_policy and step < self._max_iter:
-            finished = False
-            while not finished:
-                V_old = np.array(V)
-                change = 0.0
-                for s in mdp.S:
-                    V[s] = R(s, None) + mdp.gamma * \
-                        np.sum([p * V[s1] for (p, s1) in T(s, policy[s])])
-                change = max(np.fabs(V - V_old))
-                if change < self._epsilon:
-                    finished = True
-
-            Q = _compute_Q(mdp, V)
+            if cmdp is not None:
+                P_pi = _policy_transitions(cmdp, policy)
+                if self._evaluation == 'iterative':
+                    V, sweeps = _policy_evaluation_tabular(
+                        cmdp, R_vec, P_pi, V, epsilon=self._epsilon)
+                    self.n_backups_ += sweeps * len(V)
+                else:
+                    V = _policy_evaluation_linear(cmdp, R_vec, P_pi, V,
+                                                  method=self._evaluation,
+                                                  epsilon=self._epsilon)
+                Q = _compute_Q_tabular(cmdp, V)
+            else:
+                finished = False
+                while not finished:
+                    V_old = np.array(V)
+                    change = 0.0
+                    for s in mdp.S:
+                        V[s] = R(s, None) + mdp.gamma * \
+                            np.sum([p * V[s1] for (p, s1) in T(s, policy[s])])
+                    change = max(np.fabs(V - V_old))
+                    if change < self._epsilon:
+                        finished = True
+                    self.n_backups_ += len(V)
+
+                Q = _compute_Q(mdp, V)
+            self.n_backups_ += len(V)
             old_policy = np.array(policy)
             policy = np.argmax(Q, axis=0)
             policy_change = max(np.fabs(policy - old_policy))
@@ -138,6 +203,15 @@ class ValueIteration(Planner):
         Maximum number of iterations of the algorithm
     epsilon : float, optional (default: 1e-05)
         Threshold for policy change in policy evaluation
+    vectorized : bool, optional (default: True)
+        Use sparse matrix Bellman backups whenever the MDP can be compiled
+        into a :class:`funzo.models.CompiledMDP`
+    cache_size : int, optional (default: 0)
+        Number of plans to cache, keyed on the reward vector of the MDP (only
+        for compiled MDPs). Repeated rewards, e.g. rejected or revisited
+        MCMC proposals, are then not re-planned, while new rewards without a
+        `V_init` are warm started from the plan of the nearest cached reward.
+        Zero disables caching.
 
     Attributes
     ------------
@@ -145,6 +219,12 @@ class ValueIteration(Planner):
         Maximum number of iterations of the algorithm
     _epsilon : float
         Threshold for policy change in policy evaluation
+    _vectorized : bool
+        Flag for using vectorized backups on compiled MDPs
+    _cache : object or None
+        Least recently used cache of plans keyed on the reward vector
+    n_backups_ : int
+        Number of single state Bellman backups performed
 
     Returns
     --------
@@ -161,9 +241,12 @@ class ValueIteration(Planner):
     MIT Press
 
     """
-    def __init__(self, max_iter=200, epsilon=1e-05):
+    def __init__(self, max_iter=200, epsilon=1e-05, vectorized=True,
+                 cache_size=0):
         self._max_iter = max_iter
         self._epsilon = epsilon
+        self._vectorized = vectorized
+        self._cache = _PlanCache(cache_size) if cache_size > 0 else None
 
     def solve(self, mdp, V_init=None, pi_init=None):
         """ Run the value iteration algorithm
@@ -173,9 +256,9 @@ class ValueIteration(Planner):
         mdp : :class:`funzo.models.MDP` instance
             The MDP to plan on.
         V_init : array-like
-            Initial value function
+            Initial value function, used as a warm start
         pi_init : array-like
-            Initial policy
+            Initial policy (unused, value iteration only needs V)
 
 
         Returns
@@ -184,33 +267,434 @@ class ValueIteration(Planner):
             Dictionary containing the optimal Q, V and pi found
 
         """
-        V = np.zeros(len(mdp.S))
+        self.n_backups_ = 0
+        cmdp = _compiled(mdp) if self._vectorized else None
+        if cmdp is not None:
+            R_vec = cmdp.reward_vector()
+            if self._cache is not None:
+                cached = self._cache.get(cmdp, R_vec)
+                if cached is not None:
+                    return cached
+                if V_init is None:
+                    V_init = self._cache.nearest_value(cmdp, R_vec)
+
+        if V_init is not None:
+            V = np.array(V_init, dtype=float)
+        else:
+            V = np.zeros(len(mdp.S))
         stable = False
         iteration = 0
         while not stable and iteration < self._max_iter:
             V_old = np.array(V)
-            delta = 0
-            for s in mdp.S:
-                V[s] = mdp.R(s, None) + mdp.gamma * \
-                    max([np.sum([p * V_old[s1]
-                        for (p, s1) in mdp.T(s, a)])
-                        for a in mdp.actions(s)])
-                delta = max(delta, np.abs(V[s] - V_old[s]))
+            if cmdp is not None:
+                Q = _compute_Q_tabular(cmdp, V_old)
+                V = R_vec + _masked_max(cmdp, Q)
+                delta = np.max(np.abs(V - V_old))
+            else:
+                delta = 0
+                for s in mdp.S:
+                    V[s] = mdp.R(s, None) + mdp.gamma * \
+                        max([np.sum([p * V_old[s1]
+                            for (p, s1) in mdp.T(s, a)])
+                            for a in mdp.actions(s)])
+                    delta = max(delta, np.abs(V[s] - V_old[s]))
             if delta < self._epsilon * (1 - mdp.gamma) / mdp.gamma:
                 stable = True
 
+            self.n_backups_ += len(V)
             iteration += 1
 
         result = dict()
         result['V'] = V
-        result['Q'] = _compute_Q(mdp, V)
+        if cmdp is not None:
+            result['Q'] = _compute_Q_tabular(cmdp, V)
+        else:
+            result['Q'] = _compute_Q(mdp, V)
         result['pi'] = np.argmax(result['Q'], axis=0)
+
+        if cmdp is not None and self._cache is not None:
+            self._cache.put(cmdp, R_vec, result)
         return result
 
 
+class ModifiedPolicyIteration(Planner):
+    """ Modified policy iteration for computing optimal MDP policy
+
+    Interleaves greedy policy improvement with only `k` sweeps of (partial)
+    policy evaluation, [Puterman78]_. With ``k=0`` the algorithm reduces to
+    value iteration, while as :math:`k \\rightarrow \infty` it becomes policy
+    iteration.
+
+    Requires an MDP which can be compiled into a
+    :class:`funzo.models.CompiledMDP`.
+
+    Parameters
+    ------------
+    k : int, optional (default: 5)
+        Number of partial policy evaluation sweeps per improvement step
+    max_iter : int, optional (default: 200)
+        Maximum number of policy improvement steps
+    epsilon : float, optional (default: 1e-05)
+        Threshold on the Bellman residual for convergence
+
+    Attributes
+    ------------
+    _k : int
+        Number of partial policy evaluation sweeps per improvement step
+    _max_iter : int
+        Maximum number of policy improvement steps
+    _epsilon : float
+        Threshold on the Bellman residual for convergence
+    n_backups_ : int
+        Number of single state Bellman backups performed
+
+    See Also
+    ----------
+    PolicyIteration, ValueIteration
+
+    References
+    ------------
+    .. [Puterman78] Puterman M. L. and Shin M. C., "Modified Policy Iteration
+        Algorithms for Discounted Markov Decision Problems", Management
+        Science, 1978
+
+    """
+    def __init__(self, k=5, max_iter=200, epsilon=1e-05):
+        if k < 0:
+            raise ValueError('Number of evaluation sweeps must be >= 0')
+        self._k = k
+        self._max_iter = max_iter
+        self._epsilon = epsilon
+
+    def solve(self, mdp, V_init=None, pi_init=None):
+        """ Run the modified policy iteration algorithm
+
+        Parameters
+        ------------
+        mdp : :class:`funzo.models.MDP` instance
+            The MDP to plan on.
+        V_init : array-like
+            Initial value function
+        pi_init : array-like
+            Initial policy, evaluated for `k` sweeps before the first
+            improvement step
+
+        Returns
+        --------
+        plan : dict
+            Dictionary containing the optimal Q, V and pi found
+
+        """
+        cmdp = mdp.compile()
+        R = cmdp.reward_vector()
+        V = _initial_value(cmdp, V_init)
+        self.n_backups_ = 0
+
+        if pi_init is not None:
+            V = self._partial_evaluation(cmdp, R, pi_init, V)
+
+        threshold = self._epsilon * (1 - cmdp.gamma) / cmdp.gamma
+        for _ in range(self._max_iter):
+            V_new, policy = _greedy_backup(cmdp, R, V)
+            self.n_backups_ += len(V)
+            residual = np.max(np.fabs(V_new - V))
+            V = V_new
+            if residual < threshold:
+                break
+            V = self._partial_evaluation(cmdp, R, policy, V)
+
+        return _make_plan(cmdp, V)
+
+    def _partial_evaluation(self, cmdp, R, policy, V):
+        """ Run `k` sweeps of policy evaluation """
+        P_pi = _policy_transitions(cmdp, policy)
+        for _ in range(self._k):
+            V = R + cmdp.gamma * P_pi.dot(V)
+        self.n_backups_ += self._k * len(V)
+        return V
+
+
+class GaussSeidelValueIteration(Planner):
+    """ In-place (Gauss-Seidel) value iteration
+
+    Like :class:`ValueIteration`, but every state backup immediately uses the
+    updated values of the states backed up before it in the same sweep,
+    which typically propagates values faster in large sparse MDPs.
+
+    Requires an MDP which can be compiled into a
+    :class:`funzo.models.CompiledMDP`.
+
+    Parameters
+    ------------
+    max_iter : int, optional (default: 200)
+        Maximum number of sweeps over the state space
+    epsilon : float, optional (default: 1e-05)
+        Threshold on the Bellman residual for convergence
+
+    Attributes
+    ------------
+    _max_iter : int
+        Maximum number of sweeps over the state space
+    _epsilon : float
+        Threshold on the Bellman residual for convergence
+    n_backups_ : int
+        Number of single state Bellman backups performed
+
+    See Also
+    ----------
+    ValueIteration, PrioritizedSweepingValueIteration
+
+    """
+    def __init__(self, max_iter=200, epsilon=1e-05):
+        self._max_iter = max_iter
+        self._epsilon = epsilon
+
+    def solve(self, mdp, V_init=None, pi_init=None):
+        """ Run the Gauss-Seidel value iteration algorithm
+
+        Parameters
+        ------------
+        mdp : :class:`funzo.models.MDP` instance
+            The MDP to plan on.
+        V_init : array-like
+            Initial value function
+        pi_init : array-like
+            Initial policy (unused)
+
+        Returns
+        --------
+        plan : dict
+            Dictionary containing the optimal Q, V and pi found
+
+        """
+        cmdp = mdp.compile()
+        R = cmdp.reward_vector()
+        V = _initial_value(cmdp, V_init)
+        table = _StateActionTable(cmdp)
+        self.n_backups_ = 0
+
+        threshold = self._epsilon * (1 - cmdp.gamma) / cmdp.gamma
+        for _ in range(self._max_iter):
+            delta = 0.0
+            for s in cmdp.S:
+                v = R[s] + table.backup(s, V)
+                delta = max(delta, abs(v - V[s]))
+                V[s] = v
+            self.n_backups_ += len(V)
+            if delta < threshold:
+                break
+
+        return _make_plan(cmdp, V)
+
+
+class PrioritizedSweepingValueIteration(Planner):
+    """ Value iteration with prioritized sweeping
+
+    Instead of sweeping over all states, states are backed up in order of
+    their (estimated) Bellman error, kept in a priority queue. After a backup
+    of state :math:`s` changes its value by :math:`\Delta`, every predecessor
+    :math:`p` of :math:`s` is queued with priority
+    :math:`\gamma \max_a T(p, a, s) |\Delta|`, [Moore93]_.
+
+    Once the queue is exhausted, the full Bellman residual is checked and any
+    states exceeding the threshold are queued again, so the result satisfies
+    the same convergence criterion as :class:`ValueIteration`.
+
+    Requires an MDP which can be compiled into a
+    :class:`funzo.models.CompiledMDP`.
+
+    Parameters
+    ------------
+    max_backups : int, optional (default: None)
+        Maximum number of state backups. Defaults to 200 sweeps worth,
+        i.e. :math:`200 |\mathcal{S}|`
+    epsilon : float, optional (default: 1e-05)
+        Threshold on the Bellman residual for convergence
+
+    Attributes
+    ------------
+    _max_backups : int
+        Maximum number of state backups
+    _epsilon : float
+        Threshold on the Bellman residual for convergence
+    n_backups_ : int
+        Number of single state Bellman backups performed
+
+    See Also
+    ----------
+    ValueIteration, GaussSeidelValueIteration
+
+    References
+    ------------
+    .. [Moore93] Moore A. W. and Atkeson C. G., "Prioritized Sweeping:
+        Reinforcement Learning with Less Data and Less Real Time", Machine
+        Learning, 1993
+
+    """
+    def __init__(self, max_backups=None, epsilon=1e-05):
+        self._max_backups = max_backups
+        self._epsilon = epsilon
+
+    def solve(self, mdp, V_init=None, pi_init=None):
+        """ Run the prioritized sweeping value iteration algorithm
+
+        Parameters
+        ------------
+        mdp : :class:`funzo.models.MDP` instance
+            The MDP to plan on.
+        V_init : array-like
+            Initial value function
+        pi_init : array-like
+            Initial policy (unused)
+
+        Returns
+        --------
+        plan : dict
+            Dictionary containing the optimal Q, V and pi found
+
+        """
+        cmdp = mdp.compile()
+        R = cmdp.reward_vector()
+        V = _initial_value(cmdp, V_init)
+        threshold = self._epsilon * (1 - cmdp.gamma) / cmdp.gamma
+
+        V, self.n_backups_ = _prioritized_sweeping(
+            cmdp, R, V, threshold, self._backup_limit(cmdp),
+            structures=self._structures(cmdp))
+
+        return _make_plan(cmdp, V)
+
+    def replan(self, mdp, plan, index=None, delta=None):
+        """ Incrementally update a plan after a change in the reward
+
+        Starting from the previous value function, only the Bellman error
+        introduced by the reward change is propagated, backwards along the
+        reverse transition graph. When a single state reward changed, given
+        by `index` and `delta`, the queue is seeded with that state alone;
+        otherwise with all states with a non zero Bellman residual. Both end
+        with a full residual check, so the result matches :meth:`solve`.
+
+        Parameters
+        ------------
+        mdp : :class:`funzo.models.MDP` instance
+            The MDP to plan on, with the new reward
+        plan : dict
+            Previous plan (pi, V and Q) found with the old reward
+        index : int, optional (default: None)
+            The state whose reward changed, if only a single one did
+        delta : float, optional (default: None)
+            Change in the reward of state `index`
+
+        Returns
+        --------
+        plan : dict
+            Dictionary containing the updated Q, V and pi
+
+        """
+        cmdp = mdp.compile()
+        R = cmdp.reward_vector()
+        V = _initial_value(cmdp, plan['V'])
+        threshold = self._epsilon * (1 - cmdp.gamma) / cmdp.gamma
+
+        seeds = None
+        if index is not None and delta is not None:
+            seeds = {index: abs(delta)}
+
+        V, self.n_backups_ = _prioritized_sweeping(
+            cmdp, R, V, threshold, self._backup_limit(cmdp), seeds,
+            structures=self._structures(cmdp))
+
+        return _make_plan(cmdp, V)
+
+    def _backup_limit(self, cmdp):
+        if self._max_backups is None:
+            return 200 * cmdp.n_states
+        return self._max_backups
+
+    def _structures(self, cmdp):
+        """ Backup table and reverse graph, kept across (re)plans
+
+        The backup table holds the discount factor, so it is rebuilt when
+        the discount of the MDP changes.
+
+        """
+        if getattr(self, '_cached_mdp', None) is not cmdp or \
+                self._cached_gamma != cmdp.gamma:
+            self._cached_mdp = cmdp
+            self._cached_gamma = cmdp.gamma
+            self._cached_structures = (_StateActionTable(cmdp),
+                                       _predecessors(cmdp))
+        return self._cached_structures
+
+
 ##############################################################################
 
 
+class _PlanCache(object):
+    """ Least recently used cache of MDP plans keyed on the reward vector
+
+    During reward learning, e.g. PolicyWalk MCMC, the same reward vectors
+    are visited many times and successive rewards differ in few entries.
+    The cache returns stored plans for exact matches and the value function
+    of the nearest (in :math:`L_1`) cached reward for warm starts otherwise.
+    Plans are also keyed on the compiled MDP and its discount factor.
+
+    Parameters
+    -----------
+    size : int
+        Maximum number of plans stored
+
+    """
+    def __init__(self, size):
+        if size <= 0:
+            raise ValueError('Cache size must be > 0')
+        self._size = size
+        self._plans = OrderedDict()
+
+    def get(self, cmdp, reward):
+        """ Get a copy of the plan for the reward, or None if not cached """
+        key = self._key(cmdp, reward)
+        if key not in self._plans:
+            return None
+        self._plans[key] = self._plans.pop(key)  # mark as recently used
+        return _copy_plan(self._plans[key][2])
+
+    def put(self, cmdp, reward, plan):
+        """ Store a plan for the reward """
+        key = self._key(cmdp, reward)
+        self._plans.pop(key, None)
+        self._plans[key] = (cmdp, np.array(reward), _copy_plan(plan))
+        while len(self._plans) > self._size:
+            self._plans.popitem(last=False)
+
+    def nearest_value(self, cmdp, reward):
+        """ Value function of the cached plan with the nearest reward """
+        best, best_dist = None, np.inf
+        for key, (model, r, plan) in self._plans.items():
+            if model is not cmdp or key[1] != cmdp.gamma:
+                continue
+            dist = np.sum(np.fabs(r - reward))
+            if dist < best_dist:
+                best, best_dist = plan['V'], dist
+        return None if best is None else np.array(best)
+
+    def clear(self):
+        """ Remove all cached plans """
+        self._plans.clear()
+
+    def __len__(self):
+        return len(self._plans)
+
+    def _key(self, cmdp, reward):
+        reward = np.ascontiguousarray(reward, dtype=float)
+        return (id(cmdp), cmdp.gamma, reward.tobytes())
+
+
+def _copy_plan(plan):
+    """ Copy the arrays of a plan dictionary """
+    return dict((k, np.array(v)) for k, v in plan.items())
+
+
 def _policy_evaluation(mdp, policy, max_iter=200, epsilon=1e-05):
     """ Compute the value of a policy
 
@@ -249,3 +733,245 @@ def _compute_Q(mdp, value):
         for s in mdp.S:
             Q[a][s] = _expected_utility(mdp, a, s, value)
     return Q
+
+
+##############################################################################
+# Vectorized backups on compiled (tabular) MDPs
+
+
+def _compiled(mdp):
+    """ Get the compiled tabular form of the MDP, or None if not possible """
+    if isinstance(mdp, CompiledMDP):
+        return mdp
+    try:
+        return mdp.compile()
+    except (TypeError, ValueError, NotImplementedError):
+        return None
+
+
+def _compute_Q_tabular(cmdp, value):
+    """ Compute the action-value function using sparse matrix products
+
+    Equivalent to :func:`_compute_Q`, with one product per action
+
+    """
+    return cmdp.gamma * np.vstack([P_a.dot(value) for P_a in cmdp.P])
+
+
+def _masked_max(cmdp, Q):
+    """ Maximum of Q over the actions available at each state """
+    return np.max(np.where(cmdp.action_mask.T, Q, -np.inf), axis=0)
+
+
+def _policy_transitions(cmdp, policy):
+    """ Transition matrix induced by a deterministic policy, P_pi[s, s'] """
+    policy = np.asarray(policy)
+    P_pi = sp.csr_matrix(cmdp.P[0].shape)
+    for a, P_a in enumerate(cmdp.P):
+        P_pi = P_pi + sp.diags((policy == a).astype(float)).dot(P_a)
+    return P_pi.tocsr()
+
+
+def _policy_evaluation_tabular(cmdp, R, P_pi, value, max_iter=200,
+                               epsilon=1e-05):
+    """ Iterative policy evaluation using sparse matrix-vector products
+
+    Stops after `max_iter` sweeps at most, as :func:`_policy_evaluation`.
+
+    """
+    value = np.array(value, dtype=float)
+    sweeps = 0
+    finished = False
+    while sweeps < max_iter and not finished:
+        v_old = value
+        value = R + cmdp.gamma * P_pi.dot(v_old)
+        sweeps += 1
+        if np.max(np.fabs(value - v_old)) < epsilon:
+            finished = True
+    return value, sweeps
+
+
+def _policy_evaluation_linear(cmdp, R, P_pi, value, method='exact',
+                              epsilon=1e-05):
+    """ Policy evaluation by solving the linear Bellman equations
+
+    .. math::
+
+        (I - \\gamma P_{\\pi}) V = R
+
+    using a sparse direct solver (``exact``) or a Krylov method (``gmres``,
+    ``bicgstab``) warm started at `value`. Krylov solves stop once the
+    residual norm is below :math:`\\epsilon (1 - \\gamma)`, which bounds the
+    error of every entry of V by :math:`\\epsilon`.
+
+    """
+    A = sp.identity(P_pi.shape[0], format='csc') - cmdp.gamma * P_pi.tocsc()
+    if method == 'exact':
+        return spla.spsolve(A, R)
+
+    solver = spla.gmres if method == 'gmres' else spla.bicgstab
+    x0 = np.asarray(value, dtype=float)
+    atol = epsilon * (1 - cmdp.gamma)
+    try:
+        V, info = solver(A, R, x0=x0, rtol=0.0, atol=atol)
+    except TypeError:
+        # scipy < 1.12 names the relative tolerance tol
+        V, info = solver(A, R, x0=x0, tol=0.0, atol=atol)
+    if info != 0:
+        warnings.warn('{} did not converge (info={}), using direct solve'
+                      .format(method, info))
+        V = spla.spsolve(A, R)
+    return V
+
+
+def _initial_value(cmdp, V_init=None):
+    """ Initial value function as a float array """
+    if V_init is not None:
+        V = np.array(V_init, dtype=float)
+        if V.shape != (cmdp.n_states,):
+            raise ValueError('Initial value function must have one entry'
+                             ' per state')
+        return V
+    return np.zeros(cmdp.n_states)
+
+
+def _make_plan(cmdp, value):
+    """ Assemble the plan dictionary from a value function """
+    result = dict()
+    result['V'] = value
+    result['Q'] = _compute_Q_tabular(cmdp, value)
+    result['pi'] = np.argmax(result['Q'], axis=0)
+    return result
+
+
+def _greedy_backup(cmdp, R, value):
+    """ Full Bellman optimality backup with the greedy policy """
+    Q = np.where(cmdp.action_mask.T, _compute_Q_tabular(cmdp, value), -np.inf)
+    return R + np.max(Q, axis=0), np.argmax(Q, axis=0)
+
+
+class _StateActionTable(object):
+    """ Transitions stacked by state for single state backups
+
+    Row :math:`s |\mathcal{A}| + a` holds :math:`T(s, a, \cdot)` for the
+    actions available at :math:`s`, so backing up a state only touches a
+    contiguous slice of the table.
+
+    """
+    def __init__(self, cmdp):
+        n_s, n_a = cmdp.n_states, cmdp.n_actions
+        self.gamma = cmdp.gamma
+        mask = cmdp.action_mask.ravel()
+        rows = np.arange(n_s * n_a)
+        stacked = sp.vstack(cmdp.P, format='csr')
+        # stacked row a |S| + s  -->  s |A| + a
+        order = (rows % n_s) * n_a + rows // n_s
+        P = stacked[np.argsort(order)]
+        P = sp.diags(mask.astype(float)).dot(P).tocsr()
+        P.eliminate_zeros()
+        self.n_actions = n_a
+        self.indptr = P.indptr
+        self.indices = P.indices
+        self.data = P.data
+        self.rows = np.repeat(np.arange(n_s * n_a) % n_a, np.diff(P.indptr))
+        self.mask = cmdp.action_mask
+
+    def backup(self, state, value):
+        """ Discounted best expected next state value at `state` """
+        lo = self.indptr[state * self.n_actions]
+        hi = self.indptr[(state + 1) * self.n_actions]
+        q = np.bincount(self.rows[lo:hi],
+                        weights=self.data[lo:hi] * value[self.indices[lo:hi]],
+                        minlength=self.n_actions)
+        return self.gamma * np.max(q[self.mask[state]])
+
+
+def _predecessors(cmdp):
+    """ Reverse transition graph weighted by max_a T(p, a, s)
+
+    Returns a CSC matrix whose column `s` lists the predecessors of `s`
+
+    """
+    P_max = cmdp.P[0]
+    for P_a in cmdp.P[1:]:
+        P_max = P_max.maximum(P_a)
+    return P_max.tocsc()
+
+
+def _prioritized_sweeping(cmdp, R, value, threshold, max_backups,
+                          seeds=None, structures=None):
+    """ Prioritized sweeping of Bellman backups
+
+    Parameters
+    -----------
+    cmdp : :class:`funzo.models.CompiledMDP`
+        The compiled MDP
+    R : array-like
+        State rewards
+    value : array-like
+        Initial value function, updated in place
+    threshold : float
+        Bellman error threshold for convergence
+    max_backups : int
+        Maximum number of single state backups
+    seeds : dict, optional (default: None)
+        Initial queue as a mapping of states to priorities. If None the
+        queue is seeded with the Bellman residual of every state
+    structures : tuple, optional (default: None)
+        Pre-computed backup table and predecessor graph of the MDP
+
+    Returns
+    --------
+    value : array-like
+        Converged value function
+    n_backups : int
+        Number of single state backups performed
+
+    """
+    if structures is None:
+        structures = (_StateActionTable(cmdp), _predecessors(cmdp))
+    table, preds = structures
+    priority = np.zeros(cmdp.n_states)
+    heap = list()
+
+    def _push(s, p):
+        if p > threshold and p > priority[s]:
+            priority[s] = p
+            heapq.heappush(heap, (-p, s))
+
+    def _seed_residuals():
+        V_new, _ = _greedy_backup(cmdp, R, value)
+        for s in np.flatnonzero(np.fabs(V_new - value) > threshold):
+            _push(s, abs(V_new[s] - value[s]))
+
+    if seeds is None:
+        _seed_residuals()
+    else:
+        for s, p in seeds.items():
+            _push(s, p)
+
+    n_backups = 0
+    while n_backups < max_backups:
+        if not heap:
+            # verify convergence with a full residual check
+            _seed_residuals()
+            n_backups += len(value)
+            if not heap:
+                break
+            continue
+
+        p, s = heapq.heappop(heap)
+        if -p != priority[s]:
+            continue  # stale entry, superseded by a higher priority copy
+        priority[s] = 0.0
+
+        v = R[s] + table.backup(s, value)
+        change = abs(v - value[s])
+        value[s] = v
+        n_backups += 1
+
+        lo, hi = preds.indptr[s], preds.indptr[s + 1]
+        for pred, w in zip(preds.indices[lo:hi], preds.data[lo:hi]):
+            _push(pred, cmdp.gamma * w * change)
+
+    return value, n_backups
@@ -0,0 +1,251 @@
+"""
+Semi-MDP planning on state graphs
+
+Controller graphs (see :class:`funzo.representation.ControllerGraph`) are
+semi-MDPs, whose actions are the out-going edges of the nodes, each running a
+local controller for some duration. Their planning is done directly on the
+edge table of the graph.
+
+"""
+
+from __future__ import division
+
+import numpy as np
+
+from .base import Planner
+
+
+__all__ = [
+    'GraphValueIteration',
+]
+
+
+class GraphValueIteration(Planner):
+    """ Value iteration for semi-MDPs represented as state graphs
+
+    Each edge :math:`e = (n, m)` is a temporally extended action with reward
+    :math:`r_e` and duration :math:`\\tau_e`, and the value of a node is given
+    by the semi-MDP Bellman equation,
+
+    .. math::
+
+        V(n) = \max_{e = (n, m)} r_e + \gamma^{\\tau_e} V(m)
+
+    while nodes without out-going edges (e.g. the goal) are absorbing, with a
+    fixed terminal value. Backups are vectorized sweeps over the compressed
+    edge table of the graph (see :meth:`StateGraph.edge_table`) and the
+    resulting V, pi (target node of the best edge, the node itself for
+    absorbing nodes) and Q (list of edge values in the order of
+    :meth:`StateGraph.out_edges`) are written back as graph signals.
+
+    Parameters
+    ------------
+    max_iter : int, optional (default: 500)
+        Maximum number of sweeps of the algorithm
+    epsilon : float, optional (default: 1e-05)
+        Threshold on the change of the node values for convergence
+    discount : float, optional (default: None)
+        Discount factor, taken from the MDP if None
+    terminal_value : float, optional (default: 0.0)
+        Value of the absorbing nodes
+    write_back : bool, optional (default: True)
+        Set the V, pi and Q signals of the graph to the plan found
+
+    Attributes
+    ------------
+    n_backups_ : int
+        Number of single node Bellman backups performed
+
+    """
+    def __init__(self, max_iter=500, epsilon=1e-05, discount=None,
+                 terminal_value=0.0, write_back=True):
+        self._max_iter = max_iter
+        self._epsilon = epsilon
+        self._discount = discount
+        self._terminal_value = terminal_value
+        self._write_back = write_back
+
+    def solve(self, mdp, V_init=None, pi_init=None):
+        """ Run value iteration on the graph
+
+        Parameters
+        ------------
+        mdp : :class:`StateGraph` or MDP instance
+            The graph to plan on, or an MDP with a ``graph`` attribute such as
+            :class:`funzo.domains.social_navigation.CGSocialNavigationMDP`
+        V_init : array-like, optional (default: None)
+            Initial node values, in the order of the graph nodes
+        pi_init : array-like
+            Initial policy (unused, value iteration only needs V)
+
+        Returns
+        --------
+        plan : dict
+            Dictionary containing the node ids (nodes), node values (V),
+            policy (pi) and edge values (Q, in edge table order) found
+
+        """
+        graph, gamma = self._graph(mdp)
+        table = _EdgeTable(graph.edge_table(), gamma)
+        V = np.full(table.n_nodes, self._terminal_value, dtype=float)
+        if V_init is not None:
+            V[:] = V_init
+
+        V = self._sweep(table, V, np.ones(table.n_nodes, dtype=bool))
+        return self._make_plan(graph, table, V)
+
+    def replan(self, mdp, plan, index=None, delta=None):
+        """ Incrementally update a plan after the graph changed
+
+        The previous node values are reused (new nodes start at the terminal
+        value) and backups are only done for the nodes affected by the
+        change, spreading backwards along the edges to the predecessors of
+        nodes whose value changed. The update ends with a full residual
+        check, so the result matches :meth:`solve`.
+
+        Parameters
+        ------------
+        mdp : :class:`StateGraph` or MDP instance
+            The graph to plan on, with new nodes or edges
+        plan : dict
+            Previous plan found on the graph
+        index : iterable, optional (default: None)
+            Ids of the nodes whose out-going edges were added, removed or
+            changed. New nodes are always updated.
+        delta : float, optional (default: None)
+            Unused
+
+        Returns
+        --------
+        plan : dict
+            Dictionary containing the updated nodes, V, pi and Q
+
+        """
+        graph, gamma = self._graph(mdp)
+        table = _EdgeTable(graph.edge_table(), gamma)
+
+        old = dict(zip(plan['nodes'], plan['V']))
+        V = np.array([old.get(n, self._terminal_value) for n in table.nodes],
+                     dtype=float)
+        active = np.array([n not in old for n in table.nodes], dtype=bool)
+        if index is not None:
+            position = dict((n, i) for i, n in enumerate(table.nodes))
+            active[[position[n] for n in index if n in position]] = True
+
+        V = self._sweep(table, V, active)
+        return self._make_plan(graph, table, V)
+
+    def _sweep(self, table, V, active):
+        """ Back up the active nodes until their values converge """
+        self.n_backups_ = 0
+        for _ in range(self._max_iter):
+            if not active.any():
+                # full residual check before stopping
+                active = np.abs(table.backup(V, self._terminal_value) -
+                                V) > self._epsilon
+                self.n_backups_ += table.n_nodes
+                if not active.any():
+                    break
+
+            rows = np.flatnonzero(active)
+            V_new = table.backup(V, self._terminal_value, rows)
+            self.n_backups_ += len(rows)
+
+            changed = rows[np.abs(V_new - V[rows]) > self._epsilon]
+            V[rows] = V_new
+            active = np.zeros(table.n_nodes, dtype=bool)
+            active[table.predecessors(changed)] = True
+        return V
+
+    def _make_plan(self, graph, table, V):
+        Q = table.edge_values(V)
+        pi = table.greedy(Q)
+        plan = dict(nodes=table.nodes, V=V, Q=Q,
+                    pi=[table.nodes[m] for m in pi])
+        if self._write_back:
+            indptr = table.indptr
+            graph.set_signal('V', V)
+            graph.set_signal('pi', plan['pi'])
+            graph.set_signal('Q', [Q[indptr[i]:indptr[i + 1]].tolist()
+                                   for i in range(table.n_nodes)])
+        return plan
+
+    def _graph(self, mdp):
+        graph = getattr(mdp, 'graph', mdp)
+        gamma = self._discount
+        if gamma is None:
+            gamma = getattr(mdp, 'gamma', None)
+        if gamma is None:
+            raise ValueError('A discount factor is required for planning on'
+                             ' a graph without an MDP')
+        return graph, gamma
+
+
+##############################################################################
+
+
+class _EdgeTable(object):
+    """ Compressed edge table of a graph with discounted edge backups """
+
+    def __init__(self, table, gamma):
+        self.nodes, self.indptr, self.targets, duration, self.reward = table
+        self.n_nodes = len(self.nodes)
+        self.discount = gamma ** duration
+
+        self.degree = np.diff(self.indptr)
+        self.sources = np.repeat(np.arange(self.n_nodes), self.degree)
+
+        # reverse edges, for spreading value changes to predecessors
+        order = np.argsort(self.targets, kind='mergesort')
+        self._pred = self.sources[order]
+        self._pred_indptr = np.zeros(self.n_nodes + 1, dtype=int)
+        self._pred_indptr[1:] = np.cumsum(
+            np.bincount(self.targets, minlength=self.n_nodes))
+
+    def edge_values(self, V, edges=None):
+        """ Q values :math:`r_e + \gamma^{\\tau_e} V(m)` of the edges """
+        if edges is None:
+            return self.reward + self.discount * V[self.targets]
+        return self.reward[edges] + \
+            self.discount[edges] * V[self.targets[edges]]
+
+    def backup(self, V, terminal_value, rows=None):
+        """ Bellman backups of the given nodes (all if None) """
+        if rows is None or len(rows) == self.n_nodes:
+            rows = np.arange(self.n_nodes)
+            edges, offsets = None, self.indptr[:-1]
+        else:
+            edges, offsets = _gather(self.indptr, rows)
+        V_new = np.full(len(rows), terminal_value, dtype=float)
+        nonempty = self.degree[rows] > 0
+        if nonempty.any():
+            Q = self.edge_values(V, edges)
+            V_new[nonempty] = np.maximum.reduceat(Q, offsets[nonempty])
+        return V_new
+
+    def greedy(self, Q):
+        """ Target of the first best edge of each node, itself if none """
+        pi = np.arange(self.n_nodes)
+        nonempty = self.degree > 0
+        if nonempty.any():
+            starts = self.indptr[:-1][nonempty]
+            Q_max = np.full(self.n_nodes, np.inf)
+            Q_max[nonempty] = np.maximum.reduceat(Q, starts)
+            best = np.where(Q >= Q_max[self.sources], np.arange(len(Q)),
+                            len(Q))
+            pi[nonempty] = self.targets[np.minimum.reduceat(best, starts)]
+        return pi
+
+    def predecessors(self, rows):
+        """ Positions of the sources of the edges into the given nodes """
+        edges, _ = _gather(self._pred_indptr, rows)
+        return self._pred[edges]
+
+
+def _gather(indptr, rows):
+    """ Concatenated ``indptr[r]:indptr[r + 1]`` ranges and their offsets """
+    lengths = indptr[rows + 1] - indptr[rows]
+    offsets = np.zeros(len(rows), dtype=int)
+    offsets[1:] = np.cumsum(lengths)[:-1]
+    starts = np.repeat(indptr[rows] - offsets, lengths)
+    return starts + np.arange(lengths.sum()), offsets
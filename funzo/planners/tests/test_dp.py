@@ -1,15 +1,156 @@
 
-from numpy.testing import assert_equal
+import numpy as np
 
+from nose.tools import assert_raises
+from numpy.testing import assert_equal, assert_allclose
+
+from funzo.domains.gridworld import GridWorld, GridWorldMDP
+from funzo.domains.gridworld import GReward, GTransition
 from funzo.planners.dp import PolicyIteration
 from funzo.planners.dp import ValueIteration
+from funzo.planners.dp import ModifiedPolicyIteration
+from funzo.planners.dp import GaussSeidelValueIteration
+from funzo.planners.dp import PrioritizedSweepingValueIteration
+
+
+def _grid_mdp():
+    gmap = np.zeros(shape=(5, 5))
+    gmap[0, 4] = 2
+    gmap[1, 1:4] = 1
+    gmap[3, 2] = 1
+    with GridWorld(gmap) as world:
+        mdp = GridWorldMDP(GReward(), GTransition(wind=0.2), 0.9)
+    return world, mdp
 
 
 def test_PI():
     """ Test policy iteration planner """
-    pass
+    world, mdp = _grid_mdp()
+    with world:
+        loop = PolicyIteration(random_state=0, vectorized=False).solve(mdp)
+        vect = PolicyIteration(random_state=0).solve(mdp)
+    assert_allclose(loop['V'], vect['V'], atol=1e-04)
+    assert_allclose(loop['Q'], vect['Q'], atol=1e-04)
+    assert_equal(loop['pi'], vect['pi'])
 
 
 def test_VI():
     """ Test value iteration planner """
-    pass
+    world, mdp = _grid_mdp()
+    with world:
+        loop = ValueIteration(vectorized=False).solve(mdp)
+        vect = ValueIteration().solve(mdp)
+    assert_allclose(loop['V'], vect['V'])
+    assert_allclose(loop['Q'], vect['Q'])
+    assert_equal(loop['pi'], vect['pi'])
+
+
+def test_PI_evaluation_modes():
+    """ Test policy iteration with linear solve policy evaluation """
+    world, mdp = _grid_mdp()
+    with world:
+        base = PolicyIteration(random_state=0, epsilon=1e-10).solve(mdp)
+        for mode in ('exact', 'gmres', 'bicgstab'):
+            plan = PolicyIteration(random_state=0, epsilon=1e-07,
+                                   evaluation=mode).solve(mdp)
+            assert_allclose(base['V'], plan['V'], rtol=0, atol=1e-07)
+            assert_equal(base['pi'], plan['pi'])
+
+    assert_raises(ValueError, PolicyIteration, evaluation='newton')
+
+
+def test_alternative_planners():
+    """ Test MPI, Gauss-Seidel and prioritized sweeping planners """
+    world, mdp = _grid_mdp()
+    with world:
+        ref = ValueIteration(epsilon=1e-08, max_iter=1000).solve(mdp)
+        for planner in (ModifiedPolicyIteration(k=3),
+                        GaussSeidelValueIteration(max_iter=1000),
+                        PrioritizedSweepingValueIteration()):
+            plan = planner.solve(mdp)
+            assert_allclose(ref['V'], plan['V'], atol=1e-03)
+            assert planner.n_backups_ > 0
+
+            # warm start from the solution needs (almost) no work
+            n_cold = planner.n_backups_
+            planner.solve(mdp, V_init=ref['V'])
+            assert planner.n_backups_ < n_cold
+
+    assert_raises(ValueError, ModifiedPolicyIteration, k=-1)
+
+
+def test_VI_warm_start():
+    """ Test value iteration warm starts and reward keyed plan cache """
+    world, mdp = _grid_mdp()
+    with world:
+        planner = ValueIteration(cache_size=4)
+        plan = planner.solve(mdp)
+        n_cold = planner.n_backups_
+
+        # perturb a single reward entry, as in a PolicyWalk step
+        r = np.array(mdp.reward._R)
+        r[3] += 0.2
+        mdp.reward.update_parameters(reward=r)
+        plan_warm = ValueIteration().solve(mdp, V_init=plan['V'])
+        plan_cold = ValueIteration().solve(mdp)
+        assert_allclose(plan_warm['V'], plan_cold['V'], atol=1e-04)
+
+        # cache miss is warm started from the nearest cached reward
+        planner.solve(mdp)
+        assert planner.n_backups_ < n_cold
+
+        # cache hit needs no backups
+        plan_hit = planner.solve(mdp)
+        assert planner.n_backups_ == 0
+        assert_allclose(plan_hit['V'], plan_warm['V'], atol=1e-04)
+
+
+def test_incremental_replan():
+    """ Test re-planning after a single state reward change """
+    world, mdp = _grid_mdp()
+    with world:
+        planner = PrioritizedSweepingValueIteration(epsilon=1e-07)
+        plan = planner.solve(mdp)
+        n_full = planner.n_backups_
+
+        r = np.array(mdp.reward._R)
+        r[7] -= 0.4
+        mdp.reward.update_parameters(reward=r)
+        plan_inc = planner.replan(mdp, plan, index=7, delta=-0.4)
+        n_inc = planner.n_backups_
+        plan_full = planner.solve(mdp)
+
+        # default re-planning is a warm started solve
+        plan_vi = ValueIteration().replan(mdp, plan, index=7, delta=-0.4)
+
+    assert n_inc < n_full
+    assert_allclose(plan_vi['V'], plan_full['V'], atol=1e-04)
+    assert_allclose(plan_inc['V'], plan_full['V'], atol=1e-05)
+    assert_allclose(plan_inc['Q'], plan_full['Q'], atol=1e-05)
+    assert_equal(plan_inc['pi'], plan_full['pi'])
+
+
+def test_prioritized_sweeping_discount_change():
+    """ Test prioritized sweeping after a change of the discount factor """
+    world, mdp = _grid_mdp()
+    with world:
+        planner = PrioritizedSweepingValueIteration(epsilon=1e-07)
+        planner.solve(mdp)
+
+        mdp.gamma = 0.5
+        plan = planner.solve(mdp)
+        ref = ValueIteration(epsilon=1e-08, max_iter=1000).solve(mdp)
+
+    assert_allclose(plan['V'], ref['V'], atol=1e-04)
+    assert_equal(plan['pi'], ref['pi'])
+
+
+def test_PI_evaluation_sweeps():
+    """ Test the bound on the sweeps of iterative policy evaluation """
+    world, mdp = _grid_mdp()
+    with world:
+        mdp.gamma = 0.999
+        planner = PolicyIteration(random_state=0, max_iter=1)
+        planner.solve(mdp)
+    # a single policy evaluation of at most 200 sweeps, and the improvement
+    assert 0 < planner.n_backups_ <= 201 * 25
@@ -0,0 +1,68 @@
+
+import numpy as np
+
+from nose.tools import assert_raises
+from numpy.testing import assert_equal, assert_allclose
+
+from funzo.planners.smdp import GraphValueIteration
+from funzo.representation.state_graph import StateGraph, ArrayStateGraph
+
+
+def _add_edges(graph, edges):
+    for source, target, duration, reward in edges:
+        graph.add_edge(source=source, target=target, duration=duration,
+                       reward=reward, phi=[0, 1], traj=np.zeros((2, 3)))
+
+
+def _chain_graph(graph_type):
+    # 0 -> 1 -> 2 (goal) and a direct but poor edge 0 -> 2
+    graph = graph_type(state_dim=3)
+    for n in range(3):
+        graph.add_node(nid=n, data=[n, 0, 0], cost=0, priority=1, Q=[], V=0,
+                       pi=0, ntype='simple')
+    _add_edges(graph, [(0, 1, 1.0, 0.0), (1, 2, 1.0, 1.0),
+                       (0, 2, 4.0, 0.5)])
+    return graph
+
+
+def test_graph_VI():
+    for graph_type in (StateGraph, ArrayStateGraph):
+        graph = _chain_graph(graph_type)
+        plan = GraphValueIteration(discount=0.9).solve(graph)
+
+        assert_allclose(plan['V'], [0.9, 1.0, 0.0])
+        assert_allclose(plan['Q'], [0.9, 0.5, 1.0])
+        assert_equal(plan['pi'], [1, 2, 2])
+        assert_allclose(graph.get_signal('V'), plan['V'])
+        assert_allclose(graph.gna(0, 'Q'), [0.9, 0.5])
+        assert_equal(graph.gna(0, 'pi'), 1)
+
+    assert_raises(ValueError, GraphValueIteration().solve, graph)
+
+
+def test_graph_VI_replan():
+    rng = np.random.RandomState(0)
+    graph = ArrayStateGraph(state_dim=3)
+    for n in range(50):
+        graph.add_node(nid=n, data=rng.uniform(size=3), cost=0, priority=1,
+                       Q=[], V=0, pi=0, ntype='simple')
+    pairs = sorted(set((s, t) for s, t in zip(rng.randint(1, 50, 200),
+                                              rng.randint(0, 50, 200))
+                       if s != t))
+    _add_edges(graph, [(s, t, rng.uniform(0.5, 2), rng.uniform(-1, 1))
+                       for s, t in pairs])
+
+    planner = GraphValueIteration(discount=0.9)
+    plan = planner.solve(graph)
+
+    graph.add_node(nid=50, data=[0, 0, 0], cost=0, priority=1, Q=[], V=0,
+                   pi=0, ntype='simple')
+    _add_edges(graph, [(50, 0, 1.0, 5.0), (7, 50, 1.0, 0.5)])
+    graph.remove_edge(*graph.out_edges(3)[0])
+    plan = planner.replan(graph, plan, index=[7, 3])
+
+    full_planner = GraphValueIteration(discount=0.9, write_back=False)
+    full = full_planner.solve(graph)
+    assert planner.n_backups_ < full_planner.n_backups_
+    assert_allclose(plan['V'], full['V'], atol=1e-04)
+    assert_equal(plan['pi'], full['pi'])
@@ -1,10 +1,10 @@
 
-from .state_graph import StateGraph
+from .state_graph import StateGraph, ArrayStateGraph
 
 from .controller_graph import ControllerGraph, CGParameters
 
 __all__ = [
-    'StateGraph',
+    'StateGraph', 'ArrayStateGraph',
     #
     'ControllerGraph', 'CGParameters',
 ]
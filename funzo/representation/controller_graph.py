@@ -1,15 +1,29 @@
 from __future__ import division, absolute_import
 
 import json
+import time
+import multiprocessing
+
+import six
+
+from multiprocessing.pool import ThreadPool
 
 import numpy as np
 
-from collections import Callable
+from collections import Callable, OrderedDict
 
 from sklearn import gaussian_process
 
-from .state_graph import StateGraph
-from ..domains.geometry import trajectory_length
+from .state_graph import StateGraph, ArrayStateGraph
+from ..domains.geometry import edist, trajectory_length
+from ..planners.smdp import GraphValueIteration
+from ..utils.validation import check_random_state
+
+
+_CMAX = 100
+_RMAX = 1
+
+EXECUTORS = ('serial', 'thread', 'process')
 
 
 class ControllerGraph(object):
@@ -25,17 +39,87 @@ class ControllerGraph(object):
     set of terminal states. The transition function role is handles by the
     local controller.
 
+    Parameters
+    -----------
+    params : :class:`CGParameters` object
+        Parameters of the controller graph
+    starts : array-like
+        Start states
+    goal : array-like
+        Goal state
+    controller : :class:`MDPLocalController` object
+        Local controller for connecting states
+    state_dim : int, optional (default: 3)
+        The dimensional of the state space
+    backend : str, optional (default: 'networkx')
+        Storage of the state graph, either 'networkx' for a
+        :class:`StateGraph` or 'array' for an :class:`ArrayStateGraph`
+    planner : :class:`GraphValueIteration` object, optional (default: None)
+        Planner used while building the graph, value iteration with a
+        discount of 0.9 if None
+    random_state : :class:`numpy.RandomState`, optional (default: None)
+        Random number generation seed control
+    executor : str or object, optional (default: 'serial')
+        How the local controller rollouts of the edges are run, one of:
+            * serial -- in the calling process
+            * thread -- in a pool of threads
+            * process -- in a pool of processes, which requires a picklable
+              controller
+        or any object with a ``map(func, iterable)`` method returning the
+        results in order, e.g. a :mod:`concurrent.futures` executor.
+    n_jobs : int, optional (default: -1)
+        Number of threads or processes of the pool, -1 uses all CPUs
+    chunk_size : int, optional (default: None)
+        Number of (source, target) pairs per task sent to the pool. If None,
+        every worker gets about four tasks per batch of pairs.
+
+    Attributes
+    ------------
+    timings_ : dict
+        Time (in seconds) spent in each phase of the last graph build
+
     """
-    def __init__(self, params, starts, goal, controller, state_dim=3):
+    def __init__(self, params, starts, goal, controller, state_dim=3,
+                 backend='networkx', planner=None, random_state=None,
+                 executor='serial', n_jobs=-1, chunk_size=None):
+        if params is None:
+            params = CGParameters()
         self._params = params
         self._controller = controller
         self._starts = starts
         self._goal = goal
 
         # setup the graph structure and internal variables
-        self._g = StateGraph(state_dim=state_dim)
+        if backend == 'networkx':
+            self._g = StateGraph(state_dim=state_dim)
+        elif backend == 'array':
+            self._g = ArrayStateGraph(state_dim=state_dim)
+        else:
+            raise ValueError('Unknown graph backend: {}'.format(backend))
         self._best_trajs = []
         self._node_id = 0
+        self._n_edges = 0
+        self._R = None
+        self._terminal = None
+        self._plan = None
+
+        if planner is None:
+            planner = GraphValueIteration(discount=0.9)
+        self._planner = planner
+        self._rng = check_random_state(random_state)
+
+        if isinstance(executor, six.string_types) and \
+                executor not in EXECUTORS:
+            raise ValueError('Executor must be one of: {}, or have a map'
+                             ' method'.format(EXECUTORS))
+        if n_jobs == 0 or n_jobs < -1:
+            raise ValueError('No. of jobs must be >= 1, or -1 for all CPUs')
+        if chunk_size is not None and chunk_size < 1:
+            raise ValueError('Chunk size must be >= 1')
+        self._executor = executor
+        self._n_jobs = n_jobs
+        self._chunk_size = chunk_size
+        self._pool = None
         self._max_conc = 1.0
         self._max_es = 1.0
         self._min_es = 0.0
@@ -51,8 +135,10 @@ class ControllerGraph(object):
         Parameters
         -----------
         R : callable
-            Reward function callable to evaluating reward along local
-            controller trajectories
+            Reward function evaluating the reward along local controller
+            trajectories, called as ``R(state, traj)`` with the source state
+            of an edge and its trajectory. The result is the edge reward
+            used for planning.
         terminal : callable
             Function to check is a state is terminal.
         samples : array-like, optional (default: None)
@@ -67,16 +153,82 @@ class ControllerGraph(object):
         # if R.kind == 'Tabular':
         #     raise ValueError('CG only works with feature based rewards')
 
+        self._R = R
+        self._terminal = terminal
         self._g.clear()
+        self._node_id = 0
+        self._n_edges = 0
+        self._plan = None
 
-        # if self._params.init_type == 'random':
-        self._fixed_init(R, terminal, samples)
-        # elif self._params.init_type == 'trajectory':
-        #     self._traj_init(R, terminal, samples)
+        try:
+            # if self._params.init_type == 'random':
+            self._fixed_init(R, terminal, samples)
+            # elif self._params.init_type == 'trajectory':
+            #     self._traj_init(R, terminal, samples)
+        finally:
+            self._close_pool()
 
     def build_graph(self):
-        """ Build the controller graph """
-        pass
+        """ Build the controller graph
+
+        Incremental expansion loop, where every iteration
+
+            1. selects ``n_expand`` nodes to expand, with probability
+               ``p_best`` among the nodes of the current best policies from
+               the starts, otherwise with probability proportional to the
+               node priorities. The priority of an expanded node is divided
+               by ``exp_thresh``, to spread out the expansions.
+            2. samples ``n_new`` candidate states within ``radius`` of each of
+               the selected nodes (and within the extents of the initial
+               nodes), all at once.
+            3. ranks the candidates by the number of nodes already within
+               ``radius`` of them, and adds the ``n_add`` least covered
+               candidates of every selected node to the graph.
+            4. connects the new nodes in both directions to the nodes within
+               ``radius``, found with the spatial index of the graph.
+            5. updates the plan incrementally with the planner, using the
+               edge rewards given by the reward function evaluated along the
+               edge trajectories.
+
+        The loop stops once the graph has ``max_samples`` nodes or
+        ``max_edges`` edges, or when an iteration adds no node. The time
+        spent in every phase is recorded in :attr:`timings_`.
+
+        """
+        if self._R is None:
+            raise RuntimeError('Initialize the state graph before building')
+
+        self.timings_ = OrderedDict((phase, 0.0) for phase in
+                                    ('plan', 'select', 'sample', 'rank',
+                                     'connect'))
+        if self._plan is None:
+            self._plan = self._timed('plan', self._planner.solve, self._g)
+            self._best_trajs = self._best_policies()
+
+        try:
+            self._expand()
+        finally:
+            self._close_pool()
+
+    def _expand(self):
+        """ Run the expansion iterations of :meth:`build_graph` """
+        p = self._params
+        while self._node_id < p.max_samples and self._n_edges < p.max_edges:
+            expand = self._timed('select', self._select_nodes, p.n_expand)
+            if not len(expand):
+                break
+            candidates = self._timed('sample', self._sample_around, expand,
+                                     p.n_new, p.radius)
+            new_nodes = self._timed('rank', self._add_best_candidates,
+                                    candidates, p.n_add, p.radius)
+            if not len(new_nodes):
+                break
+            sources = self._timed('connect', self._connect, new_nodes,
+                                  p.radius)
+
+            self._plan = self._timed('plan', self._planner.replan, self._g,
+                                     self._plan, index=sources)
+            self._best_trajs = self._best_policies()
 
     def states(self):
         """ Return the ids of the states in the CG """
@@ -90,16 +242,236 @@ class ControllerGraph(object):
         """ Get the actions available at state (out-going) edges """
         return self._g.out_edges(state)
 
+    def _select_nodes(self, n_expand):
+        """ Select nodes to expand and lower their priorities """
+        nodes = [n for n in self._g.nodes if not self._terminal(n)]
+        if not nodes:
+            return []
+
+        best = [n for traj in self._best_trajs for n in traj
+                if not self._terminal(n)]
+        if best and self._rng.uniform() < self._params.p_best:
+            expand = self._rng.choice(len(best), size=n_expand)
+            expand = [best[i] for i in expand]
+        else:
+            priority = np.array([self._g.gna(n, 'priority') for n in nodes],
+                                dtype=float)
+            expand = self._rng.choice(len(nodes), size=n_expand,
+                                      p=priority / priority.sum())
+            expand = [nodes[i] for i in expand]
+
+        for n in expand:
+            self._g.sna(n, 'priority', self._g.gna(n, 'priority') /
+                        self._params.exp_thresh)
+        return expand
+
+    def _sample_around(self, nodes, n_new, radius):
+        """ Sample candidates uniformly within radius of the nodes
+
+        Returns an array of shape (len(nodes), n_new, state_dim), with random
+        headings for states with more than two dimensions.
+
+        """
+        data = np.array([self._g.gna(n, 'data') for n in nodes], dtype=float)
+        shape = (len(nodes), n_new)
+        r = radius * np.sqrt(self._rng.uniform(size=shape))
+        angle = self._rng.uniform(-np.pi, np.pi, size=shape)
+
+        candidates = np.repeat(data[:, np.newaxis, :], n_new, axis=1)
+        candidates[..., 0] += r * np.cos(angle)
+        candidates[..., 1] += r * np.sin(angle)
+        if data.shape[1] > 2:
+            candidates[..., 2] = self._rng.uniform(-np.pi, np.pi, size=shape)
+
+        lower, upper = self._extents
+        candidates[..., 0:2] = np.clip(candidates[..., 0:2], lower, upper)
+        return candidates
+
+    def _add_best_candidates(self, candidates, n_add, radius):
+        """ Add the least covered candidates of every expanded node """
+        n_expand, n_new, dim = candidates.shape
+        flat = candidates.reshape(-1, dim)
+        covered = self._g.find_neighbors_data_batch(flat, radius)
+        coverage = np.array([len(c) for c in covered]).reshape(n_expand,
+                                                               n_new)
+        best = np.argsort(coverage, axis=1, kind='mergesort')[:, :n_add]
+
+        new_nodes = []
+        for data in candidates[np.arange(n_expand)[:, np.newaxis], best]\
+                .reshape(-1, dim):
+            if self._node_id >= self._params.max_samples:
+                break
+            self._g.add_node(nid=self._node_id, data=data, cost=-_CMAX,
+                             priority=1, V=_RMAX, pi=0, Q=[], ntype='simple')
+            new_nodes.append(self._node_id)
+            self._node_id += 1
+        return new_nodes
+
+    def _connect(self, nodes, radius):
+        """ Connect nodes to their neighbors within radius, both ways
+
+        Returns the sources of the added edges.
+
+        """
+        data = [self._g.gna(n, 'data') for n in nodes]
+        neighbors = self._g.find_neighbors_data_batch(data, radius)
+        pairs = []
+        for n, near in zip(nodes, neighbors):
+            for m in near:
+                if m == n:
+                    continue
+                if not self._terminal(n) and not self._g.edge_exists(n, m):
+                    pairs.append((n, m))
+                if not self._terminal(m) and not self._g.edge_exists(m, n):
+                    pairs.append((m, n))
+        limit = max(self._params.max_edges - self._n_edges, 0)
+        return self._add_edges(list(OrderedDict.fromkeys(pairs)), limit)
+
+    def _neighbor_pairs(self, nodes, radius, k):
+        """ Ordered pairs of the nodes to their neighbors
+
+        The neighbors of a node are the nodes within `radius` and its `k`
+        nearest nodes, found with the spatial index of the graph. Terminal
+        nodes get no out-going pairs.
+
+        """
+        data = [self._g.gna(n, 'data') for n in nodes]
+        near = self._g.find_neighbors_data_batch(data, radius)
+        nearest = [[]] * len(nodes)
+        if k:
+            nearest = self._g.find_neighbors_k_batch(nodes, k)
+
+        pairs = []
+        for n, within, closest in zip(nodes, near, nearest):
+            if self._terminal(n):
+                continue
+            pairs.extend((n, m) for m in OrderedDict.fromkeys(within +
+                                                              closest)
+                         if m != n)
+        return pairs
+
+    def _prune_long(self, pairs):
+        """ Drop pairs too far apart for trajectories of max_traj_len
+
+        Controllers with a ``resolution`` (distance per way-point at unit
+        speed) cannot connect states closer than that in less way-points
+        than the straight line needs, which bounds the trajectory lengths
+        without running the controller.
+
+        """
+        resolution = getattr(self._controller, 'resolution', None)
+        if resolution is None or not pairs:
+            return pairs
+
+        nodes = list(OrderedDict.fromkeys(n for pair in pairs for n in pair))
+        position = dict((n, i) for i, n in enumerate(nodes))
+        data = np.array([self._g.gna(n, 'data') for n in nodes], dtype=float)
+        idx = np.array([(position[n], position[m]) for n, m in pairs])
+        d = edist(data[idx[:, 0]], data[idx[:, 1]])
+        keep = d / resolution <= self._params.max_traj_len
+        return [pair for pair, k in zip(pairs, keep) if k]
+
+    def _add_edges(self, pairs, limit=None):
+        """ Run the controller on (source, target) node pairs, add edges
+
+        The edge rewards are given by the reward function, evaluated along
+        the trajectories.
+
+        Pairs which would give over-long trajectories are pruned first, and
+        only the first `limit` remaining pairs (all if None) are kept. The
+        trajectories of all the kept pairs are computed before adding the
+        edges. Returns the sources of the added edges.
+
+        """
+        pairs = self._prune_long(pairs)[:limit]
+        data = dict((n, self._g.gna(n, 'data'))
+                    for n in set(n for pair in pairs for n in pair))
+        trajs = self._rollouts([data[n] for n, _ in pairs],
+                               [data[m] for _, m in pairs])
+
+        max_len = self._params.max_traj_len
+        sources = set()
+        for (n, m), traj in zip(pairs, trajs):
+            if traj is None or len(traj) < 1 or len(traj) > max_len:
+                continue
+            d = trajectory_length(traj)
+            r, phi = float(self._R(data[n], traj)), [0, 1, 1]
+            self._g.add_edge(source=n, target=m, reward=r,
+                             duration=d, phi=phi, traj=traj)
+            self._n_edges += 1
+            sources.add(n)
+        return sources
+
+    def _rollouts(self, sources, targets):
+        """ Controller trajectories from sources to targets, in order
+
+        The pairs are split in chunks, which are run with the executor.
+
+        """
+        if self._executor == 'serial' or len(sources) < 2:
+            return _controller_rollouts((self._controller, sources, targets))
+
+        pool = self._get_pool()
+        chunk = self._chunk_size
+        if chunk is None:
+            n_workers = self._n_jobs
+            if n_workers == -1:
+                n_workers = multiprocessing.cpu_count()
+            chunk = max(int(np.ceil(len(sources) / (4 * n_workers))), 1)
+
+        jobs = [(self._controller, sources[i:i + chunk],
+                 targets[i:i + chunk])
+                for i in range(0, len(sources), chunk)]
+        return [traj for trajs in pool.map(_controller_rollouts, jobs)
+                for traj in trajs]
+
+    def _get_pool(self):
+        """ Pool of workers, kept during a graph initialization or build """
+        if not isinstance(self._executor, six.string_types):
+            return self._executor
+        if self._pool is None:
+            n_jobs = self._n_jobs if self._n_jobs > 0 else None
+            if self._executor == 'thread':
+                self._pool = ThreadPool(processes=n_jobs)
+            else:
+                self._pool = multiprocessing.Pool(processes=n_jobs)
+        return self._pool
+
+    def _close_pool(self):
+        if self._pool is not None:
+            self._pool.close()
+            self._pool.join()
+            self._pool = None
+
+    def _best_policies(self):
+        """ Node sequences following the plan from each start """
+        pi = dict(zip(self._plan['nodes'], self._plan['pi']))
+        trajs = []
+        for start in self._start_ids:
+            traj = [start]
+            while pi[traj[-1]] != traj[-1] and pi[traj[-1]] not in traj:
+                traj.append(pi[traj[-1]])
+            trajs.append(traj)
+        return trajs
+
+    def _timed(self, phase, func, *args, **kwargs):
+        t = time.time()
+        result = func(*args, **kwargs)
+        self.timings_[phase] += time.time() - t
+        return result
+
     def _fixed_init(self, R, terminal, samples):
         """ Initialize from random samples """
 
         # CMAX = self._params.max_cost
-        CMAX = 100
-        RMAX = 1
+        CMAX = _CMAX
+        RMAX = _RMAX
 
+        self._start_ids = []
         for start in self._starts:
             self._g.add_node(nid=self._node_id, data=start, cost=0,
                              priority=1, V=RMAX, pi=0, Q=[], ntype='start')
+            self._start_ids.append(self._node_id)
             self._node_id += 1
 
         self._g.add_node(nid=self._node_id, data=self._goal, cost=-CMAX,
@@ -113,24 +485,27 @@ class ControllerGraph(object):
                              priority=1, V=RMAX, pi=0, Q=[], ntype='simple')
             self._node_id += 1
 
-        # add edges between each pair of states
-        for n in self._g.nodes:
-            for m in self._g.nodes:
-                if n == m or terminal(n):
-                    continue
-                ndata, mdata = self._g.gna(n, 'data'), self._g.gna(m, 'data')
-                traj = self._controller.trajectory(ndata, mdata)
-                d = trajectory_length(traj)
-                # r, phi = R(ndata, traj)
-                r, phi = 1, [0, 1, 1]
-                self._g.add_edge(source=n, target=m, reward=r,
-                                 duration=d, phi=phi, traj=traj)
+        # expansions stay within the extents of the initial states
+        data = np.array([self._g.gna(n, 'data') for n in self._g.nodes])
+        self._extents = (data[:, 0:2].min(axis=0), data[:, 0:2].max(axis=0))
+
+        # connect the states to their neighbors
+        nodes = list(self._g.nodes)
+        self._add_edges(self._neighbor_pairs(nodes, self._params.radius,
+                                             self._params.n_neighbors))
 
     def _traj_init(self, R, terminal, trajectories):
         """ Initialize CG using way-point samples from expert trajectories """
         pass
 
 
+def _controller_rollouts(job):
+    """ Run a local controller on a chunk of pairs (pool worker) """
+    controller, sources, targets = job
+    return [controller.trajectory(source, target)
+            for source, target in zip(sources, targets)]
+
+
 class CGParameters(object):
     """ ControllerGraph parameters
 
@@ -150,6 +525,9 @@ class CGParameters(object):
     radius : float
         Radius around a node to sample new nodes from (effectively controls
         the extent of running the local controller)
+    n_neighbors : int
+        Number of nearest nodes connected to every initial node, in addition
+        to the nodes within `radius`
     exp_thresh : float
         Threshold on the value of a node to select it for expansion
     max_traj_len : int
@@ -186,6 +564,7 @@ class CGParameters(object):
         'n_new',
         'n_add',
         'radius',
+        'n_neighbors',
         'exp_thresh',
         'max_traj_len',
         'p_best',
@@ -203,6 +582,7 @@ class CGParameters(object):
         self.n_new = kwargs.pop('n_new', 20)
         self.n_add = kwargs.pop('n_add', 1)
         self.radius = kwargs.pop('radius', 1.8)
+        self.n_neighbors = kwargs.pop('n_neighbors', 8)
         self.exp_thresh = kwargs.pop('exp_thresh', 1.2)
         self.max_traj_len = kwargs.pop('max_traj_len', 500)
         self.p_best = kwargs.pop('p_best', 0.4)
@@ -6,12 +6,17 @@ import warnings
 import pickle
 
 import networkx as nx
+import numpy as np
+import scipy.sparse as sp
 
+from scipy.spatial import cKDTree
 from six.moves import filter
 from numpy import asarray, sqrt
 
+from ..domains.geometry import pairwise_distances
 
-__all__ = ['StateGraph']
+
+__all__ = ['StateGraph', 'ArrayStateGraph']
 
 
 class StateGraph(object):
@@ -36,6 +41,8 @@ class StateGraph(object):
         Attribute types of the edges in the graph
     _state_dim : int
         The dimensional of the state space used in the graph
+    _index : :class:`_NodeIndex` object
+        Spatial index over the node `data`, for neighbor queries
 
     """
 
@@ -48,10 +55,12 @@ class StateGraph(object):
         if state_dim <= 0:
             raise ValueError('State dimension must be greater than 0')
         self._state_dim = state_dim
+        self._index = _NodeIndex()
 
     def clear(self):
         """ Reset the graph """
         self.G.clear()
+        self._index.clear()
 
     def add_node(self, nid, data, cost, priority, Q, V, pi, ntype):
         """ Add a new node to the graph """
@@ -63,6 +72,7 @@ class StateGraph(object):
         if nid not in self.G:
             self.G.add_node(nid, data=data, cost=cost, priority=priority,
                             Q=Q, V=V, pi=pi, type=ntype)
+            self._index.add(nid, data)
         else:
             warnings.warn('Node already exits in the graph, not added')
 
@@ -97,6 +107,7 @@ class StateGraph(object):
     def remove_node(self, node):
         """ Remove a node from the graph """
         self.G.remove_node(node)
+        self._index.remove(node)
 
     def edge_exists(self, source, target):
         """ Check if an edge already exists in the graph """
@@ -126,6 +137,8 @@ class StateGraph(object):
         """
         self._check_node_attributes(node_id, attribute)
         self.G.node[node_id][attribute] = value
+        if attribute == 'data':
+            self._index.add(node_id, value)
 
     def gea(self, source, target, attribute):
         """ Get a single attribute of a single edge """
@@ -157,16 +170,35 @@ class StateGraph(object):
 
         Notes
         ------
-        Includes the query node in the result
+        Includes the query node in the result. Euclidean queries use the
+        spatial index over the nodes, while other metrics scan all nodes.
 
         """
-        m = metric
         if metric is None:
-            m = eud
+            return self._index.query_radius(c, distance)[0]
+
+        nodes = self.nodes
+        data = self._node_data(nodes)
+        return [n for n, d in zip(nodes, data) if metric(d, c) <= distance]
+
+    def find_neighbors_data_batch(self, cs, distance):
+        """ Find node neighbors of many `data` arrays at once
 
-        neighbors = filter(lambda n: m(self.gna(n, 'data'), c) <= distance,
-                           self.G.nodes())
-        return list(neighbors)
+        Parameters
+        -----------
+        cs : array-like, shape = (M, N)
+            `data` arrays to search around
+        distance: float
+            Maximum range for inclusion the returned neighbors lists
+
+        Returns
+        -------
+        neighbors : list of list of int
+            Lists of node ids in the "neighborhood" of each query, using
+            Euclidean distance
+
+        """
+        return self._index.query_radius(cs, distance)
 
     def find_neighbors_range(self, nid, distance):
         """ Find neighboring nodes within a distance
@@ -209,12 +241,28 @@ class StateGraph(object):
             List of node ids in the "neighborhood"
 
         """
-        serch_set = set(self.G.nodes()) - {nid}
         cn = self.gna(nid, 'data')
-        distances = {n: eud(self.gna(n, 'data'), cn) for n in serch_set}
-        sorted_neighbors = sorted(distances.items(), key=lambda x: x[1])
-        k_neighbors = sorted_neighbors[:k]
-        return list(n[0] for n in k_neighbors)
+        return self._index.query_knn(cn, k, exclude=[nid])[0]
+
+    def find_neighbors_k_batch(self, nids, k):
+        """ Find k nearest neighbors of many nodes at once
+
+        Parameters
+        -----------
+        nids : array-like of int
+            Node ids for the query nodes
+        k: int
+            Maximum number of nodes to return per query
+
+        Returns
+        -------
+        neighbors : list of list of int
+            Lists of node ids in the "neighborhood" of each query node,
+            excluding the query node itself
+
+        """
+        nids = list(nids)
+        return self._index.query_knn(self._node_data(nids), k, exclude=nids)
 
     def neighbors(self, nid):
         """ Get the connected node neighbors """
@@ -262,7 +310,59 @@ class StateGraph(object):
         """
         if name not in self._node_attrs:
             raise IndexError('Invalid signal name')
-        return [self.gna(n, name) for n in self.nodes]
+        nodes = self.G.node
+        return [nodes[n][name] for n in self.nodes]
+
+    def set_signal(self, name, values):
+        """ Set a graph signal on all the nodes
+
+        Parameters
+        -----------
+        name : str
+            Name of signal to set
+        values : array-like
+            Values of the signal, in the order of :attr:`nodes`
+
+        """
+        if name not in self._node_attrs:
+            raise IndexError('Invalid signal name')
+        nodes = self.G.node
+        for n, value in zip(self.nodes, values):
+            nodes[n][name] = value
+        if name == 'data':
+            for n in self.nodes:
+                self._index.add(n, nodes[n]['data'])
+
+    def edge_table(self):
+        """ Compressed (CSR) table of the edges, for vectorized sweeps
+
+        Returns
+        --------
+        nodes : list
+            Node ids, giving the node positions used in the table
+        indptr : array-like, shape (N + 1,)
+            The out-going edges of the ``i``-th node are
+            ``indptr[i]:indptr[i + 1]``, in the order of :meth:`out_edges`
+        targets : array-like, shape (E,)
+            Positions of the edge target nodes
+        duration, reward : array-like, shape (E,)
+            Edge attributes
+
+        """
+        nodes = list(self.nodes)
+        position = dict((n, i) for i, n in enumerate(nodes))
+        edges = self.G.edge
+        indptr = np.zeros(len(nodes) + 1, dtype=int)
+        targets, duration, reward = [], [], []
+        for i, n in enumerate(nodes):
+            for m, attrs in edges[n].items():
+                targets.append(position[m])
+                duration.append(attrs['duration'])
+                reward.append(attrs['reward'])
+            indptr[i + 1] = len(targets)
+        return (nodes, indptr, np.asarray(targets, dtype=int),
+                np.asarray(duration, dtype=float),
+                np.asarray(reward, dtype=float))
 
     def save_graph(self, filename):
         """ Save the graph to file """
@@ -274,6 +374,15 @@ class StateGraph(object):
         with open(filename, 'rb') as f:
             self._graph = pickle.load(f)
 
+        self._index.clear()
+        for n, attrs in self._graph.nodes(data=True):
+            self._index.add(n, attrs['data'])
+
+    def _node_data(self, nids):
+        """ The `data` of the given nodes, without attribute checks """
+        nodes = self.G.node
+        return [nodes[n]['data'] for n in nids]
+
     def save_svg(self):
         raise NotImplementedError('Not implemented')
 
@@ -317,5 +426,660 @@ class StateGraph(object):
         return nx.adjacency_matrix(self.G).todense()
 
 
+class ArrayStateGraph(StateGraph):
+    """ State graph stored in NumPy arrays
+
+    Same interface as :class:`StateGraph`, but node attributes are kept in
+    growable columns (one row per node) and edges in a COO table with
+    growable columns for the edge attributes. The trajectories of all edges
+    share one buffer, indexed by per-edge offsets and lengths. Removed nodes
+    and edges are masked out of the tables, and the frames of removed or
+    replaced trajectories are reclaimed when the buffer is compacted.
+
+    Attribute access by id is a dictionary lookup plus an array index, and
+    :meth:`get_signal`, :meth:`set_signal` and :meth:`edge_table` work on
+    whole columns, hence planning over large graphs can be done with
+    vectorized sweeps.
+
+    Parameters
+    -----------
+    state_dim : int
+        The dimensional of the state space used in the graph
+    capacity : int, optional (default: 64)
+        Initial number of rows of the node and edge tables, doubled as
+        needed
+
+    """
+
+    _float_attrs = ('cost', 'priority', 'V')
+    _object_attrs = ('Q', 'type')
+
+    def __init__(self, state_dim, capacity=64):
+        if state_dim <= 0:
+            raise ValueError('State dimension must be greater than 0')
+        self._state_dim = state_dim
+        self._capacity = max(int(capacity), 1)
+        self._index = _NodeIndex()
+        self.clear()
+
+    def clear(self):
+        """ Reset the graph """
+        cap = self._capacity
+
+        # node table, rows in insertion order
+        self._nids = []
+        self._rows = dict()
+        self._n_rows = 0
+        self._node_alive = np.zeros(cap, dtype=bool)
+        self._ncols = dict((attr, np.zeros(cap)) for attr in self._float_attrs)
+        self._ncols['data'] = np.zeros((cap, self._state_dim))
+        self._ncols['pi'] = np.zeros(cap, dtype=int)
+        for attr in self._object_attrs:
+            self._ncols[attr] = np.empty(cap, dtype=object)
+
+        # edge table, with successors per source node for ordered lookups
+        self._succ = dict()
+        self._pred = dict()
+        self._n_edges = 0
+        self._edge_alive = np.zeros(cap, dtype=bool)
+        self._ecols = dict(source=np.zeros(cap, dtype=int),
+                           target=np.zeros(cap, dtype=int),
+                           duration=np.zeros(cap),
+                           reward=np.zeros(cap),
+                           traj_start=np.zeros(cap, dtype=int),
+                           traj_len=np.zeros(cap, dtype=int))
+        self._phi = None
+        self._traj = None
+        self._traj_size = 0
+        self._traj_unused = 0
+        self._table = None
+        self._G = None
+
+        self._index.clear()
+
+    def add_node(self, nid, data, cost, priority, Q, V, pi, ntype):
+        """ Add a new node to the graph """
+        data = asarray(data)
+        if len(data) != self._state_dim:
+            raise ValueError('Expecting a {}-dim state vector for\
+                node'.format(self._state_dim))
+
+        if nid in self._rows:
+            warnings.warn('Node already exits in the graph, not added')
+            return
+
+        if self._n_rows == len(self._node_alive):
+            self._node_alive = _grow(self._node_alive)
+            self._ncols = dict((k, _grow(v)) for k, v in self._ncols.items())
+
+        row = self._n_rows
+        values = dict(data=data, cost=cost, priority=priority, Q=Q, V=V,
+                      pi=pi, type=ntype)
+        for attr, value in values.items():
+            self._ncols[attr][row] = value
+        self._node_alive[row] = True
+        self._rows[nid] = row
+        self._nids.append(nid)
+        self._n_rows += 1
+
+        self._succ[nid] = dict()
+        self._pred[nid] = dict()
+        self._index.add(nid, data)
+        self._table = None
+        self._G = None
+
+    def add_edge(self, source, target, duration, reward, phi, traj):
+        """ Add a new edge into the graph """
+        if duration < 0.0:
+            raise ValueError('Duration arguiment must be positive, >= 0')
+        phi = asarray(phi, dtype=float).ravel()
+        traj = asarray(traj, dtype=float)
+        if traj.ndim != 2:
+            raise ValueError('Expecting a 2-dim dim trajectory')
+
+        if source == target:
+            warnings.warn('source: {} and target: {} nodes are the same'.
+                          format(source, target))
+            return
+        elif self.edge_exists(source, target):
+            warnings.warn('Edge ({}--{}) already exists in the graph'
+                          .format(source, target))
+            return
+
+        # missing end nodes are added, as networkx does
+        for n in (source, target):
+            if n not in self._rows:
+                self.add_node(n, np.zeros(self._state_dim), 0, 0, [], 0, 0,
+                              None)
+
+        if self._phi is None:
+            self._phi = np.zeros((len(self._edge_alive), len(phi)))
+        if len(phi) != self._phi.shape[1]:
+            raise ValueError('Expecting {} edge features'
+                             .format(self._phi.shape[1]))
+        if self._n_edges == len(self._edge_alive):
+            self._edge_alive = _grow(self._edge_alive)
+            self._ecols = dict((k, _grow(v)) for k, v in self._ecols.items())
+            self._phi = _grow(self._phi)
+
+        e = self._n_edges
+        self._ecols['source'][e] = self._rows[source]
+        self._ecols['target'][e] = self._rows[target]
+        self._ecols['duration'][e] = duration
+        self._ecols['reward'][e] = reward
+        self._phi[e] = phi
+        self._set_traj(e, traj)
+        self._edge_alive[e] = True
+        self._succ[source][target] = e
+        self._pred[target][source] = e
+        self._n_edges += 1
+        self._table = None
+        self._G = None
+
+    def remove_edge(self, source, target):
+        """ Remove an edge from the graph """
+        if source == target:
+            warnings.warn('source: {} and target: {} nodes are the same'.
+                          format(source, target))
+        if not self.edge_exists(source, target):
+            raise KeyError('Edge [{}-{}] does not exist in the graph'
+                           .format(source, target))
+
+        e = self._succ[source].pop(target)
+        del self._pred[target][source]
+        self._remove_edges([e])
+
+    def remove_node(self, node):
+        """ Remove a node from the graph """
+        if node not in self._rows:
+            raise KeyError('Node ({}) not in the graph'.format(node))
+
+        self._remove_edges(list(self._succ[node].values()) +
+                           list(self._pred[node].values()))
+        for target in self._succ.pop(node):
+            self._pred[target].pop(node, None)
+        for source in self._pred.pop(node):
+            self._succ[source].pop(node, None)
+
+        self._node_alive[self._rows.pop(node)] = False
+        self._index.remove(node)
+        self._table = None
+        self._G = None
+
+    def edge_exists(self, source, target):
+        """ Check if an edge already exists in the graph """
+        return source in self._succ and target in self._succ[source]
+
+    def gna(self, node_id, attribute):
+        """ Get a single attribute of a single node
+
+        Parameters
+        ------------
+        node_id : int
+        attribute : string
+
+        """
+        self._check_node_attributes(node_id, attribute)
+        value = self._ncols[attribute][self._rows[node_id]]
+        if attribute == 'data':
+            return value.copy()
+        return value
+
+    def sna(self, node_id, attribute, value):
+        """ Set a single attribute of a node
+
+        Parameters
+        ------------
+        node_id : int
+        attribute : string
+        value : any
+
+        """
+        self._check_node_attributes(node_id, attribute)
+        self._ncols[attribute][self._rows[node_id]] = value
+        if attribute == 'data':
+            self._index.add(node_id, value)
+        self._G = None
+
+    def gea(self, source, target, attribute):
+        """ Get a single attribute of a single edge """
+        self._check_edge_attributes(source, target, attribute)
+        e = self._succ[source][target]
+        if attribute == 'source':
+            return source
+        elif attribute == 'target':
+            return target
+        elif attribute == 'phi':
+            return self._phi[e].copy()
+        elif attribute == 'traj':
+            start = self._ecols['traj_start'][e]
+            return self._traj[start:start + self._ecols['traj_len'][e]].copy()
+        return self._ecols[attribute][e]
+
+    def sea(self, source, target, attribute, value):
+        """ Set a single attribute of a edge between source and target """
+        self._check_edge_attributes(source, target, attribute)
+        e = self._succ[source][target]
+        if attribute in ('source', 'target'):
+            raise ValueError('Edge end points cannot be changed')
+        elif attribute == 'phi':
+            self._phi[e] = value
+        elif attribute == 'traj':
+            self._set_traj(e, asarray(value, dtype=float))
+        else:
+            self._ecols[attribute][e] = value
+            self._table = None
+        self._G = None
+
+    def neighbors(self, nid):
+        """ Get the connected node neighbors """
+        return list(self._succ[nid])
+
+    def edges(self, nid):
+        """ Return the edges of a node """
+        return [(nid, m) for m in self._succ[nid]]
+
+    def out_edges(self, nid):
+        """ Return the outgoing edges of a node """
+        return [(nid, m) for m in self._succ[nid]]
+
+    def filter_nodes_by_type(self, ntype):
+        """ Filter nodes by node type """
+        rows = self._alive_rows()
+        types = self._ncols['type'][rows]
+        return [self._nids[r] for r, t in zip(rows, types) if t == ntype]
+
+    def search_path(self, source, target):
+        """ Search for a path from ``source`` to ``target`` using A*"""
+        def metric(a, b):
+            if self.edge_exists(source, target):
+                return -1*self.gea(source, target, 'reward')
+            return 1000
+        return nx.astar_path(self.G, source, target, heuristic=metric)
+
+    def get_signal(self, name):
+        """ Retrieve a graph signal from the nodes
+
+        Parameters
+        -----------
+        name : str
+            Name of signal to retrieve
+
+        Returns
+        -------
+        signal : array-like
+            Array of shape (N,) for cost, priority, V and pi, shape (N, dim)
+            for data, and a list (of lists for Q) otherwise
+
+        """
+        if name not in self._node_attrs:
+            raise IndexError('Invalid signal name')
+        signal = self._ncols[name][self._alive_rows()]
+        if name in self._object_attrs:
+            return list(signal)
+        return signal
+
+    def set_signal(self, name, values):
+        """ Set a graph signal on all the nodes
+
+        Parameters
+        -----------
+        name : str
+            Name of signal to set
+        values : array-like
+            Values of the signal, in the order of :attr:`nodes`
+
+        """
+        if name not in self._node_attrs:
+            raise IndexError('Invalid signal name')
+        rows = self._alive_rows()
+        if name in self._object_attrs:
+            for r, value in zip(rows, values):
+                self._ncols[name][r] = value
+        else:
+            self._ncols[name][rows] = values
+        if name == 'data':
+            for r in rows:
+                self._index.add(self._nids[r], self._ncols['data'][r])
+        self._G = None
+
+    def edge_table(self):
+        """ Compressed (CSR) table of the edges, for vectorized sweeps
+
+        See :meth:`StateGraph.edge_table`. The table is cached until the
+        graph structure or the edge duration and reward change.
+
+        """
+        if self._table is None:
+            rows = self._alive_rows()
+            position = np.full(self._n_rows, -1, dtype=int)
+            position[rows] = np.arange(len(rows))
+
+            edges = np.flatnonzero(self._edge_alive[:self._n_edges])
+            sources = position[self._ecols['source'][edges]]
+            order = np.argsort(sources, kind='mergesort')
+            edges = edges[order]
+
+            indptr = np.zeros(len(rows) + 1, dtype=int)
+            indptr[1:] = np.cumsum(np.bincount(sources, minlength=len(rows)))
+            self._table = ([self._nids[r] for r in rows], indptr,
+                           position[self._ecols['target'][edges]],
+                           self._ecols['duration'][edges],
+                           self._ecols['reward'][edges])
+        return self._table
+
+    def save_graph(self, filename):
+        """ Save the graph to file """
+        state = dict((k, v) for k, v in self.__dict__.items()
+                     if k not in ('_index', '_table', '_G'))
+        with open(filename, 'wb') as f:
+            pickle.dump(state, f)
+
+    def load_graph(self, filename):
+        """ Load a graph from file """
+        with open(filename, 'rb') as f:
+            self.__dict__.update(pickle.load(f))
+
+        self._table = None
+        self._G = None
+        self._index.clear()
+        for r in self._alive_rows():
+            self._index.add(self._nids[r], self._ncols['data'][r])
+
+    def _set_traj(self, e, traj):
+        """ Store the trajectory of edge ``e`` in the shared buffer
+
+        A trajectory is written in place of the previous one of the edge if
+        it fits, otherwise it is appended and the old frames become unused.
+        Unused frames are dropped by compacting the buffer before it grows.
+
+        """
+        if self._traj is None:
+            self._traj = np.zeros((max(len(traj), self._capacity),
+                                   traj.shape[1]))
+        if traj.shape[1] != self._traj.shape[1]:
+            raise ValueError('Expecting {}-dim trajectory frames'
+                             .format(self._traj.shape[1]))
+
+        old_len = self._ecols['traj_len'][e]
+        if len(traj) <= old_len:
+            start = self._ecols['traj_start'][e]
+            self._traj[start:start + len(traj)] = traj
+            self._ecols['traj_len'][e] = len(traj)
+            self._traj_unused += old_len - len(traj)
+            return
+
+        self._ecols['traj_len'][e] = 0
+        self._traj_unused += old_len
+        if self._traj_size + len(traj) > len(self._traj) and \
+                2 * self._traj_unused >= self._traj_size:
+            self._compact_traj()
+        while self._traj_size + len(traj) > len(self._traj):
+            self._traj = _grow(self._traj)
+
+        self._traj[self._traj_size:self._traj_size + len(traj)] = traj
+        self._ecols['traj_start'][e] = self._traj_size
+        self._ecols['traj_len'][e] = len(traj)
+        self._traj_size += len(traj)
+
+    def _compact_traj(self):
+        """ Move the trajectories of the edges to the front of the buffer """
+        edges = np.flatnonzero(self._edge_alive[:self._n_edges])
+        starts = self._ecols['traj_start'][edges]
+        lengths = self._ecols['traj_len'][edges]
+        offsets = np.zeros(len(edges), dtype=int)
+        offsets[1:] = np.cumsum(lengths)[:-1]
+        frames = np.repeat(starts - offsets, lengths) + \
+            np.arange(lengths.sum())
+
+        self._traj[:len(frames)] = self._traj[frames]
+        self._ecols['traj_start'][edges] = offsets
+        self._traj_size = len(frames)
+        self._traj_unused = 0
+
+    def _remove_edges(self, edges):
+        """ Mask out edges, their trajectory frames become unused """
+        for e in edges:
+            self._edge_alive[e] = False
+            self._traj_unused += self._ecols['traj_len'][e]
+            self._ecols['traj_len'][e] = 0
+        self._table = None
+        self._G = None
+
+    def _alive_rows(self):
+        return np.flatnonzero(self._node_alive[:self._n_rows])
+
+    def _node_data(self, nids):
+        """ The `data` of the given nodes, without attribute checks """
+        rows = [self._rows[n] for n in nids]
+        return self._ncols['data'][rows]
+
+    def _check_node_attributes(self, node_id, attribute):
+        assert attribute in self._node_attrs,\
+            'Attribute [{}] is invalid | Expected:{}'\
+            .format(attribute, self._node_attrs)
+        assert node_id in self._rows, \
+            'Node ({}) not in the graph'.format(node_id)
+
+    def _check_edge_attributes(self, source, target, attribute):
+        assert attribute in self._edge_attrs, \
+            'Attribute [{}] is invalid | Expected:{}'\
+            .format(attribute, self._edge_attrs)
+        assert self.edge_exists(source, target),\
+            'Edge [{}-{}] does not exist in the graph'.format(source, target)
+
+    @property
+    def G(self):
+        """ A :class:`networkx.DiGraph` copy of the graph
+
+        The copy is cached until the graph changes.
+
+        """
+        if self._G is None:
+            graph = nx.DiGraph()
+            for n, attrs in self.nodes_data:
+                graph.add_node(n, **attrs)
+            for n, m in self.all_edges:
+                graph.add_edge(n, m, **dict((attr, self.gea(n, m, attr))
+                                            for attr in self._edge_attrs[2:]))
+            self._G = graph
+        return self._G
+
+    @property
+    def nodes(self):
+        return [self._nids[r] for r in self._alive_rows()]
+
+    @property
+    def nodes_data(self):
+        return [(n, dict((attr, self.gna(n, attr))
+                         for attr in self._node_attrs))
+                for n in self.nodes]
+
+    @property
+    def all_edges(self):
+        return [(n, m) for n in self.nodes for m in self._succ[n]]
+
+    @property
+    def transition_matrix(self):
+        """ Get the transition matrix T(s, a, s')
+
+        Obtained from the adjacency matrix of the graph
+
+        """
+        nodes, indptr, targets, _, _ = self.edge_table()
+        adjacency = sp.csr_matrix((np.ones(len(targets)), targets, indptr),
+                                  shape=(len(nodes), len(nodes)))
+        return adjacency.todense()
+
+
 def eud(data1, data2):
     return sqrt((data1[0]-data2[0])**2 + (data1[1]-data2[1])**2)
+
+
+class _NodeIndex(object):
+    """ Spatial index over the 2D positions of the graph nodes
+
+    Positions are kept in a growable array, appended as nodes are added or
+    moved. A :class:`scipy.spatial.cKDTree` covers a prefix of the array, the
+    few positions added after the last rebuild are scanned directly, and
+    removed nodes are masked out. The tree is rebuilt (and removed positions
+    dropped) once the pending or removed positions exceed a fraction of the
+    indexed nodes, hence queries take logarithmic time amortized over
+    incremental graph updates. Results follow the order in which the nodes
+    were first added, as the graph lists them.
+
+    Parameters
+    -----------
+    rebuild_ratio : float, optional (default: 0.25)
+        Fraction of pending or removed positions triggering a rebuild
+    min_rebuild : int, optional (default: 64)
+        Minimum number of pending positions triggering a rebuild
+
+    """
+
+    def __init__(self, rebuild_ratio=0.25, min_rebuild=64):
+        self._rebuild_ratio = rebuild_ratio
+        self._min_rebuild = min_rebuild
+        self.clear()
+
+    def clear(self):
+        """ Drop all positions """
+        self._ids = []
+        self._pos = dict()
+        self._points = np.empty((16, 2))
+        self._alive = np.zeros(16, dtype=bool)
+        self._seq = np.zeros(16, dtype=int)
+        self._n_added = 0
+        self._size = 0
+        self._n_dead = 0
+        self._tree = None
+        self._n_tree = 0
+
+    def __len__(self):
+        return self._size - self._n_dead
+
+    def add(self, nid, data):
+        """ Index the position of a node, moving it if already indexed """
+        # moved nodes keep their place in the insertion order
+        seq = self._n_added
+        if nid in self._pos:
+            seq = self._seq[self._pos[nid]]
+            self.remove(nid)
+        else:
+            self._n_added += 1
+
+        if self._size == len(self._points):
+            self._points = np.resize(self._points, (2 * self._size, 2))
+            self._seq = np.resize(self._seq, 2 * self._size)
+            alive = np.zeros(2 * self._size, dtype=bool)
+            alive[:self._size] = self._alive
+            self._alive = alive
+
+        self._points[self._size] = np.asarray(data, dtype=float)[0:2]
+        self._seq[self._size] = seq
+        self._alive[self._size] = True
+        self._pos[nid] = self._size
+        self._ids.append(nid)
+        self._size += 1
+
+        n_pending = self._size - self._n_tree
+        if n_pending > max(self._min_rebuild,
+                           self._rebuild_ratio * self._n_tree):
+            self._rebuild()
+
+    def remove(self, nid):
+        """ Drop the position of a node, if indexed """
+        pos = self._pos.pop(nid, None)
+        if pos is None:
+            return
+        self._alive[pos] = False
+        self._n_dead += 1
+        if self._n_dead > self._rebuild_ratio * self._size:
+            self._rebuild()
+
+    def query_radius(self, points, distance):
+        """ Ids of the nodes within ``distance`` of each of the points
+
+        Returns a list (one per point) of node ids in insertion order
+
+        """
+        points = self._as_points(points)
+        hits = [[] for _ in range(len(points))]
+        if self._tree is not None:
+            hits = self._tree.query_ball_point(points, distance)
+
+        pending = self._points[self._n_tree:self._size]
+        if len(pending):
+            near = pairwise_distances(points, pending) <= distance
+        neighbors = []
+        for i in range(len(points)):
+            pos = np.asarray(hits[i], dtype=int)
+            if len(pending):
+                pos = np.concatenate((pos, np.flatnonzero(near[i]) +
+                                      self._n_tree))
+            pos = pos[self._alive[pos]]
+            pos = pos[np.argsort(self._seq[pos])]
+            neighbors.append([self._ids[p] for p in pos])
+        return neighbors
+
+    def query_knn(self, points, k, exclude=None):
+        """ Ids of the ``k`` nearest nodes to each of the points
+
+        Returns a list (one per point) of node ids sorted by distance, with
+        the nodes in ``exclude`` (one id or None per point) left out.
+
+        """
+        points = self._as_points(points)
+        if exclude is None:
+            exclude = [None] * len(points)
+
+        n_query = min(k + 1 + self._n_dead, self._n_tree)
+        if self._tree is not None and n_query > 0:
+            dists, hits = self._tree.query(points, n_query)
+            dists = dists.reshape(len(points), n_query)
+            hits = hits.reshape(len(points), n_query)
+        else:
+            dists = hits = np.empty((len(points), 0))
+
+        pending = self._points[self._n_tree:self._size]
+        p_pos = np.arange(self._n_tree, self._size)
+        p_dists = pairwise_distances(points, pending)
+        neighbors = []
+        for i in range(len(points)):
+            valid = np.isfinite(dists[i])
+            pos = np.concatenate((hits[i][valid].astype(int), p_pos))
+            d = np.concatenate((dists[i][valid], p_dists[i]))
+            keep = self._alive[pos]
+            if exclude[i] in self._pos:
+                keep &= pos != self._pos[exclude[i]]
+            pos, d = pos[keep], d[keep]
+            order = np.lexsort((self._seq[pos], d))[:k]
+            neighbors.append([self._ids[p] for p in pos[order]])
+        return neighbors
+
+    def _rebuild(self):
+        """ Drop removed positions and rebuild the tree over all others """
+        alive = np.flatnonzero(self._alive[:self._size])
+        self._ids = [self._ids[p] for p in alive]
+        self._pos = dict((nid, p) for p, nid in enumerate(self._ids))
+        self._points[:len(alive)] = self._points[alive]
+        self._seq[:len(alive)] = self._seq[alive]
+        self._alive[:] = False
+        self._alive[:len(alive)] = True
+        self._size = len(alive)
+        self._n_dead = 0
+
+        self._n_tree = self._size
+        self._tree = None
+        if self._size:
+            self._tree = cKDTree(self._points[:self._size])
+
+    def _as_points(self, points):
+        return np.atleast_2d(np.asarray(points, dtype=float))[:, 0:2]
+
+
+def _grow(array):
+    """ Copy of an array with twice the number of rows """
+    grown = np.zeros((2 * len(array),) + array.shape[1:], dtype=array.dtype)
+    grown[:len(array)] = array
+    return grown
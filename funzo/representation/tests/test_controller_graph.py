@@ -0,0 +1,120 @@
+
+import numpy as np
+
+from nose.tools import assert_equal
+from numpy.testing import assert_array_equal, assert_allclose
+
+from funzo.representation.controller_graph import ControllerGraph
+from funzo.representation.controller_graph import CGParameters
+
+
+class _LineController(object):
+    """ Straight line local controller with 0.1 spaced way-points """
+
+    def trajectory(self, source, target, **kwargs):
+        n = max(int(np.hypot(*(np.subtract(target, source)[:2])) / 0.1), 1)
+        t = np.linspace(0.0, 1.0, n + 1)[:, np.newaxis]
+        return (1 - t) * np.asarray(source) + t * np.asarray(target)
+
+
+def _controller_graph(backend, **kwargs):
+    params = CGParameters(**kwargs)
+    cg = ControllerGraph(params, starts=[(1, 1, 0)], goal=(6, 6, 0),
+                         controller=_LineController(), backend=backend,
+                         random_state=0)
+    cg.initialize_state_graph(lambda s, a: 0.0, lambda n: n == 1,
+                              samples=[(1, 6, 0), (6, 1, 0)])
+    return cg
+
+
+def test_build_graph():
+    for backend in ('networkx', 'array'):
+        cg = _controller_graph(backend, max_samples=40, max_edges=2000,
+                               n_expand=2, radius=1.5)
+        cg.build_graph()
+        g = cg._g
+
+        assert_equal(len(cg.states()), 40)
+        assert_equal(list(cg.timings_), ['plan', 'select', 'sample', 'rank',
+                                         'connect'])
+        data = np.array(g.get_signal('data'))
+        assert np.all(data[:, 0:2] >= 1) and np.all(data[:, 0:2] <= 6)
+
+        # the goal is absorbing, expanded nodes connect within the radius
+        assert_equal(list(g.out_edges(1)), [])
+        for n, m in cg.all_actions():
+            if n > 3 or m > 3:
+                assert np.hypot(*(g.gna(n, 'data') - g.gna(m, 'data'))[:2])\
+                    <= 1.5
+        assert (0, g.gna(0, 'pi')) in list(g.out_edges(0))
+
+
+def test_edge_rewards():
+    def reward(state, traj):
+        return -np.hypot(*(traj[-1] - state)[:2])
+
+    cg = ControllerGraph(CGParameters(radius=3.0, max_samples=10),
+                         starts=[(1, 1, 0)], goal=(6, 6, 0),
+                         controller=_LineController(), random_state=0)
+    cg.initialize_state_graph(reward, lambda n: n == 1,
+                              samples=[(1, 4, 0), (4, 4, 0), (4, 1, 0)])
+    cg.build_graph()
+    g = cg._g
+
+    for n, m in cg.all_actions():
+        assert_allclose(g.gea(n, m, 'reward'),
+                        reward(g.gna(n, 'data'), g.gea(n, m, 'traj')))
+    # the best policy from the start reaches the goal
+    assert_equal(cg._best_trajs[0][-1], 1)
+
+
+def test_build_graph_max_edges():
+    cg = _controller_graph('array', max_samples=1000, max_edges=100,
+                           radius=2.0)
+    cg.build_graph()
+    assert_equal(len(cg.all_actions()), 100)
+
+
+def test_fixed_init_neighbors():
+    rng = np.random.RandomState(1)
+    samples = np.column_stack((rng.uniform(0, 10, size=(60, 2)),
+                               np.zeros(60)))
+    controller = _LineController()
+    controller.resolution = 0.1
+    cg = ControllerGraph(CGParameters(radius=1.5, n_neighbors=3,
+                                      max_traj_len=40),
+                         starts=[(1, 1, 0)], goal=(6, 6, 0),
+                         controller=controller, backend='array')
+    cg.initialize_state_graph(lambda s, a: 0.0, lambda n: n == 1, samples)
+    g = cg._g
+
+    for n in g.nodes:
+        targets = [m for _, m in g.out_edges(n)]
+        if n == 1:
+            assert_equal(targets, [])
+            continue
+        near = set(g.find_neighbors_range(n, 1.5)) | \
+            set(g.find_neighbors_k(n, 3))
+        # pairs beyond max_traj_len * resolution are pruned
+        near = set(m for m in near if m != n and np.hypot(
+            *(g.gna(n, 'data') - g.gna(m, 'data'))[:2]) <= 4.0)
+        assert_equal(set(targets), near)
+
+
+def test_rollout_executors():
+    samples = np.random.RandomState(2).uniform(0, 6, size=(20, 3))
+    trajs = []
+    for executor in ('serial', 'thread', 'process'):
+        cg = ControllerGraph(CGParameters(radius=3.0), starts=[(1, 1, 0)],
+                             goal=(6, 6, 0), controller=_LineController(),
+                             executor=executor, n_jobs=2, chunk_size=3)
+        cg.initialize_state_graph(lambda s, a: 0.0, lambda n: n == 1,
+                                  samples)
+        trajs.append([(e, cg._g.gea(e[0], e[1], 'traj'))
+                      for e in cg.all_actions()])
+        assert cg._pool is None
+
+    for other in trajs[1:]:
+        assert_equal([e for e, _ in other], [e for e, _ in trajs[0]])
+        for (_, a), (_, b) in zip(other, trajs[0]):
+            assert_array_equal(a, b)
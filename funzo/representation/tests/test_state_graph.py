@@ -0,0 +1,122 @@
+
+import numpy as np
+
+from nose.tools import assert_equal
+from numpy.testing import assert_array_equal
+
+from funzo.representation.state_graph import StateGraph, ArrayStateGraph, eud
+
+
+def _make_graph(points):
+    g = StateGraph(state_dim=3)
+    for i, p in enumerate(points):
+        g.add_node(nid=i, data=p, cost=0, priority=1, Q=[], V=1, pi=0,
+                   ntype='simple')
+    return g
+
+
+def test_find_neighbors():
+    rng = np.random.RandomState(42)
+    g = _make_graph(rng.uniform(0, 10, size=(300, 3)))
+    for n in range(0, 300, 7):
+        g.remove_node(n)
+    g.sna(1, 'data', np.array([5.0, 5.0, 0.0]))
+
+    def brute_range(c, r):
+        return [n for n in g.nodes if eud(g.gna(n, 'data'), c) <= r]
+
+    def brute_k(nid, k):
+        c = g.gna(nid, 'data')
+        d = sorted((eud(g.gna(n, 'data'), c), n) for n in g.nodes if n != nid)
+        return [n for _, n in d[:k]]
+
+    queries = list(g.nodes)[:20]
+    for n in queries:
+        assert_equal(g.find_neighbors_range(n, 1.5),
+                     brute_range(g.gna(n, 'data'), 1.5))
+        assert_equal(g.find_neighbors_k(n, 5), brute_k(n, 5))
+
+    assert_equal(g.find_neighbors_k_batch(queries, 5),
+                 [brute_k(n, 5) for n in queries])
+    assert_equal(g.find_neighbors_data_batch([[5, 5], [0, 0]], 1.0),
+                 [brute_range([5, 5], 1.0), brute_range([0, 0], 1.0)])
+    assert 1 in g.find_neighbors_data([5, 5], 0.1)
+    assert_equal(g.find_neighbors_data([5, 5], 1.0, metric=eud),
+                 brute_range([5, 5], 1.0))
+
+    g.clear()
+    assert_equal(g.find_neighbors_data([5, 5], 1.0), [])
+
+
+def _build(graph, rng):
+    points = rng.uniform(0, 10, size=(30, 3))
+    for i, p in enumerate(points):
+        graph.add_node(nid=i, data=p, cost=0, priority=1, Q=[], V=1, pi=0,
+                       ntype='goal' if i == 3 else 'simple')
+    for i, j in rng.randint(0, 30, size=(120, 2)):
+        if i != j and not graph.edge_exists(i, j):
+            traj = rng.uniform(size=(rng.randint(1, 5), 3))
+            graph.add_edge(source=i, target=j, duration=rng.uniform(),
+                           reward=rng.uniform(), phi=[0, 1, i], traj=traj)
+    graph.remove_node(7)
+    graph.remove_edge(*list(graph.all_edges)[4])
+    graph.sna(2, 'V', 5.0)
+    graph.sea(*(list(graph.all_edges)[0] + ('reward', -1.0)))
+    return graph
+
+
+def test_array_state_graph():
+    g = _build(StateGraph(state_dim=3), np.random.RandomState(0))
+    a = _build(ArrayStateGraph(state_dim=3, capacity=4),
+               np.random.RandomState(0))
+
+    assert_equal(a.nodes, list(g.nodes))
+    assert_equal(a.all_edges, list(g.all_edges))
+    assert_equal(a.filter_nodes_by_type('goal'), [3])
+    for n in a.nodes:
+        assert_equal(a.out_edges(n), list(g.out_edges(n)))
+        assert_array_equal(a.gna(n, 'data'), g.gna(n, 'data'))
+        assert_equal(a.find_neighbors_k(n, 3), g.find_neighbors_k(n, 3))
+    for n, m in a.all_edges:
+        for attr in ('duration', 'reward', 'phi', 'traj'):
+            assert_array_equal(a.gea(n, m, attr), g.gea(n, m, attr))
+
+    for name in ('V', 'cost', 'data'):
+        assert_array_equal(a.get_signal(name), g.get_signal(name))
+    for ta, tg in zip(a.edge_table(), g.edge_table()):
+        assert_array_equal(ta, tg)
+    assert_array_equal(a.transition_matrix, g.transition_matrix)
+
+    a.set_signal('V', np.arange(len(a.nodes)))
+    assert_equal(a.gna(2, 'V'), 2)
+    a.set_signal('Q', [[1.0]] * len(a.nodes))
+    assert_equal(a.gna(29, 'Q'), [1.0])
+
+
+def test_array_state_graph_updates():
+    rng = np.random.RandomState(1)
+    g = _build(StateGraph(state_dim=3), rng)
+    a = _build(ArrayStateGraph(state_dim=3), np.random.RandomState(1))
+
+    # replaced and removed trajectories do not grow the buffer without bound
+    edges = list(a.all_edges)
+    for i in range(200):
+        n, m = edges[i % len(edges)]
+        traj = rng.uniform(size=(rng.randint(1, 8), 3))
+        a.sea(n, m, 'traj', traj)
+        g.sea(n, m, 'traj', traj)
+    a.remove_node(5)
+    g.remove_node(5)
+    assert len(a._traj) <= 1024
+    for n, m in a.all_edges:
+        assert_array_equal(a.gea(n, m, 'traj'), g.gea(n, m, 'traj'))
+
+    # the networkx copy is cached until the graph changes
+    G = a.G
+    assert a.G is G
+    assert_equal(sorted(G.nodes()), sorted(a.nodes))
+    a.sna(2, 'V', 3.0)
+    assert a.G is not G
+    assert_equal(a.G.node[2]['V'], 3.0)
+    a.remove_edge(*a.all_edges[0])
+    assert_equal(a.G.number_of_edges(), len(a.all_edges))
@@ -1,11 +1,11 @@
 
-from .data_structures import Trace
+from .data_structures import Trace, DemonstrationSet
 
 from .validation import check_random_state
 
 
 __all__ = [
-    'Trace',
+    'Trace', 'DemonstrationSet',
     #
     'check_random_state',
     #
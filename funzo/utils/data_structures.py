@@ -6,8 +6,11 @@ from __future__ import division, absolute_import
 
 import os
 import time
+import numbers
 import warnings
 
+import numpy as np
+
 try:
     import h5py
 except ImportError:
@@ -140,6 +143,208 @@ class Trace(object):
         return key in self._vars if self._vars is not None else False
 
 
+class DemonstrationSet(object):
+
+    """ Packed set of demonstration trajectories
+
+    Stores trajectories of (state, action) pairs as contiguous integer
+    arrays of states and actions, together with an array of offsets
+    delimiting the trajectories, i.e. trajectory `i` spans the pairs in
+    ``[offsets[i], offsets[i + 1])``. This avoids keeping one Python tuple
+    per pair for large expert datasets and allows loading them from disk
+    using memory maps.
+
+    Iterating over the set (or indexing it with an integer) gives each
+    trajectory as an array of shape (H, 2) of (state, action) rows, so it
+    can be used wherever a list of trajectories is expected. Slices and
+    integer arrays give new sets sharing the data where possible.
+
+    Parameters
+    -----------
+    states : array-like
+        State ids of all the pairs, concatenated over trajectories
+    actions : array-like
+        Action ids of all the pairs, concatenated over trajectories
+    offsets : array-like
+        Start of every trajectory in the flat arrays, followed by the total
+        number of pairs
+
+    Attributes
+    ------------
+    states : array-like
+        Flat int32 array of state ids
+    actions : array-like
+        Flat int32 array of action ids
+    offsets : array-like
+        int64 array of trajectory offsets, of size ``len(self) + 1``
+
+    """
+
+    _arrays = ('states', 'actions', 'offsets')
+
+    def __init__(self, states, actions, offsets):
+        self.states = _as_array(states, np.int32)
+        self.actions = _as_array(actions, np.int32)
+        self.offsets = _as_array(offsets, np.int64)
+
+        if self.states.shape != self.actions.shape or self.states.ndim != 1:
+            raise ValueError('*states* and *actions* must be 1D arrays of the'
+                             ' same size')
+        if len(self.offsets) < 1 or self.offsets[0] != 0 or\
+                self.offsets[-1] != len(self.states):
+            raise ValueError('*offsets* must start at 0 and end at the number'
+                             ' of (state, action) pairs')
+
+    @classmethod
+    def from_trajectories(cls, trajectories):
+        """ Pack a sequence of trajectories of (state, action) pairs """
+        if isinstance(trajectories, cls):
+            return trajectories
+        lengths = [len(traj) for traj in trajectories]
+        offsets = np.zeros(len(lengths) + 1, dtype=np.int64)
+        offsets[1:] = np.cumsum(lengths)
+        pairs = np.array([sa for traj in trajectories for sa in traj],
+                         dtype=np.int32).reshape(-1, 2)
+        return cls(pairs[:, 0], pairs[:, 1], offsets)
+
+    def pack(self):
+        """ Get the flat (states, actions, offsets) arrays """
+        return self.states, self.actions, self.offsets
+
+    @property
+    def lengths(self):
+        """ Number of (state, action) pairs of every trajectory """
+        return np.diff(self.offsets)
+
+    @property
+    def n_pairs(self):
+        """ Total number of (state, action) pairs """
+        return len(self.states)
+
+    def visitation_counts(self, n_states=None):
+        """ Number of visits of every state over all trajectories
+
+        Parameters
+        -----------
+        n_states : int, optional (default: None)
+            Size of the state space, defaults to the largest visited state
+            id plus one
+
+        """
+        return np.bincount(self.states, minlength=n_states or 0)
+
+    def save(self, filename):
+        """ Save the demonstrations to file
+
+        If `filename` ends with ``.h5`` or ``.hdf5`` the arrays are saved as
+        datasets of an HDF5 file, otherwise as ``.npy`` files in a directory
+        called `filename`.
+
+        """
+        if _is_hdf5(filename):
+            with h5py.File(filename, mode='w') as f:
+                for name in self._arrays:
+                    f[name] = getattr(self, name)
+        else:
+            if not os.path.isdir(filename):
+                os.makedirs(filename)
+            for name in self._arrays:
+                np.save(os.path.join(filename, name + '.npy'),
+                        getattr(self, name))
+        return filename
+
+    @classmethod
+    def load(cls, filename, mmap=True):
+        """ Load demonstrations saved using :meth:`save`
+
+        Parameters
+        -----------
+        filename : str
+            HDF5 file or directory of ``.npy`` files
+        mmap : bool, optional (default: True)
+            Memory-map the arrays instead of reading them into memory. For
+            HDF5 this is only possible for contiguous (not chunked or
+            compressed) datasets, others are read into memory.
+
+        """
+        if _is_hdf5(filename):
+            arrays = dict()
+            with h5py.File(filename, mode='r') as f:
+                for name in cls._arrays:
+                    arrays[name] = _read_dataset(filename, f[name], mmap)
+            return cls(**arrays)
+
+        mode = 'r' if mmap else None
+        arrays = dict((name, np.load(os.path.join(filename, name + '.npy'),
+                                     mmap_mode=mode))
+                      for name in cls._arrays)
+        return cls(**arrays)
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+    def __getitem__(self, item):
+        if isinstance(item, (numbers.Integral, np.integer)):
+            if item < 0:
+                item += len(self)
+            if not 0 <= item < len(self):
+                raise IndexError('Trajectory index out of range')
+            lo, hi = self.offsets[item], self.offsets[item + 1]
+            return np.column_stack((self.states[lo:hi], self.actions[lo:hi]))
+
+        if isinstance(item, slice):
+            start, stop, step = item.indices(len(self))
+            if step == 1:
+                stop = max(start, stop)
+                lo, hi = self.offsets[start], self.offsets[stop]
+                return DemonstrationSet(self.states[lo:hi],
+                                        self.actions[lo:hi],
+                                        self.offsets[start:stop + 1] - lo)
+            item = np.arange(start, stop, step)
+
+        index = np.asarray(item)
+        if index.dtype == bool:
+            index = np.flatnonzero(index)
+        elif index.size == 0:
+            index = np.zeros(0, dtype=np.intp)
+        lengths = self.lengths[index]
+        offsets = np.zeros(len(index) + 1, dtype=np.int64)
+        offsets[1:] = np.cumsum(lengths)
+        pairs = np.concatenate([np.arange(self.offsets[i], self.offsets[i + 1])
+                                for i in index] + [np.zeros(0, dtype=int)])
+        return DemonstrationSet(self.states[pairs], self.actions[pairs],
+                                offsets)
+
+    def __repr__(self):
+        return 'DemonstrationSet(trajectories={}, pairs={})'.format(
+            len(self), self.n_pairs)
+
+
+def _as_array(x, dtype):
+    """ Use `x` as an array of `dtype`, without copying when possible """
+    x = np.asanyarray(x)
+    if x.dtype != dtype:
+        x = x.astype(dtype)
+    return x
+
+
+def _is_hdf5(filename):
+    return os.path.splitext(filename)[1].lower() in ('.h5', '.hdf5')
+
+
+def _read_dataset(filename, dataset, mmap):
+    """ Read an HDF5 dataset, memory-mapped if it is stored contiguously """
+    offset = dataset.id.get_offset() if mmap else None
+    if offset is None:
+        return dataset[...]
+    return np.memmap(filename, mode='r', dtype=dataset.dtype,
+                     shape=dataset.shape, offset=offset)
+
+
 def time_string():
     """ Get a formatted string representation of the current time """
     return time.strftime("%d-%m-%Y_%H:%M:%S")
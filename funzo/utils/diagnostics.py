@@ -1,4 +1,4 @@
-
+from __future__ import division
 
 import numpy as np
 
@@ -29,6 +29,36 @@ def geweke_test(trace, intervals=20, length=200, first=20):
     return z
 
 
+def gelman_rubin(chains):
+    """ Potential scale reduction factor (R-hat) of several MCMC chains
+
+    Parameters
+    -----------
+    chains : array-like, shape (n_chains, n_samples[, n_variables])
+        Samples of independent chains, after discarding burn in
+
+    Returns
+    --------
+    r_hat : float or array-like, shape (n_variables,)
+        Ratio of the pooled to the within chain variance estimate, close to
+        1 for converged chains
+
+    """
+    chains = np.asarray(chains, dtype=float)
+    if chains.ndim < 2 or chains.shape[0] < 2 or chains.shape[1] < 2:
+        raise ValueError('R-hat requires at least two chains of two samples')
+    n = chains.shape[1]
+
+    W = np.mean(np.var(chains, axis=1, ddof=1), axis=0)
+    B_n = np.var(np.mean(chains, axis=1), axis=0, ddof=1)
+    var_hat = (n - 1) / n * W + B_n
+    with np.errstate(divide='ignore', invalid='ignore'):
+        r_hat = np.sqrt(var_hat / W)
+    # constant chains: converged if they agree, otherwise not
+    r_hat = np.where(W > 0, r_hat, np.where(B_n > 0, np.inf, 1.0))
+    return r_hat if r_hat.ndim else float(r_hat)
+
+
 def plot_geweke_test(trace, intervals=20, length=200, first=20, **metadata):
     """
     Plot the the nature of the Geweke test for MCMC convergence
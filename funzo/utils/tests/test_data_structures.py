@@ -1,13 +1,14 @@
 
 import h5py
 import os
+import shutil
 
 import numpy as np
 
 from nose.tools import assert_raises, assert_is_instance
 from numpy.testing import assert_equal
 
-from funzo.utils.data_structures import Trace
+from funzo.utils.data_structures import Trace, DemonstrationSet
 
 
 def test_trace_init():
@@ -98,3 +99,61 @@ def test_trace_membership():
     assert 'r' in t
     assert 'x' not in t
     assert 10 not in t
+
+
+def _toy_trajectories():
+    return [[(0, 1), (2, 0), (3, 3)], [], [(1, 1)], [(4, 2), (4, 2)]]
+
+
+def test_demonstration_set_init():
+    """ Test packing trajectories into a DemonstrationSet """
+    d = DemonstrationSet.from_trajectories(_toy_trajectories())
+    assert len(d) == 4
+    assert d.n_pairs == 6
+    assert d.states.dtype == np.int32
+    assert_equal(d.offsets, [0, 3, 3, 4, 6])
+    assert_equal(d.lengths, [3, 0, 1, 2])
+    assert_equal(d[0], [[0, 1], [2, 0], [3, 3]])
+    assert_equal(d[-1], [[4, 2], [4, 2]])
+    assert [list(map(tuple, t)) for t in d] == _toy_trajectories()
+    assert_equal(d.visitation_counts(6), [1, 1, 1, 1, 2, 0])
+
+    assert_raises(ValueError, DemonstrationSet, [0, 1], [0], [0, 2])
+    assert_raises(ValueError, DemonstrationSet, [0, 1], [0, 1], [0, 1])
+    assert_raises(IndexError, d.__getitem__, 4)
+
+
+def test_demonstration_set_slicing():
+    """ Test slicing and fancy indexing of a DemonstrationSet """
+    d = DemonstrationSet.from_trajectories(_toy_trajectories())
+
+    d2 = d[1:]
+    assert len(d2) == 3
+    assert_equal(d2.offsets, [0, 0, 1, 3])
+    assert_equal(d2[2], d[3])
+
+    d3 = d[[3, 0]]
+    assert_equal(d3.lengths, [2, 3])
+    assert_equal(d3[1], d[0])
+
+    assert_equal(d[::2].lengths, [3, 1])
+    assert len(d[2:1]) == 0
+    assert len(d[[]]) == 0
+    assert d[[]].n_pairs == 0
+    assert len(d[np.zeros(4, dtype=bool)]) == 0
+
+
+def test_demonstration_set_save_load():
+    """ Test saving and memory-mapped loading of a DemonstrationSet """
+    d = DemonstrationSet.from_trajectories(_toy_trajectories())
+    for fname in ('demos_test.hdf5', 'demos_test'):
+        d.save(fname)
+        for mmap in (True, False):
+            d2 = DemonstrationSet.load(fname, mmap=mmap)
+            for name in ('states', 'actions', 'offsets'):
+                assert_equal(getattr(d2, name), getattr(d, name))
+            assert isinstance(d2.states, np.memmap) == mmap
+        del d2
+
+    os.remove('demos_test.hdf5')
+    shutil.rmtree('demos_test')
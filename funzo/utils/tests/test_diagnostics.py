@@ -0,0 +1,21 @@
+
+import numpy as np
+
+from nose.tools import assert_raises
+from numpy.testing import assert_allclose
+
+from funzo.utils.diagnostics import gelman_rubin
+
+
+def test_gelman_rubin():
+    rng = np.random.RandomState(0)
+    mixed = rng.normal(size=(4, 2000, 3))
+    assert_allclose(gelman_rubin(mixed), np.ones(3), atol=0.01)
+
+    # chains stuck in different modes
+    apart = mixed + np.arange(4)[:, None, None]
+    assert np.all(gelman_rubin(apart) > 1.5)
+
+    assert gelman_rubin(np.ones((3, 10))) == 1.0
+    assert gelman_rubin(np.arange(3)[:, None] * np.ones((3, 10))) == np.inf
+    assert_raises(ValueError, gelman_rubin, np.ones((1, 10)))